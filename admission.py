@@ -0,0 +1,179 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from metrics import Counter, Histogram
+
+
+class Overloaded(Exception):
+    """A request could not be admitted: its lane's queue is full or it waited too long."""
+
+    def __init__(self, lane: str, reason: str, retry_after: int) -> None:
+        super().__init__(f"Server busy ({lane}: {reason}); retry in {retry_after}s")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Lane:
+    __slots__ = (
+        "name", "priority", "max_concurrent", "max_queue", "max_wait",
+        "active", "queued", "admitted", "rejected", "avg_service",
+    )
+
+    def __init__(self, name: str, priority: int, max_concurrent: int, max_queue: int, max_wait: float) -> None:
+        self.name = name
+        self.priority = int(priority)
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait = float(max_wait)
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        # Exponentially weighted mean of how long a slot is held; drives Retry-After.
+        self.avg_service = 1.0
+
+
+class _Slot:
+    __slots__ = ("_controller", "_lane", "_started")
+
+    def __init__(self, controller: "AdmissionController", lane: Lane) -> None:
+        self._controller = controller
+        self._lane = lane
+        self._started = 0.0
+
+    async def __aenter__(self) -> None:
+        await self._controller._acquire(self._lane)
+        self._started = time.monotonic()
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        self._controller._release(self._lane, time.monotonic() - self._started)
+        return False
+
+
+class AdmissionController:
+    """
+    Bounds the expensive work (PDF renders) shared by several endpoints.
+
+    `capacity` slots are shared by all lanes; each lane also has its own
+    concurrency cap, a bounded wait queue and a maximum wait. When a slot frees up
+    it goes to the waiting request with the lowest priority value (FIFO within a
+    priority) whose lane is under its cap. A request that finds its lane's queue
+    full, or waits longer than `max_wait`, gets `Overloaded` with a Retry-After
+    estimate instead of waiting indefinitely.
+
+    Runs on one event loop; no locking.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        lanes: Mapping[str, Sequence[Any]],
+        wait_seconds: Optional[Histogram] = None,
+        rejections: Optional[Counter] = None,
+    ) -> None:
+        self.capacity = max(1, int(capacity))
+        self.lanes: Dict[str, Lane] = {name: Lane(name, *spec) for name, spec in lanes.items()}
+        self.wait_seconds = wait_seconds
+        self.rejections = rejections
+        self._active = 0
+        self._seq = itertools.count()
+        self._waiters: List[Tuple[int, int, "asyncio.Future[None]", Lane]] = []
+
+    def slot(self, lane: str) -> _Slot:
+        """`async with admission.slot("pdf"): ...` holds one render slot for the block."""
+        return _Slot(self, self.lanes[lane])
+
+    def _retry_after(self, lane: Lane) -> int:
+        parallel = min(self.capacity, lane.max_concurrent)
+        return max(1, min(60, math.ceil(lane.avg_service * (lane.queued + 1) / parallel)))
+
+    def _reject(self, lane: Lane, reason: str) -> Overloaded:
+        lane.rejected += 1
+        if self.rejections is not None:
+            self.rejections.inc(lane.name, reason)
+        return Overloaded(lane.name, reason, self._retry_after(lane))
+
+    def _grant(self, lane: Lane) -> None:
+        self._active += 1
+        lane.active += 1
+        lane.admitted += 1
+
+    def _dispatch(self) -> None:
+        while self._active < self.capacity and self._waiters:
+            blocked = []
+            granted = False
+            while self._waiters:
+                entry = heapq.heappop(self._waiters)
+                fut, lane = entry[2], entry[3]
+                if fut.done():
+                    continue  # gave up waiting
+                if lane.active >= lane.max_concurrent:
+                    blocked.append(entry)
+                    continue
+                lane.queued -= 1
+                self._grant(lane)
+                fut.set_result(None)
+                granted = True
+                break
+            for entry in blocked:
+                heapq.heappush(self._waiters, entry)
+            if not granted:
+                return
+
+    def _has_waiters_ahead(self, lane: Lane) -> bool:
+        return any(not e[2].done() and e[0] <= lane.priority for e in self._waiters)
+
+    async def _acquire(self, lane: Lane) -> None:
+        if (
+            self._active < self.capacity
+            and lane.active < lane.max_concurrent
+            and not self._has_waiters_ahead(lane)
+        ):
+            self._grant(lane)
+            if self.wait_seconds is not None:
+                self.wait_seconds.observe(0.0, lane.name)
+            return
+
+        if lane.queued >= lane.max_queue:
+            raise self._reject(lane, "queue_full")
+
+        fut: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (lane.priority, next(self._seq), fut, lane))
+        lane.queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=lane.max_wait)
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                # Granted just as the wait ended: hand the slot straight back.
+                self._release(lane, 0.0)
+            else:
+                fut.cancel()
+                lane.queued -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject(lane, "timeout") from None
+            raise
+        finally:
+            if self.wait_seconds is not None:
+                self.wait_seconds.observe(time.monotonic() - started, lane.name)
+
+    def _release(self, lane: Lane, held: float) -> None:
+        self._active -= 1
+        lane.active -= 1
+        if held > 0:
+            lane.avg_service += 0.2 * (held - lane.avg_service)
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {"capacity": self.capacity, "active": self._active}
+        for lane in self.lanes.values():
+            stats[f"{lane.name}_active"] = lane.active
+            stats[f"{lane.name}_queued"] = lane.queued
+            stats[f"{lane.name}_admitted"] = lane.admitted
+            stats[f"{lane.name}_rejected"] = lane.rejected
+        return stats
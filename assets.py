@@ -0,0 +1,181 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from typing import Dict, List, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from response_cache import etag_matches
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are built
+    brotli = None
+
+
+# Fingerprinted URLs never change content, so browsers may keep them for a year without asking.
+IMMUTABLE = "public, max-age=31536000, immutable"
+# The page itself and unfingerprinted asset URLs are revalidated (a 304 while unchanged).
+REVALIDATE = "no-cache"
+
+# Compressing these gains little or nothing; they are only served as is.
+_PRECOMPRESSED = {"image/png", "image/jpeg", "image/gif", "image/webp", "font/woff", "font/woff2"}
+# A variant is kept only if it saves at least this share of the bytes.
+_MIN_SAVING = 0.1
+# q-value of identity when Accept-Encoding does not mention it (or `*`): the lowest nonzero q.
+_IDENTITY_Q = 0.001
+
+_MEDIA_TYPES = {".js": "text/javascript", ".css": "text/css", ".ico": "image/x-icon", ".svg": "image/svg+xml"}
+
+
+class Asset:
+    """One file held in memory, with its compressed variants."""
+
+    __slots__ = ("path", "media_type", "digest", "variants")
+
+    def __init__(self, path: str, media_type: str, body: bytes) -> None:
+        self.path = path
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        # Content coding -> (body, ETag), in preference order; identity is always last.
+        self.variants: List[Tuple[str, bytes, str]] = []
+        if media_type not in _PRECOMPRESSED:
+            if brotli is not None:
+                self._add_variant("br", brotli.compress(body, quality=11), len(body))
+            self._add_variant("gzip", gzip.compress(body, compresslevel=9, mtime=0), len(body))
+        self.variants.append(("identity", body, f'"{self.digest}"'))
+
+    def _add_variant(self, coding: str, body: bytes, original: int) -> None:
+        if len(body) <= original * (1 - _MIN_SAVING):
+            self.variants.append((coding, body, f'"{self.digest}-{coding}"'))
+
+    def select(self, accept_encoding: Optional[str]) -> Tuple[str, bytes, str]:
+        """
+        The variant with the highest q-value in `accept_encoding`; on a tie, the
+        first in preference order. Identity is served when nothing is acceptable.
+        """
+        accepted = _accepted_codings(accept_encoding)
+        other = accepted.get("*")
+        best, best_q = self.variants[-1], 0.0
+        for variant in self.variants:
+            coding = variant[0]
+            if coding in accepted:
+                q = accepted[coding]
+            elif coding == "identity":
+                # Acceptable unless refused, but below any coding the client lists.
+                q = _IDENTITY_Q if other is None else other
+            else:
+                q = other or 0.0
+            if q > best_q:
+                best, best_q = variant, q
+        return best
+
+
+def _accepted_codings(header: Optional[str]) -> Dict[str, float]:
+    """Content codings from an Accept-Encoding header with their q-values."""
+    codings: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def _media_type(path: str) -> str:
+    ext = posixpath.splitext(path)[1].lower()
+    return _MEDIA_TYPES.get(ext) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def _fingerprinted(path: str, digest: str) -> str:
+    root, ext = posixpath.splitext(path)
+    return f"{root}.{digest}{ext}"
+
+
+class AssetBundle:
+    """
+    The page and everything under the static directory, read, hashed and
+    compressed once at startup.
+
+    Each file gets a content-hashed URL (`static/styles/style.<hash>.css`),
+    and the references in index.html are rewritten to those. Hashed URLs are
+    served with `Cache-Control: immutable`, so a repeat page load only
+    revalidates index.html (a 304 with no body). The old unhashed URLs keep
+    working, but they are revalidated. Every variant (Brotli when the `brotli`
+    package is installed, gzip and identity) is held in memory and picked by
+    Accept-Encoding, so serving one never touches the disk.
+
+    Changes to the files on disk are picked up on the next restart.
+    """
+
+    def __init__(self, static_dir: str, index_path: str, url_prefix: str = "static") -> None:
+        self.static_dir = static_dir
+        self.url_prefix = url_prefix
+        # URL path (without the leading slash) -> (asset, Cache-Control)
+        self._routes: Dict[str, Tuple[Asset, str]] = {}
+        self.urls: Dict[str, str] = {}
+
+        for root, _, files in os.walk(static_dir):
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                rel = os.path.relpath(full, static_dir).replace(os.sep, "/")
+                path = f"{url_prefix}/{rel}"
+                with open(full, "rb") as f:
+                    asset = Asset(path, _media_type(path), f.read())
+                hashed = _fingerprinted(path, asset.digest)
+                self.urls[path] = hashed
+                self._routes[path] = (asset, REVALIDATE)
+                self._routes[hashed] = (asset, IMMUTABLE)
+
+        with open(index_path, "r", encoding="utf-8") as f:
+            page = self.rewrite(f.read())
+        self.index = Asset("", "text/html; charset=utf-8", page.encode("utf-8"))
+
+    def rewrite(self, text: str) -> str:
+        """Points every quoted reference to a bundled file at its fingerprinted URL."""
+        pattern = re.compile(r"""(?<=["'(])/?(%s/[^"'()\s?#]+)""" % re.escape(self.url_prefix))
+
+        def replace(m: "re.Match[str]") -> str:
+            hashed = self.urls.get(m.group(1))
+            if hashed is None:
+                return m.group(0)
+            return m.group(0)[: m.start(1) - m.start(0)] + hashed
+
+        return pattern.sub(replace, text)
+
+    def lookup(self, path: str) -> Optional[Tuple[Asset, str]]:
+        return self._routes.get(path.lstrip("/"))
+
+    def stats(self) -> Dict[str, int]:
+        assets = {id(asset): asset for asset, _ in self._routes.values()}
+        assets[id(self.index)] = self.index
+        return {
+            "files": len(assets),
+            "bytes": sum(len(body) for a in assets.values() for _, body, _ in a.variants),
+        }
+
+
+def asset_response(asset: Asset, request: Request, cache_control: str) -> Response:
+    coding, body, etag = asset.select(request.headers.get("accept-encoding"))
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if coding != "identity":
+        headers["Content-Encoding"] = coding
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if request.method == "HEAD":
+        headers["Content-Length"] = str(len(body))
+        return Response(status_code=200, headers=headers, media_type=asset.media_type)
+    return Response(content=body, headers=headers, media_type=asset.media_type)
@@ -0,0 +1,259 @@
+import csv
+import io
+import json
+from operator import itemgetter
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from rules_engine import CompiledRules
+
+
+TRUE_VALUES = frozenset(("1", "true", "t", "yes", "y", "on", "x"))
+_BIT_CELLS = frozenset(("0", "1"))
+
+
+def _truthy(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_VALUES
+    return value is True or value == 1
+
+
+def _count(name: str, value: Any) -> int:
+    """A count cell or field: a whole number, empty meaning 0."""
+    if isinstance(value, str):
+        value = value.strip() or "0"
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        raise ValueError(f"{name} must be a whole number, got {value!r}")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a whole number, got {value!r}") from None
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[str]]:
+    """Re-slices an incoming byte stream into lists of complete lines, one list per chunk."""
+    tail = b""
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        data = tail + chunk
+        cut = data.rfind(b"\n")
+        if cut < 0:
+            tail = data
+            continue
+        tail = data[cut + 1:]
+        lines = data[:cut].decode("utf-8-sig").splitlines()
+        if lines:
+            yield lines
+    if tail.strip():
+        yield tail.decode("utf-8-sig").splitlines()
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body generator may still be reading the request body.
+
+    Under ASGI < 2.4 StreamingResponse runs a disconnect listener that consumes
+    `receive()` messages, which would steal the request chunks from the generator.
+    A disconnect still surfaces here through `request.stream()`.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+
+class BatchEvaluator:
+    """
+    Scores many feature rows at once against the compiled rule tables.
+
+    Each chunk of rows is reduced to a list of feature masks, then every module's
+    totals are produced column-wise (one table lookup per row per module), so the
+    per-row cost is a handful of integer operations regardless of the rule count.
+    """
+
+    def __init__(self, engine: CompiledRules) -> None:
+        self.engine = engine
+        self.modules = engine.modules
+        # CSV rows end with an `error` cell: empty for scored rows, the message (and no scores) for bad ones.
+        self.columns = ["row", "id"] + [score_key for _, score_key, _ in engine.score_fields] + ["total_hours", "error"]
+        score_keys = self.columns[2:-1]
+        self._json_template = ",".join(f'"{k}":%d' for k in score_keys) + "}\n"
+        self._csv_template = ",".join("%d" for _ in score_keys) + ",\r\n"
+        self._csv_error_scores = "," * len(score_keys)
+
+    def score_masks(self, masks: Sequence[int]) -> List[Tuple[int, ...]]:
+        per_module: List[List[int]] = []
+        for m in self.modules:
+            totals = [row.total for row in m.rows]
+            if m.contiguous:
+                shift, width = m.shift, m.width
+                per_module.append([totals[(mask >> shift) & width] for mask in masks])
+            else:
+                per_module.append([totals[m.index(mask)] for mask in masks])
+        ordered = [per_module[i] for i, _, _ in self.engine.score_fields]
+        return [scores + (sum(scores),) for scores in zip(*ordered)]
+
+    def _csv_columns(
+        self, header: List[str]
+    ) -> Tuple[List[Tuple[int, int]], List[Tuple[int, str]], Optional[int], Optional[Callable]]:
+        bits = self.engine.bits
+        positions = {name.strip(): i for i, name in enumerate(header)}
+        feature_columns = [(i, 1 << bits[name]) for name, i in positions.items() if name in bits]
+        count_columns = [(i, name) for name, i in positions.items() if name in self.engine.quantities]
+        id_column = next((i for name, i in positions.items() if name.lower() == "id"), None)
+
+        # Fast path for plain 0/1 cells: the feature columns, highest bit first, read as a binary number.
+        # Any other cell ("10", "-1", "yes", empty) sends the row to the per-column parser.
+        by_bit = sorted(((bits[name], i) for name, i in positions.items() if name in bits), reverse=True)
+        if not by_bit:
+            return feature_columns, count_columns, id_column, None
+        getter = itemgetter(*[i for _, i in by_bit])
+        expected_bits = tuple(bit for bit, _ in by_bit)
+        if expected_bits != tuple(range(expected_bits[0], expected_bits[0] - len(expected_bits), -1)):
+            return feature_columns, count_columns, id_column, None
+        low_bit = expected_bits[-1]
+        width = len(expected_bits)
+
+        def binary_mask(record: List[str]) -> Optional[int]:
+            cells = getter(record)
+            if width == 1:
+                return int(cells) << low_bit if cells in _BIT_CELLS else None
+            if not all(map(_BIT_CELLS.__contains__, cells)):
+                return None
+            return int("".join(cells), 2) << low_bit
+
+        return feature_columns, count_columns, id_column, binary_mask
+
+    def _ndjson_mask(self, obj: Dict[str, Any]) -> int:
+        bits = self.engine.bits
+        quantities = self.engine.quantities
+        features = obj.get("features", obj)
+        mask = 0
+        for name, value in features.items():
+            bit = bits.get(name)
+            if bit is not None:
+                if _truthy(value):
+                    mask |= 1 << bit
+            elif name in quantities:
+                mask = quantities[name].place(mask, _count(name, value))
+        return mask
+
+    async def stream(self, chunks: AsyncIterator[bytes], input_format: str, output_format: str) -> AsyncIterator[bytes]:
+        row_number = 0
+        feature_columns: List[Tuple[int, int]] = []
+        count_columns: List[Tuple[int, str]] = []
+        id_column: Optional[int] = None
+        binary_mask: Optional[Callable] = None
+        header_seen = input_format != "csv"
+
+        if output_format == "csv":
+            yield (",".join(self.columns) + "\r\n").encode("utf-8")
+
+        async for lines in _iter_lines(chunks):
+            masks: List[int] = []
+            ids: List[Any] = []
+            numbers: List[int] = []
+            errors: List[Tuple[int, Any, str]] = []
+
+            if input_format == "csv":
+                for record in csv.reader(lines):
+                    if not record:
+                        continue
+                    if not header_seen:
+                        feature_columns, count_columns, id_column, binary_mask = self._csv_columns(record)
+                        header_seen = True
+                        continue
+                    row_number += 1
+                    try:
+                        mask = binary_mask(record) if binary_mask is not None else None
+                    except IndexError:
+                        mask = None
+                    if mask is None:
+                        mask = 0
+                        for i, bit in feature_columns:
+                            if i < len(record) and record[i].strip().lower() in TRUE_VALUES:
+                                mask |= bit
+                    row_id = record[id_column] if id_column is not None and id_column < len(record) else None
+                    try:
+                        for i, name in count_columns:
+                            if i < len(record):
+                                mask = self.engine.quantities[name].place(mask, _count(name, record[i]))
+                    except ValueError as e:
+                        errors.append((row_number, row_id, str(e)))
+                        continue
+                    masks.append(mask)
+                    numbers.append(row_number)
+                    ids.append(row_id)
+            else:
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    row_number += 1
+                    obj = None
+                    try:
+                        obj = json.loads(line)
+                        if not isinstance(obj, dict):
+                            raise ValueError("row is not a JSON object")
+                        mask = self._ndjson_mask(obj)
+                    except (ValueError, AttributeError) as e:
+                        errors.append((row_number, obj.get("id") if isinstance(obj, dict) else None, str(e)))
+                        continue
+                    masks.append(mask)
+                    numbers.append(row_number)
+                    ids.append(obj.get("id"))
+
+            out = self._format(numbers, ids, self.score_masks(masks), errors, output_format)
+            if out:
+                yield out
+
+    def _format(
+        self,
+        numbers: List[int],
+        ids: List[Any],
+        scores: List[Tuple[int, ...]],
+        errors: List[Tuple[int, Any, str]],
+        output_format: str,
+    ) -> bytes:
+        if output_format == "csv":
+            csv_template = self._csv_template
+            lines = [
+                (n, f"{n},{'' if i is None else _csv_cell(i)},{csv_template % s}")
+                for n, i, s in zip(numbers, ids, scores)
+            ]
+            error_scores = self._csv_error_scores
+            lines.extend(
+                (n, f"{n},{'' if i is None else _csv_cell(i)},{error_scores}{_csv_cell(message)}\r\n")
+                for n, i, message in errors
+            )
+        else:
+            json_template = self._json_template
+            lines = [
+                (n, f'{{"row":{n},{"" if i is None else f"{_json_id(i)},"}{json_template % s}')
+                for n, i, s in zip(numbers, ids, scores)
+            ]
+            for n, i, message in errors:
+                error = {"row": n, "error": message} if i is None else {"row": n, "id": i, "error": message}
+                lines.append((n, json.dumps(error, separators=(",", ":")) + "\n"))
+
+        if errors:
+            lines.sort(key=lambda r: r[0])
+        return "".join(line for _, line in lines).encode("utf-8")
+
+
+def _csv_cell(value: Any) -> str:
+    text = str(value)
+    if any(c in text for c in ',"\r\n'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def _json_id(value: Any) -> str:
+    return '"id":' + json.dumps(value, separators=(",", ":"))
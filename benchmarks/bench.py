@@ -0,0 +1,343 @@
+"""
+Micro-benchmarks for the quote pipeline, one stage at a time.
+
+    python -m benchmarks.bench                         # run everything, JSON on stdout
+    python -m benchmarks.bench -k calculate -k parse   # only matching benchmarks
+    python -m benchmarks.bench --output run.json --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench --baseline benchmarks/baseline.json --threshold 0.15
+
+Each benchmark reports runs, ops/sec, latency percentiles (microseconds) and
+tracemalloc figures (peak bytes during one call, bytes retained per call). With
+--baseline, every benchmark's median is compared to the saved run and the exit
+status is 1 if any got slower by more than --threshold.
+
+Mail goes to a local SMTP sink (benchmarks/smtp_sink.py), never to the relay
+configured in env.py. Chromium benchmarks are reported as skipped when
+Playwright or its browser binaries are not installed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.smtp_sink import SmtpSink  # noqa: E402
+
+
+def _ensure_env() -> None:
+    # main.py reads its settings from env.py, which is not checked in; the
+    # benchmarks only need placeholders because SMTP is redirected to the sink.
+    try:
+        import env  # noqa: F401
+    except ModuleNotFoundError:
+        env_dir = tempfile.mkdtemp(prefix="psc-bench-env-")
+        with open(os.path.join(env_dir, "env.py"), "w", encoding="utf-8") as f:
+            f.write(
+                'SMTP_HOST = "127.0.0.1"\nSMTP_PORT = 25\nSMTP_USE_TLS = False\n'
+                'SMTP_USERNAME = ""\nSMTP_PASSWORD = ""\nSMTP_FROM = "bench@example.com"\n'
+            )
+        sys.path.insert(0, env_dir)
+
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, int(round(q / 100.0 * len(sorted_samples) + 0.5)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def measure(
+    fn: Callable[[], Any],
+    min_time: float = 1.0,
+    min_runs: int = 5,
+    max_runs: int = 1_000_000,
+    warmup: int = 3,
+    alloc_runs: int = 20,
+) -> Dict[str, Any]:
+    for _ in range(warmup):
+        fn()
+
+    samples: List[float] = []
+    clock = time.perf_counter_ns
+    started = clock()
+    deadline = started + int(min_time * 1e9)
+    while len(samples) < max_runs and (len(samples) < min_runs or clock() < deadline):
+        t0 = clock()
+        fn()
+        samples.append((clock() - t0) / 1000.0)
+    elapsed = (clock() - started) / 1e9
+
+    # Allocation figures come from a separate pass: tracemalloc slows every allocation down.
+    alloc_runs = max(1, min(alloc_runs, len(samples)))
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        peak = 0
+        for _ in range(alloc_runs):
+            tracemalloc.reset_peak()
+            start_current, _ = tracemalloc.get_traced_memory()
+            fn()
+            _, call_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, call_peak - start_current)
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    ordered = sorted(samples)
+    return {
+        "runs": len(samples),
+        "ops_per_sec": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "mean_us": round(sum(samples) / len(samples), 2),
+        "min_us": round(ordered[0], 2),
+        "p50_us": round(percentile(ordered, 50), 2),
+        "p90_us": round(percentile(ordered, 90), 2),
+        "p99_us": round(percentile(ordered, 99), 2),
+        "max_us": round(ordered[-1], 2),
+        "alloc_peak_bytes": int(peak),
+        "alloc_retained_bytes_per_op": round((after - before) / alloc_runs, 1),
+    }
+
+
+class Suite:
+    def __init__(self, patterns: List[str], min_time: float) -> None:
+        self.patterns = [re.compile(p) for p in patterns]
+        self.min_time = min_time
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def wanted(self, name: str) -> bool:
+        return not self.patterns or any(p.search(name) for p in self.patterns)
+
+    def run(self, name: str, fn: Callable[[], Any], **options: Any) -> None:
+        if not self.wanted(name):
+            return
+        options.setdefault("min_time", self.min_time)
+        print(f"  {name} ...", end="", file=sys.stderr, flush=True)
+        try:
+            result = measure(fn, **options)
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+            print(f" error: {result['error']}", file=sys.stderr)
+        else:
+            print(f" {result['ops_per_sec']:.1f} ops/s, p50 {result['p50_us']:.1f} us, p99 {result['p99_us']:.1f} us", file=sys.stderr)
+        self.results[name] = result
+
+    def skip(self, name: str, reason: str) -> None:
+        if self.wanted(name):
+            print(f"  {name} skipped: {reason}", file=sys.stderr)
+            self.results[name] = {"skipped": reason}
+
+
+def selections(main: Any) -> Dict[str, Any]:
+    """Representative and worst-case feature selections."""
+    fields = list(main.ProjectFeatures.model_fields.keys())
+    quantities = main.RULES.current.engine.quantities
+    return {
+        "empty": main.ProjectFeatures(),
+        "typical": main.ProjectFeatures(
+            bre_include=True, workflows=True, field_logic=True, housing=True,
+            app_include=True, leads=True,
+            exh_include=True, floor_plan=True,
+        ),
+        "all": main.ProjectFeatures(
+            **{name: quantities[name].max if name in quantities else True for name in fields}
+        ),
+    }
+
+
+def _run_chromium(suite: Suite, main: Any, html: str, min_time: float) -> Optional[bytes]:
+    loop = asyncio.new_event_loop()
+    pdf_bytes: Optional[bytes] = None
+    try:
+        main.app.state.pdf_pool = None
+        try:
+            pdf_bytes = loop.run_until_complete(main._html_to_pdf_bytes(html))
+        except Exception as e:
+            reason = f"{type(e).__name__}: {e}"
+            suite.skip("html_to_pdf_bytes.cold", reason)
+            suite.skip("html_to_pdf_bytes.warm", reason)
+            return None
+
+        # Cold: a browser is launched and torn down for every render (no pool).
+        suite.run(
+            "html_to_pdf_bytes.cold",
+            lambda: loop.run_until_complete(main._html_to_pdf_bytes(html)),
+            min_time=min(min_time, 5.0), max_runs=10, warmup=0, alloc_runs=1,
+        )
+        if suite.wanted("html_to_pdf_bytes.warm"):
+            # Same recycling settings as the app, so the warm figure includes periodic relaunches.
+            pool = main.BrowserPool(
+                size=1,
+                max_renders=main.PDF_POOL_MAX_RENDERS,
+                max_rss_mb=main.PDF_POOL_MAX_RSS_MB,
+                health_interval=main.PDF_POOL_HEALTH_INTERVAL,
+            )
+            pool.start()
+            main.app.state.pdf_pool = pool
+            try:
+                suite.run(
+                    "html_to_pdf_bytes.warm",
+                    lambda: loop.run_until_complete(main._html_to_pdf_bytes(html)),
+                    max_runs=500, alloc_runs=5,
+                )
+            finally:
+                main.app.state.pdf_pool = None
+                pool.close()
+    finally:
+        loop.close()
+    return pdf_bytes
+
+
+def _run_smtp(suite: Suite, main: Any, pdf_bytes: bytes) -> int:
+    with SmtpSink() as sink:
+        host, port = sink.address
+        main.SMTP_HOST, main.SMTP_PORT = host, port
+        main.SMTP_USE_TLS, main.SMTP_USERNAME, main.SMTP_PASSWORD = False, "", ""
+        main.SMTP_FROM = "bench@example.com"
+        suite.run(
+            "smtp_send_pdf",
+            lambda: main._smtp_send_pdf(
+                "quotes@example.com", "PSC Hours Calculator - Benchmark", "Benchmark", pdf_bytes, "PSC_Hours_Benchmark.pdf"
+            ),
+            max_runs=2000, alloc_runs=5,
+        )
+        return sink.messages
+
+
+def run_suite(args: argparse.Namespace) -> Dict[str, Any]:
+    _ensure_env()
+    os.chdir(ROOT)
+    import main
+
+    suite = Suite(args.filter, args.min_time)
+    rules = main.RULES.current
+    cases = selections(main)
+    checks: Dict[str, Any] = {}
+
+    # The compiled tables must agree with the reference rule walk, or the timings are meaningless.
+    mismatches = rules.engine.mismatches([rules.engine.mask_of(f) for f in cases.values()])
+    checks["rules_tables_match_reference"] = not mismatches
+    if mismatches:
+        raise SystemExit(f"Compiled rules disagree with the reference for masks {mismatches[:10]}")
+
+    for label, features in cases.items():
+        suite.run(f"calculate_classification.{label}", lambda f=features: main.calculate_classification(f, rules))
+
+    reports = {label: main._quote_report(f, rules) for label, f in cases.items()}
+    calcs = {label: main.calculate_classification(f, rules) for label, f in cases.items()}
+    selected = {label: main._selected_by_module(f, rules) for label, f in cases.items()}
+    for label in ("typical", "all"):
+        # A fresh ReportContent per call, so nothing is cached: comparable with runs from before the report cache.
+        suite.run(
+            f"build_print_html.{label}",
+            lambda label=label: main.REPORTS.html("Benchmark Customer", main._report_content(selected[label], calcs[label])),
+        )
+        # What a repeat print of the same quote costs (cached content and fragments).
+        suite.run(
+            f"build_print_html_cached.{label}",
+            lambda f=cases[label]: main.REPORTS.html("Benchmark Customer", main._quote_report(f, rules)),
+        )
+
+    features_json = cases["typical"].model_dump()
+    email_body = json.dumps({"to_email": "quotes@example.com", "customer_name": "Benchmark Customer", "features": features_json}).encode()
+    pdf_body = json.dumps({"customer_name": "Benchmark Customer", "features": features_json}).encode()
+    suite.run("parse.EmailRequest", lambda: main.EmailRequest.model_validate_json(email_body))
+    suite.run("parse.PdfRequest", lambda: main.PdfRequest.model_validate_json(pdf_body))
+
+    html = main.REPORTS.html("Benchmark Customer", reports["all"])
+    suite.run("pdf.native", lambda: main._build_native_pdf("Benchmark Customer", reports["all"]))
+
+    pdf_bytes: Optional[bytes] = None
+    if suite.wanted("html_to_pdf_bytes.cold") or suite.wanted("html_to_pdf_bytes.warm"):
+        pdf_bytes = _run_chromium(suite, main, html, args.min_time)
+
+    if suite.wanted("smtp_send_pdf"):
+        if pdf_bytes is None:
+            pdf_bytes = main._build_native_pdf("Benchmark Customer", reports["all"])
+        checks["smtp_messages_received"] = _run_smtp(suite, main, pdf_bytes)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "rules_version": rules.version,
+            "min_time": args.min_time,
+        },
+        "checks": checks,
+        "benchmarks": suite.results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> Dict[str, Any]:
+    """Median latency change per benchmark; `regressed` when slower by more than `threshold`."""
+    comparison: Dict[str, Any] = {}
+    base = baseline.get("benchmarks", {})
+    for name, result in current.get("benchmarks", {}).items():
+        previous = base.get(name)
+        if not previous or "p50_us" not in previous or "p50_us" not in result or not previous["p50_us"]:
+            continue
+        change = result["p50_us"] / previous["p50_us"] - 1.0
+        comparison[name] = {
+            "baseline_p50_us": previous["p50_us"],
+            "p50_us": result["p50_us"],
+            "change": round(change, 4),
+            "regressed": change > threshold,
+        }
+    return comparison
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", "--filter", action="append", default=[], help="regex selecting benchmark names (repeatable)")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds to spend timing each benchmark")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="saved report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed median slowdown before failing (0.10 = 10%%)")
+    parser.add_argument("--save-baseline", help="also write this run's report to the given path")
+    args = parser.parse_args(argv)
+
+    print("Running benchmarks", file=sys.stderr)
+    report = run_suite(args)
+
+    regressed: List[str] = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["comparison"] = {"baseline": args.baseline, "threshold": args.threshold, "results": compare(report, baseline, args.threshold)}
+        for name, row in report["comparison"]["results"].items():
+            marker = "REGRESSED" if row["regressed"] else "ok"
+            print(f"  {name}: {row['change'] * 100:+.1f}% median ({marker})", file=sys.stderr)
+            if row["regressed"]:
+                regressed.append(name)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+    if regressed:
+        print(f"Regressions beyond {args.threshold * 100:.0f}%: {', '.join(regressed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
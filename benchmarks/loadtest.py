@@ -0,0 +1,657 @@
+"""
+End-to-end load and soak test: the app under uvicorn, driven over HTTP.
+
+    python -m benchmarks.loadtest                                    # defaults below
+    python -m benchmarks.loadtest --mix calculate=70,pdf=20,email=10 --concurrency 4,16,64 --stage-seconds 20
+    python -m benchmarks.loadtest --soak-seconds 3600 --soak-concurrency 16 --output soak.json
+    python -m benchmarks.loadtest --set PDF_RENDERER='"native"' --set PDF_POOL_SIZE=4 --workers 2
+
+The harness writes a throwaway env.py and starts `uvicorn main:app` as a child
+process, with SMTP pointed at an in-process sink (benchmarks/smtp_sink.py) and
+the quote database, quote log and PDF disk cache in a temporary directory.
+Nothing leaves the machine. Linux only: processes and memory are read from
+/proc.
+
+Each stage runs the request mix with a fixed number of concurrent clients,
+each on its own keep-alive connection, and reports throughput and
+p50/p95/p99 latency per endpoint. Responses are counted as ok, rejected (503
+from admission control, which is load shedding rather than failure) or
+errors. Feature selections and customer names are random, so most PDFs are
+cache misses.
+
+The soak stage samples, every --sample-seconds, the RSS and the process count
+of everything started under the harness, split into the app's own processes
+and Chromium. The harness registers as a child subreaper, so Chromium
+processes orphaned by a crashed driver are still counted. The soak is cut
+into windows (the warm-up window is skipped), and the run fails when:
+
+  - RSS or the process count rises from window to window and ends up
+    more than the allowed growth above the first window
+  - latency collapses: p99 of the last window is more than
+    --max-p99-growth times p99 of the first
+  - the error rate exceeds --max-error-rate
+  - any process is still alive after uvicorn has shut down
+
+The JSON report goes to stdout (or --output); the exit status is 1 if any
+check failed.
+"""
+import argparse
+import asyncio
+import ctypes
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.bench import percentile  # noqa: E402
+from benchmarks.smtp_sink import SmtpSink  # noqa: E402
+
+
+OPERATIONS = ("calculate", "pdf", "email")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_PR_SET_CHILD_SUBREAPER = 36
+
+
+# --- processes -------------------------------------------------------------
+
+def _become_subreaper() -> bool:
+    """Orphaned descendants get reparented to this process instead of init, so they stay visible."""
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.prctl(_PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def descendants(root_pid: int) -> List[int]:
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        stat = _read(f"/proc/{entry}/stat")
+        if stat is None:
+            continue
+        # The command name is in parentheses and may itself contain spaces or parentheses.
+        fields = stat[stat.rindex(")") + 2:].split()
+        if fields[0] == "Z":
+            continue
+        children.setdefault(int(fields[1]), []).append(int(entry))
+    found: List[int] = []
+    stack = [root_pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def reap_orphans(keep: int) -> None:
+    """Reaps exited processes that were reparented to the harness (never `keep`, the server we wait on)."""
+    me = os.getpid()
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit() or int(entry) == keep:
+            continue
+        stat = _read(f"/proc/{entry}/stat")
+        if stat is None:
+            continue
+        fields = stat[stat.rindex(")") + 2:].split()
+        if fields[0] == "Z" and int(fields[1]) == me:
+            try:
+                os.waitpid(int(entry), os.WNOHANG)
+            except ChildProcessError:
+                pass
+
+
+def _is_browser(pid: int) -> bool:
+    comm = (_read(f"/proc/{pid}/comm") or "").strip().lower()
+    return "chrom" in comm or "headless_shell" in comm
+
+
+def _rss_bytes(pid: int) -> int:
+    statm = _read(f"/proc/{pid}/statm")
+    return int(statm.split()[1]) * _PAGE_SIZE if statm else 0
+
+
+def sample_processes(root_pid: int) -> Dict[str, Any]:
+    """RSS and process counts of everything under `root_pid`, for the app and for Chromium."""
+    sample = {"app_processes": 0, "browser_processes": 0, "app_rss_mb": 0.0, "browser_rss_mb": 0.0}
+    for pid in descendants(root_pid):
+        kind = "browser" if _is_browser(pid) else "app"
+        sample[f"{kind}_processes"] += 1
+        sample[f"{kind}_rss_mb"] += _rss_bytes(pid) / (1024 * 1024)
+    sample["processes"] = sample["app_processes"] + sample["browser_processes"]
+    sample["rss_mb"] = round(sample["app_rss_mb"] + sample["browser_rss_mb"], 1)
+    sample["app_rss_mb"] = round(sample["app_rss_mb"], 1)
+    sample["browser_rss_mb"] = round(sample["browser_rss_mb"], 1)
+    return sample
+
+
+# --- HTTP client -----------------------------------------------------------
+
+class HttpConnection:
+    """Minimal keep-alive HTTP/1.1 client (the harness needs nothing beyond the standard library)."""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, body: Optional[bytes] = None) -> Tuple[int, bytes]:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+        if body is not None:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        self._writer.write(head.encode("ascii") + b"\r\n" + (body or b""))
+        await self._writer.drain()
+
+        reader = self._reader
+        assert reader is not None
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        status = int(status_line.split()[1])
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            content = b"".join(chunks)
+        else:
+            content = await reader.readexactly(int(headers.get("content-length", "0")))
+
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, content
+
+    async def close(self) -> None:
+        writer, self._writer, self._reader = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+
+# --- workload --------------------------------------------------------------
+
+class Recorder:
+    """Latencies and outcomes per operation, optionally bucketed by time window."""
+
+    def __init__(self, window_seconds: Optional[float] = None) -> None:
+        self.window_seconds = window_seconds
+        self.started = time.monotonic()
+        self.latencies: Dict[str, List[float]] = {op: [] for op in OPERATIONS}
+        self.outcomes: Dict[str, Dict[str, int]] = {op: {"ok": 0, "rejected": 0, "errors": 0} for op in OPERATIONS}
+        self.error_kinds: Dict[str, int] = {}
+        self.windows: List[List[float]] = []
+
+    def record(self, op: str, seconds: float, outcome: str, kind: Optional[str] = None) -> None:
+        self.outcomes[op][outcome] += 1
+        if kind:
+            self.error_kinds[kind] = self.error_kinds.get(kind, 0) + 1
+        if outcome != "ok":
+            return
+        self.latencies[op].append(seconds)
+        if self.window_seconds:
+            index = int((time.monotonic() - self.started) / self.window_seconds)
+            while len(self.windows) <= index:
+                self.windows.append([])
+            self.windows[index].append(seconds)
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        per_op: Dict[str, Any] = {}
+        for op in OPERATIONS:
+            outcomes = self.outcomes[op]
+            total = sum(outcomes.values())
+            if not total:
+                continue
+            per_op[op] = {"requests": total, **outcomes, "rps": round(outcomes["ok"] / elapsed, 2), **_latency_ms(self.latencies[op])}
+        return {
+            "seconds": round(elapsed, 2),
+            "rps": round(sum(o["ok"] for o in self.outcomes.values()) / elapsed, 2),
+            "operations": per_op,
+            "error_kinds": dict(self.error_kinds),
+        }
+
+
+def _latency_ms(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+class Workload:
+    def __init__(
+        self, features: Dict[str, Optional[int]], mix: Dict[str, int], renderer: Optional[str], customers: int, seed: int
+    ) -> None:
+        self.features = features
+        self.ops = [op for op in OPERATIONS if mix.get(op)]
+        self.weights = [mix[op] for op in self.ops]
+        self.renderer = renderer
+        self.customers = customers
+        self.seed = seed
+
+    def body(self, op: str, rng: random.Random) -> Tuple[str, bytes]:
+        selection = {
+            name: rng.randint(0, limit) if limit else rng.random() < 0.4 for name, limit in self.features.items()
+        }
+        if op == "calculate":
+            return "/calculate", json.dumps(selection).encode()
+        payload: Dict[str, Any] = {"customer_name": f"Load Test {rng.randrange(self.customers)}", "features": selection}
+        if self.renderer:
+            payload["renderer"] = self.renderer
+        if op == "email":
+            payload["to_email"] = "loadtest@example.com"
+        return f"/{op}", json.dumps(payload).encode()
+
+    async def client(self, host: str, port: int, deadline: float, recorder: Recorder, index: int) -> None:
+        rng = random.Random(self.seed * 100003 + index)
+        conn = HttpConnection(host, port)
+        try:
+            while time.monotonic() < deadline:
+                op = rng.choices(self.ops, self.weights)[0]
+                path, body = self.body(op, rng)
+                started = time.perf_counter()
+                try:
+                    status, _ = await conn.request("POST", path, body)
+                except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+                    recorder.record(op, time.perf_counter() - started, "errors", type(e).__name__)
+                    await conn.close()
+                    continue
+                elapsed = time.perf_counter() - started
+                if status in (200, 201, 202):
+                    recorder.record(op, elapsed, "ok")
+                elif status == 503:
+                    recorder.record(op, elapsed, "rejected")
+                else:
+                    recorder.record(op, elapsed, "errors", f"HTTP {status}")
+        finally:
+            await conn.close()
+
+    async def run(self, host: str, port: int, concurrency: int, seconds: float, recorder: Recorder) -> float:
+        started = time.monotonic()
+        deadline = started + seconds
+        await asyncio.gather(*(self.client(host, port, deadline, recorder, i) for i in range(concurrency)))
+        return time.monotonic() - started
+
+
+# --- checks ----------------------------------------------------------------
+
+def _median(values: List[float]) -> float:
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2] if ordered else 0.0
+
+
+def growth(values: List[float], windows: int, tolerance: float) -> Dict[str, Any]:
+    """
+    Window medians of a series sampled under steady load (warm-up window dropped).
+    `growing` when every window is at least the previous one and the last is more
+    than `tolerance` above the first: a plateau after warm-up passes, a steady
+    climb fails.
+    """
+    size = len(values) // (windows + 1)
+    if size < 1:
+        return {"evaluated": False, "reason": "too few samples"}
+    medians = [_median(values[(i + 1) * size:(i + 2) * size]) for i in range(windows)]
+    rising = all(b >= a for a, b in zip(medians, medians[1:]))
+    increase = medians[-1] - medians[0]
+    return {
+        "evaluated": True,
+        "window_medians": [round(m, 1) for m in medians],
+        "increase": round(increase, 1),
+        "tolerance": tolerance,
+        "growing": rising and increase > tolerance,
+    }
+
+
+# --- server ----------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def write_env(directory: str, smtp: Tuple[str, int], overrides: Dict[str, str]) -> str:
+    settings = {
+        "SMTP_HOST": repr(smtp[0]),
+        "SMTP_PORT": repr(smtp[1]),
+        "SMTP_USE_TLS": "False",
+        "SMTP_USERNAME": '""',
+        "SMTP_PASSWORD": '""',
+        "SMTP_FROM": '"loadtest@example.com"',
+        "RULES_FILE": repr(os.path.join(ROOT, "rules.json")),
+        "QUOTE_DB_PATH": repr(os.path.join(directory, "quotes.db")),
+        "QUOTE_LOG_PATH": repr(os.path.join(directory, "quote_log.bin")),
+        "PDF_CACHE_DIR": repr(os.path.join(directory, "pdf-cache")),
+    }
+    settings.update(overrides)
+    path = os.path.join(directory, "env.py")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(f"{name} = {value}\n" for name, value in settings.items()))
+    return path
+
+
+def start_server(env_dir: str, port: int, workers: int, log_path: str) -> subprocess.Popen:
+    environ = dict(os.environ)
+    environ["PYTHONPATH"] = os.pathsep.join(p for p in (env_dir, ROOT, environ.get("PYTHONPATH")) if p)
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--no-access-log"]
+    if workers > 1:
+        command += ["--workers", str(workers)]
+    log = open(log_path, "wb")
+    try:
+        return subprocess.Popen(command, cwd=ROOT, env=environ, stdout=log, stderr=subprocess.STDOUT)
+    finally:
+        log.close()
+
+
+async def wait_ready(host: str, port: int, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"uvicorn exited with status {process.returncode} during startup")
+        conn = HttpConnection(host, port)
+        try:
+            status, _ = await conn.request("GET", "/health")
+            if status == 200:
+                return
+        except OSError:
+            pass
+        finally:
+            await conn.close()
+        await asyncio.sleep(0.2)
+    raise SystemExit(f"uvicorn did not answer /health within {timeout:.0f}s")
+
+
+async def scrape_metrics(host: str, port: int, prefixes: Tuple[str, ...]) -> Dict[str, float]:
+    conn = HttpConnection(host, port)
+    try:
+        status, body = await conn.request("GET", "/metrics")
+    except OSError:
+        return {}
+    finally:
+        await conn.close()
+    found: Dict[str, float] = {}
+    if status == 200:
+        for line in body.decode("utf-8", "replace").splitlines():
+            if line.startswith(prefixes):
+                name, _, value = line.rpartition(" ")
+                try:
+                    found[name] = float(value)
+                except ValueError:
+                    pass
+    return found
+
+
+def stop_server(process: subprocess.Popen, grace: float) -> Dict[str, Any]:
+    """SIGTERM, then after `grace` seconds SIGKILL; reports any process still alive under the harness."""
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=grace)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    # Give orphans a moment to be reparented to us, then reap whatever exits.
+    deadline = time.monotonic() + 2.0
+    left = descendants(os.getpid())
+    while left and time.monotonic() < deadline:
+        time.sleep(0.2)
+        left = descendants(os.getpid())
+    survivors = [{"pid": pid, "comm": (_read(f"/proc/{pid}/comm") or "?").strip()} for pid in left]
+    for pid in left:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    time.sleep(0.2)
+    reap_orphans(process.pid)
+    return {"exit_status": process.returncode, "survivors": survivors}
+
+
+# --- run -------------------------------------------------------------------
+
+def _parse_mix(text: str) -> Dict[str, int]:
+    mix: Dict[str, int] = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r} (expected {', '.join(OPERATIONS)})")
+        mix[name] = int(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs at least one operation with a positive weight")
+    return mix
+
+
+def _parse_overrides(items: List[str]) -> Dict[str, str]:
+    overrides = {}
+    for item in items:
+        name, sep, value = item.partition("=")
+        if not sep or not name.isidentifier():
+            raise SystemExit(f"--set expects NAME=PYTHON_LITERAL, got {item!r}")
+        overrides[name] = value
+    return overrides
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    if not os.path.isdir("/proc"):
+        raise SystemExit("The load test reads processes from /proc and only runs on Linux")
+    subreaper = _become_subreaper()
+    os.chdir(ROOT)
+    workdir = tempfile.mkdtemp(prefix="psc-loadtest-")
+    host, port = "127.0.0.1", args.port or _free_port()
+    report: Dict[str, Any] = {}
+    checks: Dict[str, Any] = {}
+    with SmtpSink() as sink:
+        write_env(workdir, sink.address, _parse_overrides(args.set))
+        server = start_server(workdir, port, args.workers, os.path.join(workdir, "uvicorn.log"))
+        try:
+            await wait_ready(host, port, server, args.startup_timeout)
+            features = await _features(host, port)
+            workload = Workload(features, args.mix, args.renderer, args.customers, args.seed)
+            print(f"uvicorn pid {server.pid} on {host}:{port}, work dir {workdir}", file=sys.stderr)
+
+            stages = []
+            for concurrency in args.concurrency:
+                recorder = Recorder()
+                elapsed = await workload.run(host, port, concurrency, args.stage_seconds, recorder)
+                stage = {"concurrency": concurrency, **recorder.summary(elapsed), "processes": sample_processes(os.getpid())}
+                stages.append(stage)
+                _print_stage(f"c={concurrency}", stage)
+            report["stages"] = stages
+
+            if args.soak_seconds > 0:
+                report["soak"] = await _soak(args, workload, host, port, server.pid, checks)
+            report["server_metrics"] = await scrape_metrics(host, port, ("psc_pdf_pool", "psc_email_jobs", "psc_admission", "psc_pdf_cache"))
+
+            # Let the outbox deliver what it accepted before counting the mail that arrived.
+            accepted = sum(s["operations"].get("email", {}).get("ok", 0) for s in stages)
+            accepted += report.get("soak", {}).get("operations", {}).get("email", {}).get("ok", 0)
+            deadline = time.monotonic() + args.drain_seconds
+            while sink.messages < accepted and time.monotonic() < deadline:
+                await asyncio.sleep(0.5)
+            checks["emails_delivered"] = {"accepted": accepted, "received_by_sink": sink.messages, "ok": sink.messages >= accepted}
+        finally:
+            shutdown = stop_server(server, args.shutdown_grace)
+
+    checks["no_processes_after_shutdown"] = {"ok": not shutdown["survivors"], **shutdown}
+    all_ops = [s["operations"] for s in report.get("stages", [])] + [report.get("soak", {}).get("operations", {})]
+    requests = sum(o.get("requests", 0) for ops in all_ops for o in ops.values())
+    errors = sum(o.get("errors", 0) for ops in all_ops for o in ops.values())
+    rate = errors / requests if requests else 0.0
+    checks["error_rate"] = {"errors": errors, "requests": requests, "rate": round(rate, 5), "max": args.max_error_rate, "ok": rate <= args.max_error_rate}
+
+    if args.keep_workdir:
+        report["workdir"] = workdir
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "workers": args.workers,
+            "mix": args.mix,
+            "renderer": args.renderer,
+            "subreaper": subreaper,
+        },
+        "checks": checks,
+        **report,
+        "passed": all(c.get("ok", True) for c in checks.values()),
+    }
+
+
+async def _features(host: str, port: int) -> Dict[str, Optional[int]]:
+    """Feature name -> its max for counts, None for on/off features (from /rules)."""
+    conn = HttpConnection(host, port)
+    try:
+        status, body = await conn.request("GET", "/rules")
+    finally:
+        await conn.close()
+    if status != 200:
+        raise SystemExit(f"GET /rules returned {status}")
+    bundle = json.loads(body)
+    return {
+        name: bundle["rules"][name]["max"] if bundle["rules"][name].get("type") == "count" else None
+        for name in bundle["features"]
+    }
+
+
+async def _soak(
+    args: argparse.Namespace, workload: Workload, host: str, port: int, server_pid: int, checks: Dict[str, Any]
+) -> Dict[str, Any]:
+    concurrency = args.soak_concurrency or args.concurrency[-1]
+    window = args.soak_seconds / (args.windows + 1)
+    recorder = Recorder(window_seconds=window)
+    samples: List[Dict[str, Any]] = []
+    started = time.monotonic()
+
+    async def sampler() -> None:
+        while True:
+            reap_orphans(server_pid)
+            samples.append({"t": round(time.monotonic() - started, 1), **sample_processes(os.getpid())})
+            await asyncio.sleep(args.sample_seconds)
+
+    print(f"soak: {args.soak_seconds:.0f}s at c={concurrency}", file=sys.stderr)
+    task = asyncio.create_task(sampler())
+    try:
+        elapsed = await workload.run(host, port, concurrency, args.soak_seconds, recorder)
+    finally:
+        task.cancel()
+    soak = {"concurrency": concurrency, **recorder.summary(elapsed)}
+    _print_stage("soak", soak)
+
+    checks["rss_not_growing"] = _growth_check([s["rss_mb"] for s in samples], args.windows, args.max_rss_growth_mb)
+    checks["processes_not_growing"] = _growth_check([float(s["processes"]) for s in samples], args.windows, args.max_process_growth)
+
+    # Latency collapse: p99 per window, warm-up window excluded.
+    p99s = [_latency_ms(w).get("p99_ms") for w in recorder.windows[1:args.windows + 1]]
+    p99s = [p for p in p99s if p is not None]
+    if len(p99s) >= 2 and p99s[0]:
+        ratio = p99s[-1] / p99s[0]
+        checks["latency_stable"] = {"window_p99_ms": p99s, "ratio": round(ratio, 2), "max": args.max_p99_growth, "ok": ratio <= args.max_p99_growth}
+    soak["samples"] = samples
+    return soak
+
+
+def _growth_check(values: List[float], windows: int, tolerance: float) -> Dict[str, Any]:
+    result = growth(values, windows, tolerance)
+    result["ok"] = not result.get("growing", False)
+    return result
+
+
+def _print_stage(label: str, stage: Dict[str, Any]) -> None:
+    parts = []
+    for op, row in stage["operations"].items():
+        parts.append(f"{op} {row['rps']:.1f}/s p50 {row.get('p50_ms', 0):.1f} p99 {row.get('p99_ms', 0):.1f} ms"
+                     f" ({row['rejected']} rejected, {row['errors']} errors)")
+    print(f"  {label}: {'; '.join(parts)}", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", type=_parse_mix, default=_parse_mix("calculate=80,pdf=15,email=5"), help="operation weights, e.g. calculate=80,pdf=15,email=5")
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 8, 32], help="concurrent clients per stage, e.g. 1,8,32")
+    parser.add_argument("--stage-seconds", type=float, default=10.0)
+    parser.add_argument("--soak-seconds", type=float, default=300.0, help="0 skips the soak and its growth checks")
+    parser.add_argument("--soak-concurrency", type=int, default=0, help="defaults to the last --concurrency level")
+    parser.add_argument("--sample-seconds", type=float, default=2.0, help="RSS and process sampling interval during the soak")
+    parser.add_argument("--windows", type=int, default=3, help="soak windows compared after the warm-up window")
+    parser.add_argument("--max-rss-growth-mb", type=float, default=64.0)
+    parser.add_argument("--max-process-growth", type=float, default=0.0)
+    parser.add_argument("--max-p99-growth", type=float, default=3.0, help="allowed p99 ratio of the last soak window to the first")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--renderer", choices=("chromium", "native", "auto"), help="PDF renderer requested by /pdf and /email (server default if unset)")
+    parser.add_argument("--customers", type=int, default=100000, help="distinct customer names; fewer means more PDF cache hits")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=0, help="port for uvicorn (default: a free one)")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=LITERAL", help="extra env.py setting (repeatable)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--shutdown-grace", type=float, default=20.0)
+    parser.add_argument("--drain-seconds", type=float, default=30.0, help="time allowed for queued email to reach the sink")
+    parser.add_argument("--keep-workdir", action="store_true", help="keep env.py, the uvicorn log and the databases")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    print("Running load test", file=sys.stderr)
+    report = asyncio.run(run(args))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    failed = [name for name, check in report["checks"].items() if not check.get("ok", True)]
+    if failed:
+        print(f"Failed checks: {', '.join(failed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
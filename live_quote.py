@@ -0,0 +1,137 @@
+import re
+from typing import Any, Dict, List, Optional
+
+from rules_engine import CompiledRules, ModuleRow
+
+
+# Longest accepted client message; a full selection of every feature is well under this.
+MAX_MESSAGE_CHARS = 4096
+
+_SEPARATORS = re.compile(r"[\s,;]+")
+_STATES = {"on": True, "off": False, "true": True, "false": False, "1": True, "0": False}
+
+
+class QuoteSession:
+    """
+    The selection behind one /ws/quote connection and the result last sent for it.
+
+    The client sends toggles only: `housing=on`, or `event_count=12` for a count,
+    several per message separated by commas or spaces, or `reset` to clear
+    everything. Messages are applied as they arrive; `update()` then answers for
+    the latest selection, however many messages that covers. Only the modules
+    whose tables read a toggled bit are looked up again (CompiledRules.dependents),
+    and an update carries just the result fields that changed since the previous one:
+
+        {"seq": 12, "rules_version": "...", "quote_code": "...", "full": false,
+         "result": {"app_score": 24, "total_hours": 64,
+                    "module_breakdowns": {"app": {...}}, "justifications": [...]}}
+
+    `seq` is the number of client messages applied, so the client knows which of
+    its messages the result reflects. The first update, and the first after the
+    rules change, is `full` and holds the whole /calculate body.
+    """
+
+    def __init__(self, engine: CompiledRules) -> None:
+        self.engine = engine
+        self.mask = 0
+        self.received = 0
+        self.error: Optional[str] = None
+        self._sent_mask: Optional[int] = None
+        self._rows: List[ModuleRow] = []
+        self._justifications: List[Dict[str, Any]] = []
+
+    def receive(self, message: str) -> None:
+        """Applies one client message. An invalid message changes nothing; its error goes out with the next update."""
+        self.received += 1
+        try:
+            self.mask = self._apply(message)
+        except ValueError as e:
+            self.error = str(e)
+
+    def _apply(self, message: str) -> int:
+        if len(message) > MAX_MESSAGE_CHARS:
+            raise ValueError(f"Message longer than {MAX_MESSAGE_CHARS} characters")
+        text = message.strip()
+        if text.lower() == "reset":
+            return 0
+        mask = self.mask
+        for token in _SEPARATORS.split(text):
+            if not token:
+                continue
+            name, sep, value = token.partition("=")
+            if name in self.engine.quantities:
+                if not value.isdigit():
+                    raise ValueError(f"Expected {name}=<number>, got {token!r}")
+                mask = self.engine.with_value(mask, name, int(value))
+                continue
+            bit = self.engine.bits.get(name)
+            if bit is None:
+                raise ValueError(f"Unknown feature {name!r}")
+            state = _STATES.get(value.lower()) if sep else None
+            if state is None:
+                raise ValueError(f"Expected {name}=on or {name}=off, got {token!r}")
+            mask = mask | 1 << bit if state else mask & ~(1 << bit)
+        return mask
+
+    def _rebase(self, engine: CompiledRules) -> None:
+        # Carry the selection over to the new rules by feature name; counts over a new max are dropped.
+        mask = 0
+        for name, value in self.engine.flags_of(self.mask).items():
+            if value and (name in engine.bits or name in engine.quantities):
+                try:
+                    mask = engine.with_value(mask, name, value)
+                except ValueError:
+                    continue
+        self.mask = mask
+        self.engine = engine
+        self._sent_mask = None
+
+    def update(self, engine: CompiledRules) -> Dict[str, Any]:
+        """The message for the current selection under `engine` (the rules currently served)."""
+        if engine is not self.engine:
+            self._rebase(engine)
+        mask = self.mask
+        message: Dict[str, Any] = {
+            "seq": self.received,
+            "rules_version": engine.version,
+            "quote_code": engine.encode_mask(mask),
+        }
+        if self.error is not None:
+            message["error"] = self.error
+            self.error = None
+
+        if self._sent_mask is None:
+            result = engine.evaluate_mask(mask)
+            self._rows = engine.rows_for(mask)
+            self._justifications = result["justifications"]
+            self._sent_mask = mask
+            message.update(full=True, result=result)
+            return message
+
+        changed_bits = mask ^ self._sent_mask
+        self._sent_mask = mask
+        positions = set()
+        for bit in range(changed_bits.bit_length()):
+            if changed_bits >> bit & 1:
+                positions.update(engine.dependents[bit])
+
+        result: Dict[str, Any] = {}
+        breakdowns: Dict[str, Any] = {}
+        for i in sorted(positions):
+            module = engine.modules[i]
+            row = module.rows[module.index(mask)]
+            if row is self._rows[i]:
+                continue
+            self._rows[i] = row
+            breakdowns[module.key] = engine.breakdown(module, row)
+        if breakdowns:
+            for i, score_key, _ in engine.score_fields:
+                if engine.modules[i].key in breakdowns:
+                    result[score_key] = self._rows[i].total
+            result["total_hours"] = int(sum(row.total for row in self._rows))
+            result["module_breakdowns"] = breakdowns
+            justifications = engine.overall_justifications(self._rows)
+            if justifications != self._justifications:
+                result["justifications"] = self._justifications = justifications
+        message.update(full=False, result=result)
+        return message
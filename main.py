@@ -1,15 +1,37 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, Response
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 import asyncio
+import re
 import smtplib
 import sys
+import time
+from contextlib import asynccontextmanager
 from email.message import EmailMessage
 from email.utils import parseaddr
-from typing import Dict, List, Any
+from urllib.parse import quote
+from typing import Awaitable, Callable, Dict, List, Any, Literal, Optional, Tuple
 import env
+from render_pool import BrowserPool, PDF_OPTIONS
+from render_daemon import RenderDaemonClient, RenderDaemonUnavailable
+from pdf_cache import PdfCache, content_key
+from outbox import SmtpOutbox
+from batch import BatchEvaluator, DuplexStreamingResponse
+from zip_stream import stream_zip
+from pdf_native import render_report_pdf
+from report_template import ReportContent, ReportRenderer
+from response_cache import ResponseCache, etag_matches, render_json
+from rules_engine import MAX_FLAGS_PER_MODULE, InputOutOfRange
+from rules_store import RuleSet, RulesStore
+from optimizer import OBJECTIVES, optimize
+from quote_store import QuoteStore
+from live_quote import QuoteSession
+import quote_log
+from quote_log import QuoteLog
+from admission import AdmissionController, Overloaded
+from assets import AssetBundle, asset_response, REVALIDATE
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, Registry, StageTimer, request_elapsed
 
 if sys.platform == "win32":
     try:
@@ -24,8 +46,157 @@ SMTP_USERNAME=env.SMTP_USERNAME
 SMTP_PASSWORD=env.SMTP_PASSWORD
 SMTP_FROM=env.SMTP_FROM
 
+PDF_POOL_SIZE = int(getattr(env, "PDF_POOL_SIZE", 2))
+PDF_POOL_MAX_RENDERS = int(getattr(env, "PDF_POOL_MAX_RENDERS", 200))
+PDF_POOL_MAX_RSS_MB = int(getattr(env, "PDF_POOL_MAX_RSS_MB", 0))
+PDF_POOL_HEALTH_INTERVAL = float(getattr(env, "PDF_POOL_HEALTH_INTERVAL", 30))
+
+# When set, Chromium runs only in the shared render daemon (render_daemon.py) listening here.
+RENDER_DAEMON_SOCKET = getattr(env, "RENDER_DAEMON_SOCKET", None)
+RENDER_DAEMON_CONNECTIONS = int(getattr(env, "RENDER_DAEMON_CONNECTIONS", PDF_POOL_SIZE))
+RENDER_DAEMON_TIMEOUT = float(getattr(env, "RENDER_DAEMON_TIMEOUT", 120))
+# Retry-After (seconds) sent with the 503 when the daemon's queue is full.
+RENDER_DAEMON_BUSY_RETRY_AFTER = int(getattr(env, "RENDER_DAEMON_BUSY_RETRY_AFTER", 5))
+
+OUTBOX_WORKERS = int(getattr(env, "OUTBOX_WORKERS", 2))
+OUTBOX_MAX_ATTEMPTS = int(getattr(env, "OUTBOX_MAX_ATTEMPTS", 5))
+
+# "chromium" (Playwright), "native" (in-process, no browser) or "auto" (Chromium, else native).
+PDF_RENDERER = str(getattr(env, "PDF_RENDERER", "chromium")).lower()
+
+PDF_BATCH_CONCURRENCY = int(getattr(env, "PDF_BATCH_CONCURRENCY", PDF_POOL_SIZE))
+PDF_BATCH_MAX_ITEMS = int(getattr(env, "PDF_BATCH_MAX_ITEMS", 500))
+
+# PDF renders (cache misses) running at once across /pdf, /email and /pdf/batch.
+ADMISSION_RENDER_SLOTS = int(getattr(env, "ADMISSION_RENDER_SLOTS", PDF_POOL_SIZE * 2))
+# lane: (priority, max concurrent renders, max queued, max wait in seconds). A free slot goes
+# to the lowest priority value first; a full queue or an expired wait answers 503 + Retry-After.
+ADMISSION_LANES: Dict[str, Tuple[int, int, int, float]] = {
+    "pdf": (0, ADMISSION_RENDER_SLOTS, 32, 15.0),
+    "email": (1, ADMISSION_RENDER_SLOTS, 64, 30.0),
+    "batch": (2, PDF_BATCH_CONCURRENCY, 64, 300.0),
+}
+ADMISSION_LANES.update(getattr(env, "ADMISSION_LANES", {}))
+
+# Lifetime for shared caches of the GET /calculate and GET /pdf quote-code variants.
+QUOTE_GET_MAX_AGE = int(getattr(env, "QUOTE_GET_MAX_AGE", 300))
+
+CALCULATE_CACHE_MAX_ENTRIES = int(getattr(env, "CALCULATE_CACHE_MAX_ENTRIES", 4096))
+
+RULES_FILE = getattr(env, "RULES_FILE", "rules.json")
+# Seconds between checks of RULES_FILE for edits; 0 disables hot reload.
+RULES_POLL_INTERVAL = float(getattr(env, "RULES_POLL_INTERVAL", 2))
+RULES_VERSION_HEADER = "X-Rules-Version"
 
-app = FastAPI()
+# SQLite database for quotes saved with POST /calculate?save=true; empty disables saving.
+QUOTE_DB_PATH = getattr(env, "QUOTE_DB_PATH", "quotes.db")
+
+# Binary log of every computed quote, read by /analytics; empty disables it.
+QUOTE_LOG_PATH = getattr(env, "QUOTE_LOG_PATH", "quote_log.bin")
+
+PDF_CACHE_MAX_MB = int(getattr(env, "PDF_CACHE_MAX_MB", 64))
+PDF_CACHE_DIR = getattr(env, "PDF_CACHE_DIR", None)
+PDF_CACHE_MAX_DISK_MB = int(getattr(env, "PDF_CACHE_MAX_DISK_MB", 512))
+
+PDF_CACHE = PdfCache(
+    max_memory_bytes=PDF_CACHE_MAX_MB * 1024 * 1024,
+    disk_dir=PDF_CACHE_DIR,
+    max_disk_bytes=PDF_CACHE_MAX_DISK_MB * 1024 * 1024,
+)
+
+METRICS = Registry()
+HTTP_REQUESTS = METRICS.counter(
+    "psc_http_requests_total", "HTTP requests by route, method and status code.", ("route", "method", "status")
+)
+HTTP_DURATION = METRICS.histogram(
+    "psc_http_request_duration_seconds", "HTTP request latency by route, until the last byte is sent.", ("route", "method")
+)
+HTTP_IN_FLIGHT = METRICS.gauge("psc_http_requests_in_flight", "HTTP requests currently being served.")
+HTTP_ERRORS = METRICS.counter(
+    "psc_http_unhandled_errors_total", "Requests that ended in an unhandled exception, by route and exception type.", ("route", "type")
+)
+STAGES = StageTimer(
+    METRICS.histogram("psc_stage_duration_seconds", "Latency of each quote pipeline stage.", ("stage",)),
+    METRICS.counter("psc_stage_errors_total", "Exceptions raised by each pipeline stage, by exception type.", ("stage", "type")),
+)
+RENDERS_IN_FLIGHT = METRICS.gauge("psc_pdf_renders_in_flight", "PDF renders in progress (cache misses only).", ("renderer",))
+METRICS.callback_gauge("psc_pdf_cache", "PDF cache counters.", "stat", PDF_CACHE.stats)
+
+ADMISSION = AdmissionController(
+    ADMISSION_RENDER_SLOTS,
+    ADMISSION_LANES,
+    wait_seconds=METRICS.histogram("psc_admission_wait_seconds", "Time renders waited for an admission slot, by lane.", ("lane",)),
+    rejections=METRICS.counter("psc_admission_rejected_total", "Renders refused by admission control, by lane and reason.", ("lane", "reason")),
+)
+LIVE_SESSIONS = METRICS.gauge("psc_live_quote_sessions", "Open /ws/quote connections.")
+LIVE_MESSAGES = METRICS.counter(
+    "psc_live_quote_messages_total", "/ws/quote messages received from clients and updates sent back.", ("direction",)
+)
+METRICS.callback_gauge("psc_report_cache", "Report content cache counters.", "stat", lambda: REPORTS.stats())
+METRICS.callback_gauge("psc_admission", "Admission slots in use and queue depth per lane.", "stat", ADMISSION.stats)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm Chromium browsers shared by /pdf and /email for the life of the worker.
+    if RENDER_DAEMON_SOCKET:
+        # Browsers are shared by all workers through the daemon; this worker only sends it HTML.
+        pool = RenderDaemonClient(
+            RENDER_DAEMON_SOCKET,
+            max_connections=RENDER_DAEMON_CONNECTIONS,
+            timeout=RENDER_DAEMON_TIMEOUT,
+            busy_retry_after=RENDER_DAEMON_BUSY_RETRY_AFTER,
+        )
+    else:
+        pool = BrowserPool(
+            size=PDF_POOL_SIZE,
+            max_renders=PDF_POOL_MAX_RENDERS,
+            max_rss_mb=PDF_POOL_MAX_RSS_MB,
+            health_interval=PDF_POOL_HEALTH_INTERVAL,
+            stages=STAGES,
+        )
+        pool.start()
+    app.state.pdf_pool = pool
+
+    # Opened here rather than at import, so the file is only created by a running server.
+    quotes = QuoteStore(QUOTE_DB_PATH) if QUOTE_DB_PATH else None
+    app.state.quotes = quotes
+
+    # SMTP sessions are opened lazily by the workers, so a missing relay does not block startup.
+    # Job state also goes to the quote store, so /email/{job_id} works from any worker.
+    outbox = SmtpOutbox(
+        _smtp_connect,
+        workers=OUTBOX_WORKERS,
+        max_attempts=OUTBOX_MAX_ATTEMPTS,
+        stages=STAGES,
+        on_change=quotes.save_email_job if quotes is not None else None,
+    )
+    outbox.start()
+    app.state.outbox = outbox
+    log = QuoteLog(QUOTE_LOG_PATH) if QUOTE_LOG_PATH else None
+    app.state.quote_log = log
+
+    RULES.start()
+    try:
+        yield
+    finally:
+        RULES.close()
+        app.state.pdf_pool = None
+        app.state.outbox = None
+        await asyncio.to_thread(outbox.close)
+        app.state.quotes = None
+        if quotes is not None:
+            quotes.close()
+        app.state.quote_log = None
+        if log is not None:
+            log.close()
+        if isinstance(pool, RenderDaemonClient):
+            pool.close()
+        else:
+            await asyncio.to_thread(pool.close)
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     '*',
@@ -42,7 +213,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Outermost, so request latency includes CORS handling.
+app.add_middleware(
+    MetricsMiddleware,
+    requests=HTTP_REQUESTS,
+    durations=HTTP_DURATION,
+    in_flight=HTTP_IN_FLIGHT,
+    errors=HTTP_ERRORS,
+)
+
+METRICS.callback_gauge(
+    "psc_pdf_pool", "Chromium pool counters and queue depth.", "stat",
+    lambda: app.state.pdf_pool.stats() if getattr(app.state, "pdf_pool", None) is not None else None,
+)
+METRICS.callback_gauge(
+    "psc_email_jobs", "Email outbox jobs by status.", "status",
+    lambda: app.state.outbox.stats() if getattr(app.state, "outbox", None) is not None else None,
+)
+METRICS.callback_gauge(
+    "psc_quote_log", "Quote log records appended and dropped.", "stat",
+    lambda: app.state.quote_log.stats() if getattr(app.state, "quote_log", None) is not None else None,
+)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(InputOutOfRange)
+async def input_out_of_range_handler(request: Request, exc: InputOutOfRange):
+    # A count above its rule's max: the limit lives in the rules file, not the request model.
+    return JSONResponse(status_code=422, content={"detail": str(exc)})
+
+# The page and static files, fingerprinted and compressed in memory once per process.
+ASSETS = AssetBundle("static", "html/index.html")
+METRICS.callback_gauge("psc_static_assets", "Static files held in memory and their size with all variants.", "stat", ASSETS.stats)
+
+
+# A count's field in the quote mask lives inside one module's table, so it can never exceed this.
+COUNT_CEILING = (1 << MAX_FLAGS_PER_MODULE) - 1
 
 
 class ProjectFeatures(BaseModel):
@@ -60,6 +272,7 @@ class ProjectFeatures(BaseModel):
     CEUs: bool = False
     sponsor_branding: bool = False
     leads: bool = False
+    wayfinding: bool = False
 
     complex_workflows: bool = False
     multiple_review_rounds: bool = False
@@ -86,546 +299,468 @@ class ProjectFeatures(BaseModel):
     appointments_include: bool = False
     kiosk_include: bool = False
 
+    SSO: bool = False
+    # Counts. Pydantic rejects fractions and anything no module could hold; each rule's `max`
+    # in the rules file is the real upper bound and is checked by the engine (also a 422).
+    integration_count: int = Field(0, ge=0, le=COUNT_CEILING)
+    event_count: int = Field(0, ge=0, le=COUNT_CEILING)
+    poc_count: int = Field(0, ge=0, le=COUNT_CEILING)
+    recurring_call_weeks: int = Field(0, ge=0, le=COUNT_CEILING)
+
+
+PdfRenderer = Literal["chromium", "native", "auto"]
+
 
 class EmailRequest(BaseModel):
     to_email: str
     customer_name: str
     features: ProjectFeatures
+    renderer: Optional[PdfRenderer] = None
+    rules_version: Optional[str] = None
 
 
 class PdfRequest(BaseModel):
     customer_name: str
     features: ProjectFeatures
+    renderer: Optional[PdfRenderer] = None
+    rules_version: Optional[str] = None
 
 
-@app.get("/")
-def index():
-    return FileResponse('html/index.html')
+ReportFormat = Literal["text", "markdown", "html"]
+
+
+class ReportRequest(BaseModel):
+    customer_name: str
+    features: ProjectFeatures
+    rules_version: Optional[str] = None
+
+
+@app.api_route("/", methods=["GET", "HEAD"])
+def index(request: Request):
+    return asset_response(ASSETS.index, request, REVALIDATE)
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+def static_asset(path: str, request: Request):
+    found = ASSETS.lookup(f"static/{path}")
+    if found is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    asset, cache_control = found
+    return asset_response(asset, request, cache_control)
 
 @app.get("/health")
 def health():
     return {"ok": True}
 
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(content=METRICS.render(), media_type=METRICS_CONTENT_TYPE)
+
+def _observe_validation(request: Request) -> None:
+    # Everything before the handler runs: reading the body and Pydantic validation.
+    elapsed = request_elapsed(request.scope)
+    if elapsed is not None:
+        STAGES.observe("validation", elapsed)
+
 DISCLAIMER_TEXT = (
-    "Disclaimer: Additional hours (not included) will be required for any new dev work, custom work, "
-    "integrations/SSO, multiple POCs/Divisions, and for multi-event customers or those with committed weekly calls, as well as customers "
-    "with more than 8 events a year."
+    "Disclaimer: Additional hours (not included) will be required for any new dev work or custom work. "
+    "Integrations/SSO, POCs/Divisions, committed weekly calls and additional events are only covered "
+    "as entered above."
 )
 
-JUSTIFICATIONS: Dict[str, str] = {
-    "kickoff_wrapup": "Kick Off and Wrap Up calls",
-    "module_training": "Module Level Training",
-    "support": "Feedback, Questions, and Support",
-    "build_config": "Build and Configure",
-    "review_testing": "Review and Testing",
-    "prepost_meetings": "Meetings for pre and post launch",
-}
+# Skeletons are compiled once; module checklists and result cards are cached per distinct quote.
+REPORTS = ReportRenderer(DISCLAIMER_TEXT)
 
-FEATURE_RULES: Dict[str, Dict[str, Any]] = {
-    # --- Attendee Registration (BRE) ---
-    "bre_include": {
-        "module": "bre",
-        "requires": None,
-        "hours": {
-            "kickoff_wrapup": 2,
-            "module_training": 2,
-            "support": 2,
-            "build_config": 2,
-            "review_testing": 1,
-            "prepost_meetings": 1,
-        },
-    },
-    "workflows": {
-        "module": "bre",
-        "requires": "bre_include",
-        "hours": {
-            "support": 2,
-            "build_config": 2,
-            "review_testing": 2,
-        },
-    },
-    "field_logic": {
-        "module": "bre",
-        "requires": "bre_include",
-        "hours": {
-            "module_training": 1,
-            "support": 3,
-            "build_config": 4,
-            "review_testing": 2,
-        },
-    },
-    "product_logic": {
-        "module": "bre",
-        "requires": "bre_include",
-        "hours": {
-            "module_training": 1,
-            "support": 3,
-            "build_config": 4,
-            "review_testing": 2,
-        },
-    },
-    "session_logic": {
-        "module": "bre",
-        "requires": "bre_include",
-        "hours": {
-            "module_training": 1,
-            "support": 3,
-            "build_config": 4,
-            "review_testing": 2,
-        },
-    },
-    "complex_reporting": {
-        "module": "bre",
-        "requires": "bre_include",
-        "hours": {
-            "module_training": 2,
-            "support": 6,
-            "build_config": 6,
-            "review_testing": 6,
-        },
-    },
-    "housing": {
-        "module": "bre",
-        "requires": "bre_include",
-        "hours": {
-            "module_training": 1,
-            "support": 3,
-            "build_config": 4,
-            "review_testing": 2,
-            "prepost_meetings": 1,
-        },
-    },
-    "table_seating": {
-        "module": "bre",
-        "requires": "bre_include",
-        "hours": {
-            "module_training": 1,
-            "support": 3,
-            "build_config": 4,
-            "review_testing": 2,
-            "prepost_meetings": 1,
-        },
-    },
-    "lookup_integration": {
-        "module": "bre",
-        "requires": "bre_include",
-        "hours": {
-            "support": 2,
-            "build_config": 2,
-            "review_testing": 2,
-        },
-    },
-
-    # --- Mobile App (APP) ---
-    "app_include": {
-        "module": "app",
-        "requires": None,
-        "hours": {
-            "kickoff_wrapup": 2,
-            "module_training": 1,
-            "support": 1,
-            "review_testing": 1,
-        },
-    },
-    "hybrid_virtual": {
-        "module": "app",
-        "requires": "app_include",
-        "hours": {
-            "module_training": 2,
-            "support": 4,
-            "build_config": 4,
-            "review_testing": 4,
-            "prepost_meetings": 2,
-        },
-    },
-    "multi_event": {
-        "module": "app",
-        "requires": "app_include",
-        "hours": {
-            "build_config": 1,
-            "review_testing": 1,
-        },
-    },
-    "CEUs": {
-        "module": "app",
-        "requires": "app_include",
-        "hours": {
-            "support": 2,
-            "build_config": 2,
-            "review_testing": 2,
-            "prepost_meetings": 1,
-        },
-    },
-    "sponsor_branding": {
-        "module": "app",
-        "requires": "app_include",
-        "hours": {
-            "support": 2,
-            "build_config": 2,
-            "review_testing": 2,
-        },
-    },
-    "leads": {
-        "module": "app",
-        "requires": "app_include",
-        "hours": {
-            "module_training": 1,
-            "prepost_meetings": 1,
-        },
-    },
-
-    #--- Appointments ---
-    "appointments_include": {
-        "module": "appointments",
-        "requires": None,
-        "hours": {
-            "kickoff_wrapup": 2,
-            "module_training": 1,
-            "support": 1,
-            "review_testing": 1,
-        },
-    },
-    "multi_scheduling": {
-        "module": "appointments",
-        "requires": "appointments_include",
-        "hours": {
-            "module_training": 2,
-            "support": 2,
-            "build_config": 2,
-            "review_testing": 2,
-            "prepost_meetings": 2,
-        },
-    },
-    "first_time_system": {
-        "module": "appointments",
-        "requires": "appointments_include",
-        "hours": {
-            "module_training": 2,
-            "support": 3,
-            "build_config": 2,
-            "review_testing": 2,
-            "prepost_meetings": 2,
-        },
-    },
-    "matchmaking": {
-        "module": "appointments",
-        "requires": "appointments_include",
-        "hours": {
-            "module_training": 4,
-            "support": 2,
-            "build_config": 6,
-            "review_testing": 6,
-            "prepost_meetings": 4,
-        },
-    },
-
-    #--- Abstract ---
-    "abs_include": {
-        "module": "abs",
-        "requires": None,
-        "hours": {
-            "kickoff_wrapup": 2,
-            "module_training": 2,
-            "prepost_meetings": 1,
-        },
-    },
-    "complex_workflows": {
-        "module": "abs",
-        "requires": "abs_include",
-        "hours": {
-            "module_training": 2,
-            "support": 2, 
-            "build_config": 1,
-            "review_testing": 1,
-            "prepost_meetings": 2,
-        },
-    },
-    "multiple_review_rounds": {
-        "module": "abs",
-        "requires": "abs_include",
-        "hours": {
-            "module_training": 3,
-            "support": 4,
-            "build_config": 2,
-            "review_testing": 1,
-            "prepost_meetings": 2
-        },
-    },
-    "multiple_proposal_calls": {
-        "module": "abs",
-        "requires": "abs_include",
-        "hours": {
-            "support": 1,
-            "build_config": 1,
-            "prepost_meetings": 1,
-        },
-    },
-
-    #--- Exhibitor Registration ---
-    "exh_include": {
-        "module": "exh",
-        "requires": None,
-        "hours": {
-            "kickoff_wrapup": 1,
-            "module_training": 1,
-            "support": 1,
-            "build_config": 1,
-            "review_testing": 1,
-            "prepost_meetings": 1,
-        },
-    },
-    "floor_plan": {
-        "module": "exh",
-        "requires": "exh_include",
-        "hours": {
-            "module_training": 1,
-            "support": 1,
-            "build_config": 2,
-            "review_testing": 1,
-        },
-    },
-    "year_round": {
-        "module": "exh",
-        "requires": "exh_include",
-        "hours": {
-            "module_training": 2,
-            "support": 4,
-            "build_config": 3,
-            "review_testing": 2,
-            "prepost_meetings": 4,
-        },
-    },
-    "complex_sponsors": {
-        "module": "exh",
-        "requires": "exh_include",
-        "hours": {
-            "module_training": 1,
-            "support": 4,
-            "build_config": 4,
-            "review_testing": 3,
-            "prepost_meetings": 2,
-        },
-    },
-
-    #--- Kiosk/Badges ---
-    "kiosk_include": {
-        "module": "kiosk",
-        "requires": None,
-        "hours": {
-            "module_training": 1,
-            "support": 1,
-            "build_config": 1,
-            "review_testing": 1,
-            "prepost_meetings": 1,
-        },
-    },
-    "personal_agenda": {
-        "module": "kiosk",
-        "requires": "kiosk_include",
-        "hours": {
-            "support": 1,
-            "build_config": 2,
-            "review_testing": 2,
-        },
-    },
-    "double_sided": {
-        "module": "kiosk",
-        "requires": "kiosk_include",
-        "hours": {
-            "support": 1,
-            "build_config": 1,
-            "review_testing": 1,
-        },
-    },
-    "logic_based_badges": {
-        "module": "kiosk",
-        "requires": "kiosk_include",
-        "hours": {
-            "support": 1,
-            "build_config": 2,
-            "review_testing": 8,
-        },
-    },
-    "multi_badge_types": {
-        "module": "kiosk",
-        "requires": "kiosk_include",
-        "hours": {
-            "support": 1,
-            "build_config": 1,
-            "review_testing": 1,
-        },
-    },
-    "customer_hardware": {
-        "module": "kiosk",
-        "requires": "kiosk_include",
-        "hours": {
-            "module_training": 1,
-            "support": 1,
-            "review_testing": 1,
-        },
-    },
-}
+# Feature rules, labels and module groups live in RULES_FILE and are reloaded when it changes.
+RULES = RulesStore(RULES_FILE, ProjectFeatures.model_fields.keys(), poll_interval=RULES_POLL_INTERVAL)
 
-MODULE_LABELS: Dict[str, str] = {
-    "bre": "Attendee Registration",
-    "app": "Mobile App (Connect) and Connect Online",
-    "appointments": "Appointments",
-    "abs": "Abstract / Speaker Management",
-    "exh": "Exhibitor Registration / Booth Selection",
-    "kiosk": "Kiosk / Badge Printing",
-}
+CALCULATE_CACHE = ResponseCache(max_entries=CALCULATE_CACHE_MAX_ENTRIES)
+DELTAS_CACHE = ResponseCache(max_entries=CALCULATE_CACHE_MAX_ENTRIES)
+
+def calculate_classification(features: ProjectFeatures, rules: Optional[RuleSet] = None):
+    with STAGES.time("calculate"):
+        return (rules or RULES.current).engine.evaluate(features)
 
-def _add_hours(target: Dict[str, float], key: str, amount: float) -> None:
-    if not amount:
+def _log_quote(rules: RuleSet, mask: int, source: str) -> None:
+    log = getattr(app.state, "quote_log", None)
+    if log is None:
         return
-    target[key] = float(target.get(key, 0)) + float(amount)
+    engine = rules.engine
+    totals = {m.key: row.total for m, row in zip(engine.modules, engine.rows_for(mask))}
+    log.append(time.time(), mask, engine.version, engine.bit_names, totals, source)
+
+# Response shapes of /calculate (see calculate_endpoint).
+CalculateView = Literal["full", "totals", "compact"]
+
+def _calculate_shape(engine: Any, view: str, fields: Optional[str]) -> Tuple[str, Optional[Tuple[str, ...]]]:
+    if fields is None:
+        return view, None
+    if view != "full":
+        raise HTTPException(status_code=400, detail="fields only applies to view=full")
+    wanted = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = sorted(wanted.difference(engine.result_fields))
+    if unknown or not wanted:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown) or '(none given)'}; expected some of {', '.join(engine.result_fields)}",
+        )
+    # Always in result order, so one selection has one cache entry and one ETag.
+    return view, tuple(f for f in engine.result_fields if f in wanted)
+
+def _calculate_response(
+    rules: RuleSet,
+    mask: int,
+    request: Request,
+    cache_control: Optional[str] = None,
+    view: str = "full",
+    fields: Optional[str] = None,
+) -> Response:
+    engine = rules.engine
+    view, selected = _calculate_shape(engine, view, fields)
+    _log_quote(rules, mask, "calculate")
+    # The body is a pure function of (rules version, feature mask, shape), so the ETag needs no hashing.
+    etag = f'"{engine.version}-{mask:x}{_shape_suffix(view, selected)}"'
+    headers = {"ETag": etag, "X-Quote-Code": engine.encode_mask(mask), RULES_VERSION_HEADER: rules.version}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=_calculate_body(engine, mask, view, selected), media_type="application/json", headers=headers)
+
+def _shape_suffix(view: str, selected: Optional[Tuple[str, ...]]) -> str:
+    if selected is not None:
+        return "-f." + ".".join(selected)
+    return {"full": "", "totals": "-t", "compact": "-c"}[view]
+
+def _calculate_body(engine: Any, mask: int, view: str = "full", selected: Optional[Tuple[str, ...]] = None) -> bytes:
+    def build() -> Dict[str, Any]:
+        with STAGES.time("calculate"):
+            if view == "totals":
+                return engine.totals(mask)
+            if view == "compact":
+                return engine.compact(mask)
+            result = engine.evaluate_mask(mask)
+            return result if selected is None else {k: result[k] for k in selected}
+
+    # The full view keeps the plain mask as its key (it is also what quotes are saved with).
+    key = mask if view == "full" and selected is None else (mask, view, selected)
+    return CALCULATE_CACHE.get_or_build(engine.version, key, build)
+
+def _quote_store() -> QuoteStore:
+    quotes = getattr(app.state, "quotes", None)
+    if quotes is None:
+        raise HTTPException(status_code=503, detail="Quote storage is not enabled")
+    return quotes
+
+def _save_quote_response(rules: RuleSet, features: ProjectFeatures, customer: Optional[str]) -> Response:
+    customer = (customer or "").strip()
+    if len(customer) < 2:
+        raise HTTPException(status_code=400, detail="Customer name is required to save a quote")
+    quotes = _quote_store()
+
+    engine = rules.engine
+    mask = engine.mask_of(features)
+    _log_quote(rules, mask, "calculate")
+    body = _calculate_body(engine, mask)
+    quote_code = engine.encode_mask(mask)
+    with STAGES.time("quote_save"):
+        quote_id = quotes.save(
+            customer,
+            rules.version,
+            quote_code,
+            engine.flags_of(mask),
+            body,
+            _quote_report(features, rules).as_dict(),
+        )
+    # The cached body is a JSON object; splice the id in rather than re-serializing it.
+    body = body[:-1] + b',"quote_id":"' + quote_id.encode("ascii") + b'"}'
+    return Response(
+        status_code=201,
+        content=body,
+        media_type="application/json",
+        headers={
+            "Location": f"/quotes/{quote_id}",
+            "X-Quote-Code": quote_code,
+            RULES_VERSION_HEADER: rules.version,
+        },
+    )
+
+def _decode_quote_code(rules: RuleSet, code: str) -> int:
+    try:
+        return rules.engine.decode_mask(code)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid quote code: {e}")
+
+def _features_from_mask(rules: RuleSet, mask: int) -> ProjectFeatures:
+    # The mask only carries known flags, so full model validation can be skipped.
+    return ProjectFeatures.model_construct(**rules.engine.flags_of(mask))
 
 @app.post("/calculate")
-def calculate_classification(features: ProjectFeatures):
-    per_module_buckets: Dict[str, Dict[str, float]] = {
-        module_key: {k: 0.0 for k in JUSTIFICATIONS.keys()} for module_key in MODULE_LABELS.keys()
-    }
+def calculate_endpoint(
+    features: ProjectFeatures,
+    request: Request,
+    save: bool = False,
+    customer: Optional[str] = None,
+    view: CalculateView = "full",
+    fields: Optional[str] = None,
+):
+    """
+    With `save=true&customer=...` the quote is also stored and the body carries its `quote_id`.
+
+    `view` picks a smaller shape for callers that only need numbers:
+      full:    the whole result (default)
+      totals:  {"total_hours", "modules": {module: hours}}
+      compact: module totals and per-module bucket hours as arrays; labels and
+               order come from /calculate/dictionary, fetched once per rules version
+    `fields=total_hours,module_breakdowns` keeps only those keys of the full result.
+    """
+    _observe_validation(request)
+    rules = RULES.current
+    if save:
+        return _save_quote_response(rules, features, customer)
+    return _calculate_response(rules, rules.engine.mask_of(features), request, view=view, fields=fields)
+
+@app.get("/calculate")
+def calculate_get_endpoint(request: Request, f: str, view: CalculateView = "full", fields: Optional[str] = None):
+    """Same result as POST /calculate for a quote code (see the X-Quote-Code response header)."""
+    rules = RULES.current
+    return _calculate_response(
+        rules, _decode_quote_code(rules, f), request, f"public, max-age={QUOTE_GET_MAX_AGE}", view, fields
+    )
 
-    # Apply hour rules
-    for feature_name, rule in FEATURE_RULES.items():
-        if not getattr(features, feature_name, False):
-            continue
-
-        requires = rule.get("requires")
-        if requires and not getattr(features, requires, False):
-            continue
-
-        module_key = rule["module"]
-        hours_map: Dict[str, float] = rule.get("hours", {})
-        for bucket_key, amount in hours_map.items():
-            _add_hours(per_module_buckets[module_key], bucket_key, amount)
-
-    include_by_module = {
-        "bre": "bre_include",
-        "app": "app_include",
-        "abs": "abs_include",
-        "exh": "exh_include",
-        "appointments": "appointments_include",
-        "kiosk": "kiosk_include",
-    }
-    for module_key, include_key in include_by_module.items():
-        if not getattr(features, include_key, False):
-            per_module_buckets[module_key] = {k: 0.0 for k in JUSTIFICATIONS.keys()}
-
-    # Totals per module
-    module_totals: Dict[str, int] = {
-        module_key: int(sum(per_module_buckets[module_key].values()))
-        for module_key in MODULE_LABELS.keys()
+def _dictionary_response(rules: RuleSet, request: Request, cache_control: str) -> Response:
+    engine = rules.engine
+    etag = f'"{engine.version}-dictionary"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Content-Location": f"/calculate/dictionary/{rules.version}",
+        RULES_VERSION_HEADER: rules.version,
     }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    body = CALCULATE_CACHE.get_or_build(engine.version, "dictionary", engine.dictionary)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/calculate/dictionary")
+def calculate_dictionary_endpoint(request: Request):
+    """Module and bucket labels for `view=compact` results, in array order."""
+    return _dictionary_response(RULES.current, request, "no-cache")
+
+@app.get("/calculate/dictionary/{rules_version}")
+def calculate_dictionary_versioned_endpoint(rules_version: str, request: Request):
+    # Compact results name their rules_version, so this URL can be cached for good.
+    rules = RULES.current
+    if rules_version != rules.version:
+        raise HTTPException(status_code=404, detail="Unknown rules version; fetch /calculate/dictionary for the current one")
+    return _dictionary_response(rules, request, "public, max-age=31536000, immutable")
+
+def _deltas_response(rules: RuleSet, mask: int, request: Request, cache_control: Optional[str] = None) -> Response:
+    engine = rules.engine
+    etag = f'"{engine.version}-{mask:x}-d"'
+    headers = {"ETag": etag, "X-Quote-Code": engine.encode_mask(mask), RULES_VERSION_HEADER: rules.version}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    def build() -> Dict[str, Any]:
+        with STAGES.time("deltas"):
+            return engine.deltas(mask)
+
+    body = DELTAS_CACHE.get_or_build(engine.version, mask, build)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.post("/calculate/deltas")
+def calculate_deltas_endpoint(features: ProjectFeatures, request: Request):
+    """
+    For the given selection, how many hours toggling each feature would add or remove,
+    overall (`delta`) and per module (`modules`), e.g. to label options "+14 hrs".
+    """
+    _observe_validation(request)
+    rules = RULES.current
+    return _deltas_response(rules, rules.engine.mask_of(features), request)
+
+@app.get("/calculate/deltas")
+def calculate_deltas_get_endpoint(request: Request, f: str):
+    rules = RULES.current
+    return _deltas_response(rules, _decode_quote_code(rules, f), request, f"public, max-age={QUOTE_GET_MAX_AGE}")
 
-    # Overall total
-    total_hours = int(sum(module_totals.values()))
+@app.websocket("/ws/quote")
+async def live_quote_socket(websocket: WebSocket):
+    """
+    Live quote channel: the client sends toggles ("housing=on") and gets back
+    sequence-numbered results carrying only what changed (see QuoteSession).
 
-    # Overall scope breakdown (by bucket across all modules)
-    overall_justifications = []
-    for bucket_key in JUSTIFICATIONS.keys():
-        hours = int(sum(per_module_buckets[m].get(bucket_key, 0) for m in MODULE_LABELS.keys()))
-        if hours > 0:
-            overall_justifications.append(
-                {"key": bucket_key, "label": JUSTIFICATIONS[bucket_key], "hours": hours}
+    Messages are applied as soon as they arrive, while updates go out one at a
+    time. A client that toggles faster than updates can be sent gets one update
+    for the latest selection instead of one per toggle.
+    """
+    await websocket.accept()
+    session = QuoteSession(RULES.current.engine)
+    pending = asyncio.Event()
+    pending.set()  # the initial full result
+
+    async def receive() -> None:
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                text = message.get("text")
+                if text is None:
+                    text = (message.get("bytes") or b"").decode("utf-8", "replace")
+                session.receive(text)
+                LIVE_MESSAGES.inc("received")
+                pending.set()
+        finally:
+            pending.set()
+
+    reader = asyncio.create_task(receive())
+    LIVE_SESSIONS.inc()
+    try:
+        while True:
+            await pending.wait()
+            if reader.done():
+                break
+            pending.clear()
+            with STAGES.time("live_quote"):
+                update = render_json(session.update(RULES.current.engine)).decode("utf-8")
+            await websocket.send_text(update)
+            LIVE_MESSAGES.inc("sent")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        LIVE_SESSIONS.dec()
+
+def _quote_log_path() -> str:
+    if not QUOTE_LOG_PATH:
+        raise HTTPException(status_code=503, detail="The quote log is not enabled")
+    return QUOTE_LOG_PATH
+
+@app.get("/analytics")
+def analytics_endpoint(since: Optional[float] = None, until: Optional[float] = None, top: int = 10):
+    """
+    Quotes logged between `since` and `until` (Unix seconds): counts by source and rules
+    version, how often each feature is selected, the most common selections and
+    percentiles of the hours per module and overall.
+    """
+    with STAGES.time("analytics"):
+        return quote_log.summarize(_quote_log_path(), since, until, min(max(top, 0), 100))
+
+@app.get("/analytics/cooccurrence")
+def analytics_cooccurrence_endpoint(since: Optional[float] = None, until: Optional[float] = None, top: int = 50):
+    """Feature pairs most often selected together."""
+    with STAGES.time("analytics"):
+        return quote_log.cooccurrence(_quote_log_path(), since, until, min(max(top, 0), 1000))
+
+class OptimizeRequest(BaseModel):
+    max_hours: float
+    required: List[str] = []
+    forbidden: List[str] = []
+    objective: Literal[OBJECTIVES] = "features"  # type: ignore[valid-type]
+    weights: Dict[str, float] = {}
+    quantities: Dict[str, int] = {}
+    limit: int = 5
+
+@app.post("/optimize")
+def optimize_endpoint(req: OptimizeRequest, request: Request):
+    """
+    Best feature selections whose total stays within `max_hours`, e.g. "60 hours, must
+    include Attendee Registration with housing". Each selection carries its quote code.
+    Counts (`quantities`, e.g. {"event_count": 12}) describe the customer rather than
+    the scope, so they are held at the given values (0 if left out).
+    """
+    _observe_validation(request)
+    if req.max_hours < 0:
+        raise HTTPException(status_code=400, detail="max_hours must not be negative")
+    rules = RULES.current
+    try:
+        with STAGES.time("optimize"):
+            selections = optimize(
+                rules.engine,
+                req.max_hours,
+                required=req.required,
+                forbidden=req.forbidden,
+                objective=req.objective,
+                weights=req.weights,
+                quantities=req.quantities,
+                limit=min(max(req.limit, 1), 50),
             )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(
+        content={"objective": req.objective, "max_hours": req.max_hours, "selections": selections},
+        headers={RULES_VERSION_HEADER: rules.version},
+    )
 
-    return {
-        "bre_score": module_totals["bre"],
-        "bre_classification": "",
-        "app_score": module_totals["app"],
-        "app_classification": "",
-        "abs_score": module_totals["abs"],
-        "abs_classification": "",
-        "exh_score": module_totals["exh"],
-        "exh_classification": "",
-        "appointments_score": module_totals["appointments"],
-        "appointments_classification": "",
-        "kiosk_score": module_totals["kiosk"],
-        "kiosk_classification": "",
-        "total_hours": total_hours,
-        "reasons": [],
-
-        "module_breakdowns": {
-            module_key: {
-                "key": module_key,
-                "label": MODULE_LABELS[module_key],
-                "total_hours": int(sum(per_module_buckets[module_key].values())),
-                "items": [
-                    {
-                        "key": bucket_key,
-                        "label": JUSTIFICATIONS[bucket_key],
-                        "hours": int(per_module_buckets[module_key].get(bucket_key, 0)),
-                    }
-                    for bucket_key in JUSTIFICATIONS.keys()
-                    if per_module_buckets[module_key].get(bucket_key, 0) and per_module_buckets[module_key].get(bucket_key, 0) > 0
-                ],
-            }
-            for module_key in MODULE_LABELS.keys()
-        },
+BATCH_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
 
-        "justifications": overall_justifications,
-    }
+def _batch_format(value: Optional[str]) -> Optional[str]:
+    value = (value or "").lower()
+    if "csv" in value:
+        return "csv"
+    if "ndjson" in value or "jsonl" in value or "json" in value:
+        return "ndjson"
+    return None
 
-FEATURE_LABELS: Dict[str, str] = {
-    # Base toggles
-    "bre_include": "Attendee Registration — Basic Implementation",
-    "app_include": "Mobile App (Connect) and Connect Online — Basic Implementation",
-    "abs_include": "Abstract / Speaker Management — Basic Implementation",
-    "exh_include": "Exhibitor Registration / Booth Selection — Basic Implementation",
-    "appointments_include": "Appointment Management — Basic Implementation",
-    "kiosk_include": "Kiosk / Badge Printing — Basic Implementation",
-
-    # BRE
-    "workflows": "More than 3 workflows",
-    "field_logic": "Complex logic for fields",
-    "product_logic": "Product logic",
-    "session_logic": "Session logic",
-    "complex_reporting": "Custom or complex reporting needs",
-    "housing": "Housing",
-    "table_seating": "Table seating",
-    "lookup_integration": "Lookup integration",
-
-    # APP
-    "hybrid_virtual": "Hybrid or Virtual",
-    "multi_event": "Multi-Event App",
-    "CEUs": "Complex CEs",
-    "sponsor_branding": "Emphasis on branding or sponsorship",
-    "leads": "Leads",
-
-    # ABS
-    "complex_workflows": "Complex workflows for submission",
-    "multiple_review_rounds": "Multiple rounds of review",
-    "multiple_proposal_calls": "Multiple calls for proposals",
-
-    # EXH
-    "floor_plan": "Floor plans",
-    "year_round": "Year-Round",
-    "complex_sponsors": "Complex sponsorship options",
-
-    # Appointments
-    "multi_scheduling": "Multiple types of scheduling",
-    "first_time_system": "First time appointment system user",
-    "matchmaking": "Matchmaking required",
-
-    # Kiosk
-    "personal_agenda": "Personal Agenda",
-    "double_sided": "Double sided",
-    "logic_based_badges": "Logic based badges",
-    "multi_badge_types": "Multiple types of badges by attendee type",
-    "customer_hardware": "Customer using their own hardware",
-}
+@app.post("/calculate/batch")
+async def calculate_batch(request: Request, format: Optional[str] = None, output: Optional[str] = None):
+    """
+    Scores a streamed CSV (header row of feature names) or NDJSON body, one quote per
+    row, and streams back one result per row. An optional `id` column/key is echoed.
+    """
+    input_format = _batch_format(format or request.headers.get("content-type"))
+    if input_format is None:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson (or pass ?format=csv|ndjson)")
+
+    output_format = _batch_format(output) or _batch_format(request.headers.get("accept")) or input_format
+    # The whole stream is scored with the rules that were live when it started.
+    rules = RULES.current
+    evaluator = BatchEvaluator(rules.engine)
+    return DuplexStreamingResponse(
+        evaluator.stream(request.stream(), input_format, output_format),
+        media_type=BATCH_MEDIA_TYPES[output_format],
+        headers={RULES_VERSION_HEADER: rules.version},
+    )
 
-MODULE_GROUPS: Dict[str, List[str]] = {
-    "Attendee Registration": ["bre_include", "workflows", "field_logic", "product_logic", "session_logic", "complex_reporting", "housing", "table_seating", "lookup_integration"],
-    "Mobile App (Connect) and Connect Online": ["app_include", "hybrid_virtual", "multi_event", "CEUs", "sponsor_branding", "leads"],
-    "Kiosk / Badge Printing": ["kiosk_include", "personal_agenda", "double_sided", "logic_based_badges", "multi_badge_types", "customer_hardware"],
-    "Exhibitor Registration / Booth Selection": ["exh_include", "floor_plan", "year_round", "complex_sponsors"],
-    "Abstract / Speaker Management": ["abs_include", "complex_workflows", "multiple_review_rounds", "multiple_proposal_calls"],
-    "Appointment Management": ["appointments_include", "multi_scheduling", "first_time_system", "matchmaking"],
-}
+def _rules_bundle_response(rules: RuleSet, request: Request, cache_control: str) -> Response:
+    bundle = rules.bundle
+    headers = {
+        "ETag": bundle.etag,
+        "Cache-Control": cache_control,
+        "Content-Location": f"/rules/{bundle.hash}",
+        RULES_VERSION_HEADER: rules.version,
+    }
+    if etag_matches(request.headers.get("if-none-match"), bundle.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=bundle.body, media_type="application/json", headers=headers)
+
+@app.get("/rules")
+def rules_endpoint(request: Request):
+    # Always revalidated (cheap 304), so a rules change reaches clients on their next load.
+    return _rules_bundle_response(RULES.current, request, "no-cache")
+
+@app.get("/rules/status")
+def rules_status():
+    return RULES.stats()
+
+@app.get("/rules/{bundle_hash}")
+def rules_versioned_endpoint(bundle_hash: str, request: Request):
+    rules = RULES.current
+    if bundle_hash != rules.bundle.hash:
+        raise HTTPException(status_code=404, detail="Unknown rules bundle; fetch /rules for the current one")
+    return _rules_bundle_response(rules, request, "public, max-age=31536000, immutable")
+
+def _check_rules_version(rules: RuleSet, rules_version: Optional[str]) -> None:
+    # A client that computed the quote locally must have used the rules the server will render with.
+    if rules_version and rules_version != rules.version:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Rules have changed (client {rules_version}, server {rules.version}); reload the rules and retry",
+        )
 
-def _smtp_send_pdf(to_email: str, subject: str, body_text: str, pdf_bytes: bytes, filename: str) -> None:
+def _smtp_settings() -> Dict[str, Any]:
     host = SMTP_HOST
     port = int(SMTP_PORT)
     username = SMTP_USERNAME
@@ -645,97 +780,100 @@ def _smtp_send_pdf(to_email: str, subject: str, body_text: str, pdf_bytes: bytes
     if isinstance(password, str):
         password = password.replace(" ", "").strip()
 
+    return {
+        "host": host,
+        "port": port,
+        "username": username,
+        "password": password,
+        "from_addr": from_addr,
+        "use_tls": use_tls,
+    }
+
+def _smtp_connect() -> smtplib.SMTP:
+    settings = _smtp_settings()
+    server = smtplib.SMTP(settings["host"], settings["port"], timeout=20)
+    try:
+        server.ehlo()
+        if settings["use_tls"]:
+            server.starttls()
+            server.ehlo()
+        if settings["username"] and settings["password"]:
+            server.login(settings["username"], settings["password"])
+    except Exception:
+        server.close()
+        raise
+    return server
+
+def _build_pdf_email(to_email: str, subject: str, body_text: str, pdf_bytes: bytes, filename: str) -> EmailMessage:
     msg = EmailMessage()
     msg["Subject"] = subject
-    msg["From"] = from_addr
+    msg["From"] = _smtp_settings()["from_addr"]
     msg["To"] = to_email
     msg.set_content(body_text)
     msg.add_attachment(pdf_bytes, maintype="application", subtype="pdf", filename=filename)
+    return msg
 
-    with smtplib.SMTP(host, port, timeout=20) as server:
-        server.ehlo()
-        if use_tls:
-            server.starttls()
-            server.ehlo()
-        if username and password:
-            server.login(username, password)
+def _smtp_send_pdf(to_email: str, subject: str, body_text: str, pdf_bytes: bytes, filename: str) -> None:
+    msg = _build_pdf_email(to_email, subject, body_text, pdf_bytes, filename)
+    with STAGES.time("smtp_connect"):
+        server = _smtp_connect()
+    with server:
+        with STAGES.time("smtp_send"):
+            server.send_message(msg)
+
+RESULT_CARD_ROWS = [
+    ("bre_score", "Attendee Registration"),
+    ("app_score", "APP and CO"),
+    ("abs_score", "Abstract"),
+    ("exh_score", "Exhibits"),
+    ("appointments_score", "Appointments"),
+    ("kiosk_score", "Kiosk / Badges"),
+    ("custom_score", "Integrations / SSO"),
+    ("events_score", "Additional Events"),
+    ("pm_score", "Project Management"),
+]
 
-        server.send_message(msg)
+def _result_card_rows(calc: Dict[str, Any]) -> List[str]:
+    return [f"{label} — {calc.get(key, 0)} hrs" for key, label in RESULT_CARD_ROWS]
 
-def _build_print_html(customer_name: str, selected_by_module: Dict[str, List[str]], calc: Dict[str, Any]) -> str:
-    scope_lines = ""
+def _scope_lines(calc: Dict[str, Any]) -> Tuple[str, List[str]]:
     if "justifications" in calc and isinstance(calc["justifications"], list):
-        items = "".join([f"<li>{j['label']}: {j['hours']} hour{'s' if j['hours'] != 1 else ''}</li>" for j in calc["justifications"]])
-        scope_lines = f"<h4>Scope Breakdown</h4><ul>{items}</ul>"
-    elif "reasons" in calc and isinstance(calc["reasons"], list) and calc["reasons"]:
-        items = "".join([f"<li>{r}</li>" for r in calc["reasons"]])
-        scope_lines = f"<h4>Scope Justification</h4><ul>{items}</ul>"
-
-    modules_html = ""
-    for module_name, items in selected_by_module.items():
-        if not items:
-            continue
-        lis = "".join([f"<li>{i}</li>" for i in items])
-        modules_html += f"""
-        <section class="module">
-            <h2>{module_name}</h2>
-            <ul class="checked-list">{lis}</ul>
-        </section>
-        """
-
-    return f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-        <meta charset="utf-8" />
-        <title>PSC Hours - {customer_name}</title>
-        <style>
-            body {{ font-family: Segoe UI, Arial, sans-serif; color: #111827; }}
-            .header {{ border-bottom: 2px solid #e5e7eb; padding-bottom: 10px; margin-bottom: 16px; }}
-            .title {{ font-size: 14pt; font-weight: 700; }}
-            .meta {{ font-size: 10pt; color: #374151; }}
-            .customer {{ margin-top: 6px; font-size: 11pt; font-weight: 600; }}
-            .layout {{ display: grid; grid-template-columns: 1.6fr 1fr; gap: 18px; align-items: start; }}
-            .module {{ border: 1px solid #e5e7eb; border-radius: 8px; padding: 12px; margin-bottom: 12px; break-inside: avoid; }}
-            .module h2 {{ margin: 0 0 8px 0; font-size: 11pt; border-bottom: 1px solid #f3f4f6; padding-bottom: 6px; }}
-            .checked-list {{ margin: 0; padding-left: 18px; }}
-            .result-card {{ border: 2px solid #111827; border-radius: 8px; padding: 14px; break-inside: avoid; }}
-            .row {{ margin: 6px 0; font-weight: 700; text-transform: uppercase; font-size: 10pt; }}
-            .hours {{ margin-top: 10px; font-size: 12pt; font-weight: 800; }}
-            h4 {{ margin: 14px 0 6px 0; font-size: 10pt; }}
-            ul {{ margin: 0; padding-left: 18px; }}
-            .disclaimer {{ margin-top: 14px; padding-top: 10px; border-top: 1px solid #e5e7eb; font-size: 9.5pt; color: #374151; line-height: 1.35; }}
-        </style>
-        </head>
-        <body>
-        <div class="header">
-            <div class="title">PSC Hours Calculator</div>
-            <div class="meta">{""}</div>
-            <div class="customer">Customer: {customer_name}</div>
-        </div>
-
-        <div class="layout">
-            <div>
-            {modules_html}
-            </div>
-
-            <aside class="result-card">
-            <div class="row">Attendee Registration — {calc.get('bre_score',0)} hrs</div>
-            <div class="row">APP and CO — {calc.get('app_score',0)} hrs</div>
-            <div class="row">Abstract — {calc.get('abs_score',0)} hrs</div>
-            <div class="row">Exhibits — {calc.get('exh_score',0)} hrs</div>
-            <div class="row">Appointments — {calc.get('appointments_score',0)} hrs</div>
-            <div class="row">Kiosk / Badges — {calc.get('kiosk_score',0)} hrs</div>
-
-            {scope_lines}
-
-            <div class="hours">Total PSC Hours: {calc.get('total_hours',0)}</div>
-            <div class="disclaimer">{DISCLAIMER_TEXT}</div>
-            </aside>
-        </div>
-        </body>
-        </html>
-    """
+        return "Scope Breakdown", [f"{j['label']}: {j['hours']} hour{'s' if j['hours'] != 1 else ''}" for j in calc["justifications"]]
+    if "reasons" in calc and isinstance(calc["reasons"], list) and calc["reasons"]:
+        return "Scope Justification", [str(r) for r in calc["reasons"]]
+    return "", []
+
+def _report_content(selected_by_module: Dict[str, List[str]], calc: Dict[str, Any]) -> ReportContent:
+    scope_title, scope_items = _scope_lines(calc)
+    return ReportContent(
+        list(selected_by_module.items()),
+        _result_card_rows(calc),
+        scope_title,
+        scope_items,
+        f"Total PSC Hours: {calc.get('total_hours', 0)}",
+    )
+
+def _quote_report(features: ProjectFeatures, rules: RuleSet) -> ReportContent:
+    # One quote (rules version + feature mask) always yields the same report body.
+    return REPORTS.content(
+        (rules.version, rules.engine.mask_of(features)),
+        lambda: _report_content(_selected_by_module(features, rules), calculate_classification(features, rules)),
+    )
+
+def _build_native_pdf(customer_name: str, content: ReportContent) -> bytes:
+    with STAGES.time("native_pdf"):
+        return render_report_pdf(
+            customer_name,
+            content.modules,
+            content.card_rows,
+            content.scope_title,
+            content.scope_items,
+            content.total_line,
+            DISCLAIMER_TEXT,
+        )
+
+class PdfRendererUnavailable(RuntimeError):
+    """Playwright or its Chromium binaries are not installed on this host."""
 
 async def _html_to_pdf_bytes(html: str) -> bytes:
     def _format_exc(e: Exception) -> str:
@@ -750,102 +888,383 @@ async def _html_to_pdf_bytes(html: str) -> bytes:
         from playwright.sync_api import sync_playwright
 
         with sync_playwright() as p:
-            browser = p.chromium.launch()
+            with STAGES.time("chromium_launch"):
+                browser = p.chromium.launch()
             try:
                 page = browser.new_page()
-                page.set_content(html_content, wait_until="load")
-                return page.pdf(format="Letter", print_background=True)
+                with STAGES.time("set_content"):
+                    page.set_content(html_content, wait_until="load")
+                with STAGES.time("page_pdf"):
+                    return page.pdf(**PDF_OPTIONS)
             finally:
                 browser.close()
 
     try:
+        pool = getattr(app.state, "pdf_pool", None)
+        if pool is not None:
+            return await pool.render(html)
+        # No lifespan (e.g. app mounted without startup events): one-shot browser.
         return await asyncio.to_thread(_render_pdf_sync, html)
+    except RenderDaemonUnavailable as e:
+        raise PdfRendererUnavailable(str(e)) from e
     except ModuleNotFoundError as e:
-        raise RuntimeError(
+        raise PdfRendererUnavailable(
             "Playwright is not installed in the active Python environment. "
             "Install it with: python -m pip install playwright && python -m playwright install chromium"
         ) from e
     except Exception as e:
         msg = _format_exc(e)
         if "executable" in msg.lower() and ("doesn't exist" in msg.lower() or "does not exist" in msg.lower()):
-            raise RuntimeError(
+            raise PdfRendererUnavailable(
                 "Playwright Chromium browser binaries are not installed. "
                 "Run this once in your venv: python -m playwright install chromium. "
                 f"Original error: {msg}"
             ) from e
         raise
 
-@app.post("/email")
-async def email_endpoint(req: EmailRequest):
-    customer = (req.customer_name or "").strip()
-    if len(customer) < 2:
-        raise HTTPException(status_code=400, detail="Customer name is required")
-
-    to_email = (req.to_email or "").strip()
-    _, parsed_email = parseaddr(to_email)
-    if not parsed_email or "@" not in parsed_email:
-        raise HTTPException(status_code=400, detail="A valid recipient email is required")
-
+def _selected_by_module(features: ProjectFeatures, rules: RuleSet) -> Dict[str, List[str]]:
     selected_by_module: Dict[str, List[str]] = {}
-    for module_name, feature_ids in MODULE_GROUPS.items():
+    for module_name, feature_ids in rules.module_groups.items():
         selected: List[str] = []
         for fid in feature_ids:
-            if getattr(req.features, fid, False):
-                selected.append(FEATURE_LABELS.get(fid, fid))
+            value = getattr(features, fid, False)
+            if not value:
+                continue
+            label = rules.feature_labels.get(fid, fid)
+            selected.append(f"{label}: {value}" if fid in rules.engine.quantities else label)
         selected_by_module[module_name] = selected
+    return selected_by_module
+
+async def _counted_render(renderer: str, lane: str, render: Callable[[], Awaitable[bytes]]) -> bytes:
+    # Only cache misses get here, so cached PDFs are served even while renders are queued,
+    # and the gauge and `<renderer>_render` count real renders.
+    async with ADMISSION.slot(lane):
+        RENDERS_IN_FLIGHT.inc(renderer)
+        try:
+            with STAGES.time(f"{renderer}_render"):
+                return await render()
+        finally:
+            RENDERS_IN_FLIGHT.dec(renderer)
+
+async def _render_quote_pdf(
+    customer: str,
+    features: ProjectFeatures,
+    renderer: Optional[str] = None,
+    rules: Optional[RuleSet] = None,
+    lane: str = "pdf",
+) -> bytes:
+    rules = rules or RULES.current
+    return await _render_report_pdf(customer, _quote_report(features, rules), renderer, lane)
+
+async def _render_report_pdf(customer: str, content: ReportContent, renderer: Optional[str] = None, lane: str = "pdf") -> bytes:
+    renderer = renderer or PDF_RENDERER
+    with STAGES.time("build_html"):
+        html = REPORTS.html(customer, content)
+
+    def native() -> Any:
+        return PDF_CACHE.get_or_render(
+            content_key("native", html),
+            lambda: _counted_render("native", lane, lambda: asyncio.to_thread(_build_native_pdf, customer, content)),
+        )
 
-    calc = calculate_classification(req.features)
-    html = _build_print_html(customer, selected_by_module, calc)
+    if renderer == "native":
+        return await native()
 
+    # The HTML fully determines the PDF, so "Print" then "Email" of a quote renders once.
     try:
-        pdf_bytes = await _html_to_pdf_bytes(html)
+        return await PDF_CACHE.get_or_render(
+            content_key("chromium", html),
+            lambda: _counted_render("chromium", lane, lambda: _html_to_pdf_bytes(html)),
+        )
+    except PdfRendererUnavailable:
+        if renderer != "auto":
+            raise
+    return await native()
+
+@app.get("/pdf/cache")
+def pdf_cache_stats():
+    return PDF_CACHE.stats()
+
+@app.post("/email")
+async def email_endpoint(req: EmailRequest, request: Request):
+    _observe_validation(request)
+    rules = RULES.current
+    _check_rules_version(rules, req.rules_version)
+
+    customer = (req.customer_name or "").strip()
+    if len(customer) < 2:
+        raise HTTPException(status_code=400, detail="Customer name is required")
+
+    to_email = _recipient(req.to_email)
+    _log_quote(rules, rules.engine.mask_of(req.features), "email")
+    content = _quote_report(req.features, rules)
+    try:
+        pdf_bytes = await _render_report_pdf(customer, content, req.renderer, lane="email")
+    except Overloaded:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"PDF generation failed ({type(e).__name__}): {e!r}",
         )
+    return await _send_report_email(to_email, customer, content, pdf_bytes, rules.version)
+
+def _recipient(to_email: str) -> str:
+    _, parsed_email = parseaddr((to_email or "").strip())
+    if not parsed_email or "@" not in parsed_email:
+        raise HTTPException(status_code=400, detail="A valid recipient email is required")
+    return parsed_email
 
+async def _send_report_email(parsed_email: str, customer: str, content: ReportContent, pdf_bytes: bytes, rules_version: str) -> JSONResponse:
     subject = f"PSC Hours Calculator - {customer}"
-    body = (
-        f"Attached are the PSC Hours Calculator results for {customer}.\n\n"
-        f"{DISCLAIMER_TEXT}\n"
-    )
+    body = f"Attached are the PSC Hours Calculator results for {customer}.\n\n" + REPORTS.text(customer, content)
 
     try:
-        _smtp_send_pdf(parsed_email, subject, body, pdf_bytes, f"PSC_Hours_{customer}.pdf")
+        msg = _build_pdf_email(parsed_email, subject, body, pdf_bytes, f"PSC_Hours_{customer}.pdf")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Email send failed: {e}")
 
-    return {"ok": True}
+    outbox = getattr(app.state, "outbox", None)
+    if outbox is None:
+        try:
+            await asyncio.to_thread(_smtp_send_pdf, parsed_email, subject, body, pdf_bytes, f"PSC_Hours_{customer}.pdf")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Email send failed: {e}")
+        return JSONResponse(content={"ok": True}, headers={RULES_VERSION_HEADER: rules_version})
+
+    # Also records the job in the quote store (a SQLite write), so keep it off the event loop.
+    job_id = await asyncio.to_thread(outbox.submit, msg)
+    return JSONResponse(
+        status_code=202,
+        content={"ok": True, "job_id": job_id, "status": "queued"},
+        headers={RULES_VERSION_HEADER: rules_version},
+    )
 
-@app.post("/pdf")
-async def pdf_endpoint(req: PdfRequest):
-    customer = (req.customer_name or "").strip()
+@app.get("/email/{job_id}")
+def email_status(job_id: str):
+    # Jobs live in the memory of the worker that queued them; other workers read the quote store.
+    outbox = getattr(app.state, "outbox", None)
+    job = outbox.status(job_id) if outbox is not None else None
+    quotes = getattr(app.state, "quotes", None)
+    if job is None and quotes is not None:
+        job = quotes.get_email_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown email job")
+    return job
+
+def _content_disposition(filename: str) -> str:
+    # Header values must be latin-1; non-ASCII customer names go in the RFC 5987 parameter.
+    fallback = filename.encode("ascii", "replace").decode("ascii").replace('"', "'")
+    return f"inline; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+async def _pdf_response(
+    rules: RuleSet,
+    customer: str,
+    features: ProjectFeatures,
+    renderer: Optional[str],
+    cache_control: Optional[str] = None,
+) -> Response:
+    customer = (customer or "").strip()
     if len(customer) < 2:
         raise HTTPException(status_code=400, detail="Customer name is required")
 
-    selected_by_module: Dict[str, List[str]] = {}
-    for module_name, feature_ids in MODULE_GROUPS.items():
-        selected: List[str] = []
-        for fid in feature_ids:
-            if getattr(req.features, fid, False):
-                selected.append(FEATURE_LABELS.get(fid, fid))
-        selected_by_module[module_name] = selected
-
-    calc = calculate_classification(req.features)
-    html = _build_print_html(customer, selected_by_module, calc)
-
+    _log_quote(rules, rules.engine.mask_of(features), "pdf")
     try:
-        pdf_bytes = await _html_to_pdf_bytes(html)
+        pdf_bytes = await _render_quote_pdf(customer, features, renderer, rules)
+    except Overloaded:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"PDF generation failed ({type(e).__name__}): {e!r}",
         )
 
+    return _pdf_bytes_response(customer, pdf_bytes, rules.version, cache_control)
+
+def _pdf_bytes_response(customer: str, pdf_bytes: bytes, rules_version: str, cache_control: Optional[str] = None) -> Response:
     filename = f"PSC_Hours_{customer}.pdf"
+    headers = {"Content-Disposition": _content_disposition(filename), RULES_VERSION_HEADER: rules_version}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
     return Response(
         content=pdf_bytes,
         media_type="application/pdf",
-        headers={"Content-Disposition": f"inline; filename=\"{filename}\""},
-    )
\ No newline at end of file
+        headers=headers,
+    )
+
+@app.post("/pdf")
+async def pdf_endpoint(req: PdfRequest, request: Request):
+    _observe_validation(request)
+    rules = RULES.current
+    _check_rules_version(rules, req.rules_version)
+    return await _pdf_response(rules, req.customer_name, req.features, req.renderer)
+
+@app.get("/pdf")
+async def pdf_get_endpoint(f: str, customer: str, renderer: Optional[PdfRenderer] = None):
+    """Shareable, cacheable PDF link for a quote code and customer name."""
+    rules = RULES.current
+    features = _features_from_mask(rules, _decode_quote_code(rules, f))
+    return await _pdf_response(rules, customer, features, renderer, f"public, max-age={QUOTE_GET_MAX_AGE}")
+
+REPORT_MEDIA_TYPES = {
+    "text": "text/plain; charset=utf-8",
+    "markdown": "text/markdown; charset=utf-8",
+    "html": "text/html; charset=utf-8",
+}
+
+def _report_response(
+    rules: RuleSet,
+    customer: str,
+    features: ProjectFeatures,
+    format: str,
+    cache_control: Optional[str] = None,
+) -> Response:
+    customer = (customer or "").strip()
+    if len(customer) < 2:
+        raise HTTPException(status_code=400, detail="Customer name is required")
+
+    content = _quote_report(features, rules)
+    with STAGES.time(f"report_{format}"):
+        body = getattr(REPORTS, format)(customer, content)
+    headers = {RULES_VERSION_HEADER: rules.version}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return Response(content=body, media_type=REPORT_MEDIA_TYPES[format], headers=headers)
+
+@app.post("/report")
+def report_endpoint(req: ReportRequest, request: Request, format: ReportFormat = "markdown"):
+    """The quote report as plain text, Markdown or HTML (the document the PDF is printed from)."""
+    _observe_validation(request)
+    rules = RULES.current
+    _check_rules_version(rules, req.rules_version)
+    return _report_response(rules, req.customer_name, req.features, format)
+
+@app.get("/report")
+def report_get_endpoint(f: str, customer: str, format: ReportFormat = "markdown"):
+    rules = RULES.current
+    features = _features_from_mask(rules, _decode_quote_code(rules, f))
+    return _report_response(rules, customer, features, format, f"public, max-age={QUOTE_GET_MAX_AGE}")
+
+class QuoteEmailRequest(BaseModel):
+    to_email: str
+    renderer: Optional[PdfRenderer] = None
+
+def _stored_quote(quote_id: str) -> Dict[str, Any]:
+    quote = _quote_store().get(quote_id)
+    if quote is None:
+        raise HTTPException(status_code=404, detail="Unknown quote")
+    return quote
+
+def _stored_report(quote: Dict[str, Any]) -> ReportContent:
+    # Keyed by quote_id: the stored content stays as computed, whatever the current rules are.
+    return REPORTS.content(("quote", quote["quote_id"]), lambda: ReportContent.from_dict(quote["report"]))
+
+async def _stored_quote_pdf(quote: Dict[str, Any], renderer: Optional[str], lane: str) -> bytes:
+    quotes = _quote_store()
+    kind = f"pdf.{renderer or PDF_RENDERER}"
+    pdf_bytes = await asyncio.to_thread(quotes.get_artifact, quote["quote_id"], kind)
+    if pdf_bytes is not None:
+        return pdf_bytes
+    try:
+        pdf_bytes = await _render_report_pdf(quote["customer_name"], _stored_report(quote), renderer, lane)
+    except Overloaded:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"PDF generation failed ({type(e).__name__}): {e!r}",
+        )
+    await asyncio.to_thread(quotes.put_artifact, quote["quote_id"], kind, pdf_bytes)
+    return pdf_bytes
+
+@app.get("/quotes")
+def quotes_by_customer(customer: str, limit: int = 50):
+    """Saved quotes for a customer (case-insensitive), newest first."""
+    return {"quotes": _quote_store().find_by_customer(customer, min(max(limit, 1), 500))}
+
+@app.get("/quotes/{quote_id}")
+def quote_endpoint(quote_id: str):
+    quote = _stored_quote(quote_id)
+    return JSONResponse(content=quote, headers={RULES_VERSION_HEADER: quote["rules_version"]})
+
+@app.get("/quotes/{quote_id}/pdf")
+async def quote_pdf_endpoint(quote_id: str, renderer: Optional[PdfRenderer] = None):
+    quote = await asyncio.to_thread(_stored_quote, quote_id)
+    pdf_bytes = await _stored_quote_pdf(quote, renderer, "pdf")
+    # A saved quote never changes, so its PDF can be cached privately for long.
+    return _pdf_bytes_response(quote["customer_name"], pdf_bytes, quote["rules_version"], "private, max-age=86400")
+
+@app.post("/quotes/{quote_id}/email")
+async def quote_email_endpoint(quote_id: str, req: QuoteEmailRequest):
+    to_email = _recipient(req.to_email)
+    quote = await asyncio.to_thread(_stored_quote, quote_id)
+    pdf_bytes = await _stored_quote_pdf(quote, req.renderer, "email")
+    return await _send_report_email(to_email, quote["customer_name"], _stored_report(quote), pdf_bytes, quote["rules_version"])
+
+def _zip_member_name(customer: str, used: Dict[str, int]) -> str:
+    safe = re.sub(r'[\\/:*?"<>|\x00-\x1f]+', "_", customer).strip(" .") or "Customer"
+    name = f"PSC_Hours_{safe}.pdf"
+    count = used.get(name.lower(), 0) + 1
+    used[name.lower()] = count
+    return name if count == 1 else f"PSC_Hours_{safe} ({count}).pdf"
+
+@app.post("/pdf/batch")
+async def pdf_batch_endpoint(reqs: List[PdfRequest]):
+    if not reqs:
+        raise HTTPException(status_code=400, detail="At least one quote is required")
+    if len(reqs) > PDF_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {PDF_BATCH_MAX_ITEMS} quotes per batch")
+
+    rules = RULES.current
+    for r in reqs:
+        _check_rules_version(rules, r.rules_version)
+
+    customers = [(r.customer_name or "").strip() for r in reqs]
+    for i, customer in enumerate(customers):
+        if len(customer) < 2:
+            raise HTTPException(status_code=400, detail=f"Customer name is required (item {i})")
+
+    async def rendered():
+        # At most PDF_BATCH_CONCURRENCY renders are in flight, and each finished PDF is
+        # handed to the ZIP writer right away, so memory does not grow with batch size.
+        used_names: Dict[str, int] = {}
+        errors: List[str] = []
+        pending = set()
+        next_index = 0
+
+        def schedule() -> None:
+            nonlocal next_index
+            while next_index < len(reqs) and len(pending) < max(1, PDF_BATCH_CONCURRENCY):
+                i = next_index
+                next_index += 1
+                task = asyncio.ensure_future(_render_quote_pdf(customers[i], reqs[i].features, reqs[i].renderer, rules, lane="batch"))
+                task.index = i  # type: ignore[attr-defined]
+                pending.add(task)
+
+        try:
+            schedule()
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.discard(task)
+                    i = task.index  # type: ignore[attr-defined]
+                    try:
+                        pdf_bytes = task.result()
+                    except Exception as e:
+                        errors.append(f"{customers[i]}: PDF generation failed ({type(e).__name__}): {e!r}")
+                        continue
+                    yield _zip_member_name(customers[i], used_names), pdf_bytes
+                schedule()
+
+            if errors:
+                yield "errors.txt", ("\n".join(errors) + "\n").encode("utf-8")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    return StreamingResponse(
+        stream_zip(rendered()),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=\"PSC_Hours.zip\"", RULES_VERSION_HEADER: rules.version},
+    )
+
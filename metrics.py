@@ -0,0 +1,293 @@
+import bisect
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+# Seconds; spans a cached /calculate (sub-millisecond) to a cold Chromium launch.
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+# ASGI scope key holding the perf_counter() value at which the request entered the app.
+REQUEST_START_KEY = "metrics.request_start"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = self._header()
+        lines.extend(f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in values)
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = float(value)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = self._header()
+        lines.extend(f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in values)
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """Gauge read at scrape time from `collect()`, which returns {label value: number}."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelname: str, collect: Callable[[], Optional[Mapping[str, Any]]]) -> None:
+        super().__init__(name, help, (labelname,))
+        self._collect = collect
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        try:
+            values = self._collect() or {}
+        except Exception:
+            values = {}
+        for key, value in sorted(values.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, (key,))} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        # Per label set: [count per bucket (+Inf last, not cumulative), sum]
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = sorted((k, list(counts), total[0]) for k, (counts, total) in self._series.items())
+        lines = self._header()
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback_gauge(self, name: str, help: str, labelname: str, collect: Callable[[], Optional[Mapping[str, Any]]]) -> CallbackGauge:
+        return self.register(CallbackGauge(name, help, labelname, collect))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class _StageContext:
+    __slots__ = ("_timer", "_stage", "_start")
+
+    def __init__(self, timer: "StageTimer", stage: str) -> None:
+        self._timer = timer
+        self._stage = stage
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self._timer.observe(self._stage, time.perf_counter() - self._start)
+        if exc_type is not None:
+            self._timer.error(self._stage, exc_type.__name__)
+        return False
+
+
+class StageTimer:
+    """
+    Records how long each named pipeline stage takes and which exceptions it raises.
+
+    `with timer.time("page_pdf"): ...` costs two perf_counter() calls and one
+    locked histogram update, so it stays on in production.
+    """
+
+    def __init__(self, durations: Histogram, errors: Counter) -> None:
+        self.durations = durations
+        self.errors = errors
+
+    def time(self, stage: str) -> _StageContext:
+        return _StageContext(self, stage)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        self.durations.observe(seconds, stage)
+
+    def error(self, stage: str, error_type: str) -> None:
+        self.errors.inc(stage, error_type)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request per route (until the last body
+    chunk is sent, so streamed responses are measured in full).
+
+    It also stamps the request start into the scope (REQUEST_START_KEY), letting
+    handlers attribute the time spent before they run (body read and validation).
+    Requests that match no route are grouped under "unmatched" to keep label
+    cardinality bounded.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        requests: Counter,
+        durations: Histogram,
+        in_flight: Gauge,
+        errors: Counter,
+    ) -> None:
+        self.app = app
+        self.requests = requests
+        self.durations = durations
+        self.in_flight = in_flight
+        self.errors = errors
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        scope[REQUEST_START_KEY] = start
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            self.errors.inc(_route_label(scope), type(e).__name__)
+            raise
+        finally:
+            self.in_flight.dec()
+            route = _route_label(scope)
+            self.durations.observe(time.perf_counter() - start, route, scope["method"])
+            self.requests.inc(route, scope["method"], str(status))
+
+
+def _route_label(scope: Scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path:
+        return path
+    # Mounted apps (e.g. /static) set root_path; anything else matched no route.
+    return scope.get("root_path") or "unmatched"
+
+
+def request_elapsed(scope: Scope) -> Optional[float]:
+    start = scope.get(REQUEST_START_KEY)
+    return time.perf_counter() - start if start is not None else None
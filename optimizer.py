@@ -0,0 +1,252 @@
+import bisect
+import heapq
+import itertools
+import threading
+import weakref
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from rules_engine import CompiledRules
+
+
+OBJECTIVES = ("features", "hours", "weighted")
+
+# (primary, secondary), compared lexicographically and added component-wise.
+Score = Tuple[float, float]
+
+
+class Component:
+    """
+    Modules whose tables share no flags with any module outside the group.
+
+    `options` lists every valid on/off combination of the group's flags (a feature
+    with `requires` only appears together with the flag it requires) as
+    (mask, total hours, hours per module). Counts are not chosen: the hours are
+    for the counts the group was built with, and the masks only hold flags.
+    """
+
+    __slots__ = ("modules", "mask", "options")
+
+    def __init__(self, modules: Tuple[int, ...], mask: int, options: List[Tuple[int, int, Tuple[int, ...]]]) -> None:
+        self.modules = modules
+        self.mask = mask
+        self.options = options
+
+
+_COMPONENTS: "weakref.WeakKeyDictionary[CompiledRules, Tuple[Component, ...]]" = weakref.WeakKeyDictionary()
+_COMPONENTS_LOCK = threading.Lock()
+
+
+def components(engine: CompiledRules, counts: int = 0) -> Tuple[Component, ...]:
+    """
+    The engine's independent module groups with their enumerated options, for the
+    counts set in mask `counts`. Built once per engine for the usual all-zero counts.
+    """
+    if counts:
+        return _build_components(engine, counts)
+    with _COMPONENTS_LOCK:
+        cached = _COMPONENTS.get(engine)
+    if cached is not None:
+        return cached
+    result = _build_components(engine, 0)
+    with _COMPONENTS_LOCK:
+        _COMPONENTS[engine] = result
+    return result
+
+
+def _build_components(engine: CompiledRules, counts: int) -> Tuple[Component, ...]:
+    # Union modules that read a common flag.
+    parent = list(range(len(engine.modules)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for dependents in engine.dependents:
+        for other in dependents[1:]:
+            parent[find(other)] = find(dependents[0])
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(engine.modules)):
+        groups.setdefault(find(i), []).append(i)
+
+    requires = [
+        (1 << engine.bits[name], 1 << engine.bits[rule["requires"]])
+        for name, rule in engine.feature_rules.items()
+        if rule.get("requires")
+    ]
+
+    flag_bits = set(engine.bits.values())
+    built = []
+    for members in groups.values():
+        bits = sorted({b for i in members for b in engine.modules[i].global_bits} & flag_bits)
+        group_mask = sum(1 << b for b in bits)
+        checks = [(f, r) for f, r in requires if f & group_mask]
+        options = []
+        for combo in range(1 << len(bits)):
+            mask = 0
+            for local, bit in enumerate(bits):
+                if combo >> local & 1:
+                    mask |= 1 << bit
+            if any(mask & f and not mask & r for f, r in checks):
+                continue
+            per_module = tuple(engine.modules[i].rows[engine.modules[i].index(mask | counts)].total for i in members)
+            options.append((mask, sum(per_module), per_module))
+        built.append(Component(tuple(members), group_mask, options))
+    return tuple(built)
+
+
+def _popcount(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+def _pareto(points: Sequence[Tuple[int, Score]]) -> Tuple[List[int], List[Score]]:
+    """Keeps the points no other point beats on both fewer-or-equal hours and a higher score."""
+    hours: List[int] = []
+    scores: List[Score] = []
+    for h, s in sorted(points, key=lambda p: (p[0], (-p[1][0], -p[1][1]))):
+        if not scores or s > scores[-1]:
+            hours.append(h)
+            scores.append(s)
+    return hours, scores
+
+
+def _add(a: Score, b: Score) -> Score:
+    return (a[0] + b[0], a[1] + b[1])
+
+
+def optimize(
+    engine: CompiledRules,
+    max_hours: float,
+    required: Sequence[str] = (),
+    forbidden: Sequence[str] = (),
+    objective: str = "features",
+    weights: Optional[Mapping[str, float]] = None,
+    quantities: Optional[Mapping[str, int]] = None,
+    limit: int = 5,
+) -> List[Dict[str, Any]]:
+    """
+    The `limit` best valid selections with a total of at most `max_hours`, best first.
+
+    Objectives (ties broken by the second criterion):
+      features: most features selected, then fewest hours
+      hours:    most hours used within the cap, then most features
+      weighted: highest sum of `weights` (0 for unlisted features), then fewest hours
+
+    `quantities` fixes the counts (unlisted ones are 0); only on/off features are chosen.
+
+    Each module group's options are enumerated separately (2^9 for the biggest),
+    then combined by a best-first search. Its bound is exact: for every suffix of
+    groups, a knapsack over hours keeps only the Pareto front of (hours, best
+    score). Complete selections therefore come off the heap in rank order after
+    about `limit` x groups expansions, instead of scanning 2^33 selections.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective!r}; expected one of {', '.join(OBJECTIVES)}")
+    unknown = [f for f in (*required, *forbidden, *(weights or {})) if f not in engine.bits]
+    if unknown:
+        raise ValueError(f"Unknown features: {', '.join(sorted(set(unknown)))}")
+    overlap = set(required) & set(forbidden)
+    if overlap:
+        raise ValueError(f"Features both required and forbidden: {', '.join(sorted(overlap))}")
+    unknown = [name for name in (quantities or {}) if name not in engine.quantities]
+    if unknown:
+        raise ValueError(f"Unknown counts: {', '.join(sorted(unknown))}")
+    counts = 0
+    for name, units in (quantities or {}).items():
+        counts = engine.with_value(counts, name, units)
+
+    required_mask = sum(1 << engine.bits[f] for f in set(required))
+    forbidden_mask = sum(1 << engine.bits[f] for f in set(forbidden))
+    bit_weights = [(1 << engine.bits[f], float(w)) for f, w in (weights or {}).items() if w]
+
+    def score(mask: int, hours: int) -> Score:
+        if objective == "features":
+            return (_popcount(mask), -hours)
+        if objective == "hours":
+            return (hours, _popcount(mask))
+        return (sum(w for bit, w in bit_weights if mask & bit), -hours)
+
+    groups = components(engine, counts)
+    per_group: List[List[Tuple[int, Score, int, Tuple[int, ...]]]] = []
+    for group in groups:
+        need = required_mask & group.mask
+        options = [
+            (hours, score(mask, hours), mask, per_module)
+            for mask, hours, per_module in group.options
+            if mask & need == need and not mask & forbidden_mask and hours <= max_hours
+        ]
+        if not options:
+            return []
+        per_group.append(options)
+
+    # fronts[i]: best score reachable with groups i.. for any hours budget.
+    fronts: List[Tuple[List[int], List[Score]]] = [([], [])] * len(per_group) + [([0], [(0, 0)])]
+    for i in range(len(per_group) - 1, -1, -1):
+        option_hours, option_scores = _pareto([(h, s) for h, s, _, _ in per_group[i]])
+        next_hours, next_scores = fronts[i + 1]
+        fronts[i] = _pareto(
+            [
+                (h1 + h2, _add(s1, s2))
+                for h1, s1 in zip(option_hours, option_scores)
+                for h2, s2 in zip(next_hours, next_scores)
+                if h1 + h2 <= max_hours
+            ]
+        )
+
+    def bound(i: int, budget: float) -> Optional[Score]:
+        hours, scores = fronts[i]
+        k = bisect.bisect_right(hours, budget) - 1
+        return scores[k] if k >= 0 else None
+
+    start = bound(0, max_hours)
+    if start is None:
+        return []
+
+    counter = itertools.count()
+    # (negated priority, deeper first, tie order, depth, hours, score, chosen options)
+    heap: List[Any] = [((-start[0], -start[1]), 0, next(counter), 0, 0, (0, 0), ())]
+    results: List[Dict[str, Any]] = []
+    while heap and len(results) < limit:
+        _, _, _, depth, hours, current, chosen = heapq.heappop(heap)
+        if depth == len(per_group):
+            results.append(_selection(engine, groups, chosen, hours, current, counts))
+            continue
+        for option in per_group[depth]:
+            total = hours + option[0]
+            rest = bound(depth + 1, max_hours - total)
+            if rest is None:
+                continue
+            reached = _add(current, option[1])
+            priority = _add(reached, rest)
+            heapq.heappush(
+                heap,
+                ((-priority[0], -priority[1]), -(depth + 1), next(counter), depth + 1, total, reached, chosen + (option,)),
+            )
+    return results
+
+
+def _selection(
+    engine: CompiledRules,
+    groups: Sequence[Component],
+    chosen: Sequence[Tuple[int, Score, int, Tuple[int, ...]]],
+    hours: int,
+    score: Score,
+    counts: int,
+) -> Dict[str, Any]:
+    # score[0] is the objective's value: feature count, hours used or summed weight.
+    mask = counts
+    module_hours: Dict[str, int] = {}
+    for group, (_, _, option_mask, per_module) in zip(groups, chosen):
+        mask |= option_mask
+        for i, h in zip(group.modules, per_module):
+            module_hours[engine.modules[i].key] = h
+    return {
+        "features": [name for name, bit in engine.bits.items() if mask >> bit & 1],
+        "quantities": {name: quantity.value(mask) for name, quantity in engine.quantities.items()},
+        "total_hours": hours,
+        "score": score[0],
+        "modules": {m.key: module_hours.get(m.key, 0) for m in engine.modules},
+        "quote_code": engine.encode_mask(mask),
+    }
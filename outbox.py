@@ -0,0 +1,275 @@
+import heapq
+import itertools
+import smtplib
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from email.message import EmailMessage
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
+
+from metrics import StageTimer
+
+
+class EmailJob:
+    def __init__(self, message: EmailMessage) -> None:
+        self.id = uuid.uuid4().hex
+        self.message = message
+        self.status = "queued"
+        self.attempts = 0
+        self.error = ""
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        # Bumped on every state change, so a store fed by `on_change` can ignore late, older states.
+        self.revision = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+def _is_permanent(e: Exception) -> bool:
+    # 5xx replies (bad recipient, auth rejected, message refused) will not succeed on retry.
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(e, smtplib.SMTPResponseException):
+        return 500 <= e.smtp_code < 600
+    return False
+
+
+class SmtpOutbox:
+    """
+    Background email delivery over persistent SMTP sessions.
+
+    `submit` only queues the message, so request handlers never wait on the relay.
+    Each worker thread keeps its own authenticated session (created by `connect`)
+    and reuses it across messages, reconnecting when the server drops it or after
+    `idle_timeout` seconds without traffic. Transient failures are retried with
+    exponential backoff; 5xx replies fail the job immediately.
+
+    `close` keeps sending what is due until its deadline; jobs still queued
+    after that are failed (through `on_change` too) rather than left queued.
+
+    Job state is kept in memory for `status`; `on_change` also receives every
+    state change (`EmailJob.to_dict()` plus its `revision`), so it can be stored
+    where other workers can read it. Calls may arrive out of order across threads;
+    the revision tells which state is newest. A failing `on_change` never holds up
+    delivery.
+
+    For local testing point SMTP_HOST/SMTP_PORT at a debugging server, e.g.
+    `python -m aiosmtpd -n -l 127.0.0.1:1025` with SMTP_USE_TLS off.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], smtplib.SMTP],
+        workers: int = 2,
+        max_attempts: int = 5,
+        backoff_base: float = 2.0,
+        backoff_max: float = 300.0,
+        idle_timeout: float = 60.0,
+        job_ttl: float = 3600.0,
+        stages: Optional[StageTimer] = None,
+        on_change: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> None:
+        self._connect = connect
+        self.workers = max(1, int(workers))
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self.idle_timeout = float(idle_timeout)
+        self.job_ttl = float(job_ttl)
+        self.stages = stages
+        self.on_change = on_change
+
+        self._cond = threading.Condition()
+        self._ready: List[Tuple[float, int, EmailJob]] = []
+        self._seq = itertools.count()
+        self._jobs: Dict[str, EmailJob] = {}
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+        self._drain_until = 0.0
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"smtp-outbox-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def close(self, timeout: float = 10.0) -> None:
+        deadline = time.monotonic() + max(0.0, float(timeout))
+        with self._cond:
+            self._closed = True
+            self._drain_until = deadline
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        self._threads.clear()
+        # Nothing will send these any more (the queue is only in this process's memory).
+        with self._cond:
+            abandoned = [job for _, _, job in self._ready]
+            self._ready.clear()
+        for job in abandoned:
+            last = f" (last error: {job.error})" if job.error else ""
+            self._finish(job, "failed", f"Server shut down before the email was sent{last}")
+
+    def submit(self, message: EmailMessage) -> str:
+        job = EmailJob(message)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Email outbox is closed")
+            self._prune(job.created_at)
+            self._jobs[job.id] = job
+            heapq.heappush(self._ready, (0.0, next(self._seq), job))
+            self._cond.notify()
+            state = self._state(job)
+        self._changed(state)
+        return job.id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job is not None else None
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            counts["pending"] = len(self._ready)
+        return counts
+
+    @staticmethod
+    def _state(job: EmailJob) -> Dict[str, Any]:
+        return dict(job.to_dict(), revision=job.revision)
+
+    def _changed(self, state: Dict[str, Any]) -> None:
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(state)
+        except Exception:
+            pass
+
+    def _prune(self, now: float) -> None:
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.status in ("sent", "failed") and now - job.updated_at > self.job_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _next_job(self) -> Optional[EmailJob]:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._closed and (not self._ready or self._ready[0][0] > self._drain_until or now >= self._drain_until):
+                    return None
+                if self._ready and self._ready[0][0] <= now:
+                    job = heapq.heappop(self._ready)[2]
+                    job.status = "sending"
+                    job.updated_at = time.time()
+                    job.revision += 1
+                    return job
+                self._cond.wait(self._ready[0][0] - now if self._ready else None)
+
+    def _finish(self, job: EmailJob, status: str, error: str = "") -> None:
+        with self._cond:
+            job.status = status
+            job.error = error
+            job.updated_at = time.time()
+            job.revision += 1
+            if status == "sent":
+                # The attachment is no longer needed once delivered.
+                job.message = EmailMessage()
+            state = self._state(job)
+        self._changed(state)
+
+    def _retry(self, job: EmailJob, error: str) -> None:
+        delay = min(self.backoff_max, self.backoff_base ** job.attempts)
+        due = time.monotonic() + delay
+        with self._cond:
+            if self._closed and due > self._drain_until:
+                give_up = True
+            else:
+                give_up = False
+                job.status = "retrying"
+                job.error = error
+                job.updated_at = time.time()
+                job.revision += 1
+                heapq.heappush(self._ready, (due, next(self._seq), job))
+                self._cond.notify()
+                state = self._state(job)
+        if give_up:
+            # Shutting down: the retry would come after close() has given up on the queue.
+            self._finish(job, "failed", f"{error} (server shut down before a retry)")
+            return
+        self._changed(state)
+
+    def _time(self, stage: str) -> ContextManager[Any]:
+        return self.stages.time(stage) if self.stages is not None else nullcontext()
+
+    def _open(self) -> smtplib.SMTP:
+        with self._time("smtp_connect"):
+            return self._connect()
+
+    def _send(self, server: smtplib.SMTP, message: EmailMessage) -> None:
+        with self._time("smtp_send"):
+            server.send_message(message)
+
+    def _worker(self) -> None:
+        server: Optional[smtplib.SMTP] = None
+        last_used = 0.0
+
+        def drop() -> None:
+            nonlocal server
+            if server is not None:
+                try:
+                    server.quit()
+                except Exception:
+                    try:
+                        server.close()
+                    except Exception:
+                        pass
+            server = None
+
+        while True:
+            job = self._next_job()
+            if job is None:
+                drop()
+                return
+
+            job.attempts += 1
+            self._changed(self._state(job))
+            try:
+                if server is not None and time.monotonic() - last_used > self.idle_timeout:
+                    drop()
+                if server is None:
+                    server = self._open()
+                    self._send(server, job.message)
+                else:
+                    try:
+                        self._send(server, job.message)
+                    except (smtplib.SMTPServerDisconnected, ConnectionError):
+                        # The relay closed a reused session; reconnect once without counting a retry.
+                        drop()
+                        server = self._open()
+                        self._send(server, job.message)
+                last_used = time.monotonic()
+            except Exception as e:
+                drop()
+                error = f"{type(e).__name__}: {e}"
+                if _is_permanent(e) or job.attempts >= self.max_attempts:
+                    self._finish(job, "failed", error)
+                else:
+                    self._retry(job, error)
+                continue
+
+            self._finish(job, "sent")
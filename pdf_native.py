@@ -0,0 +1,247 @@
+import zlib
+from typing import Dict, List, Sequence, Tuple
+
+
+# Letter, in points.
+PAGE_WIDTH = 612.0
+PAGE_HEIGHT = 792.0
+MARGIN = 48.0
+
+# Glyph widths (1/1000 em) of the standard Helvetica faces for WinAnsi 32..126.
+_HELVETICA_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+_HELVETICA_BOLD_WIDTHS = (
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+)
+# Non-ASCII WinAnsi glyphs that appear in our labels.
+_EXTRA_WIDTHS = {0x96: 556, 0x97: 1000, 0x91: 222, 0x92: 222, 0x93: 333, 0x94: 333, 0x95: 350, 0x85: 1000}
+
+_FONTS = {"regular": ("F1", _HELVETICA_WIDTHS), "bold": ("F2", _HELVETICA_BOLD_WIDTHS)}
+
+INK = (0.067, 0.094, 0.153)  # #111827
+MUTED = (0.216, 0.255, 0.318)  # #374151
+RULE = (0.898, 0.906, 0.922)  # #e5e7eb
+FAINT = (0.953, 0.957, 0.965)  # #f3f4f6
+
+
+def _encode(text: str) -> bytes:
+    return text.encode("cp1252", errors="replace")
+
+
+def text_width(text: str, size: float, font: str = "regular") -> float:
+    widths = _FONTS[font][1]
+    total = 0
+    for code in _encode(text):
+        if 32 <= code <= 126:
+            total += widths[code - 32]
+        else:
+            total += _EXTRA_WIDTHS.get(code, 556)
+    return total * size / 1000.0
+
+
+def wrap(text: str, size: float, width: float, font: str = "regular") -> List[str]:
+    lines: List[str] = []
+    current = ""
+    for word in text.split():
+        candidate = f"{current} {word}" if current else word
+        if current and text_width(candidate, size, font) > width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    if current or not lines:
+        lines.append(current)
+    return lines
+
+
+def _literal(text: str) -> bytes:
+    data = _encode(text)
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+class _Canvas:
+    """Collects PDF drawing operators for one page (origin at the top-left, y growing downwards)."""
+
+    def __init__(self) -> None:
+        self.ops: List[bytes] = []
+
+    def text(self, x: float, y: float, text: str, size: float, font: str = "regular", color=INK) -> None:
+        name = _FONTS[font][0]
+        self.ops.append(
+            b"BT %.3f %.3f %.3f rg /%s %.2f Tf %.2f %.2f Td %s Tj ET"
+            % (color[0], color[1], color[2], name.encode(), size, x, PAGE_HEIGHT - y, _literal(text))
+        )
+
+    def line(self, x1: float, y1: float, x2: float, y2: float, width: float, color=RULE) -> None:
+        self.ops.append(
+            b"%.3f %.3f %.3f RG %.2f w %.2f %.2f m %.2f %.2f l S"
+            % (color[0], color[1], color[2], width, x1, PAGE_HEIGHT - y1, x2, PAGE_HEIGHT - y2)
+        )
+
+    def rect(self, x: float, y: float, w: float, h: float, width: float, color=RULE, radius: float = 6.0) -> None:
+        # Rounded rectangle approximated with Bezier corners (k = 0.5523 for a quarter circle).
+        r = min(radius, w / 2, h / 2)
+        k = r * 0.5523
+        top, bottom = PAGE_HEIGHT - y, PAGE_HEIGHT - y - h
+        left, right = x, x + w
+        self.ops.append(
+            b"%.3f %.3f %.3f RG %.2f w "
+            b"%.2f %.2f m %.2f %.2f l %.2f %.2f %.2f %.2f %.2f %.2f c "
+            b"%.2f %.2f l %.2f %.2f %.2f %.2f %.2f %.2f c "
+            b"%.2f %.2f l %.2f %.2f %.2f %.2f %.2f %.2f c "
+            b"%.2f %.2f l %.2f %.2f %.2f %.2f %.2f %.2f c S"
+            % (
+                color[0], color[1], color[2], width,
+                left + r, top, right - r, top, right - r + k, top, right, top - r + k, right, top - r,
+                right, bottom + r, right, bottom + r - k, right - r + k, bottom, right - r, bottom,
+                left + r, bottom, left + r - k, bottom, left, bottom + r - k, left, bottom + r,
+                left, top - r, left, top - r + k, left + r - k, top, left + r, top,
+            )
+        )
+
+    def content(self) -> bytes:
+        return b"\n".join(self.ops)
+
+
+def _build_document(pages: Sequence[bytes], title: str) -> bytes:
+    # Object numbers: 1 catalog, 2 page tree, 3/4 fonts, 5 info, then (page, content) pairs.
+    objects: Dict[int, bytes] = {}
+    page_ids = [6 + 2 * i for i in range(len(pages))]
+
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % pid for pid in page_ids),
+        len(pages),
+    )
+    objects[3] = b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"
+    objects[4] = b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>"
+    objects[5] = b"<< /Title %s /Producer (PSC Hours Calculator) >>" % _literal(title)
+
+    for page_id, ops in zip(page_ids, pages):
+        stream = zlib.compress(ops, 6)
+        objects[page_id] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+            % (int(PAGE_WIDTH), int(PAGE_HEIGHT), page_id + 1)
+        )
+        objects[page_id + 1] = b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(stream), stream)
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets: Dict[int, int] = {}
+    for num in sorted(objects):
+        offsets[num] = len(out)
+        out += b"%d 0 obj\n%s\nendobj\n" % (num, objects[num])
+
+    xref_at = len(out)
+    size = max(objects) + 1
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % size
+    for num in range(1, size):
+        out += b"%010d 00000 n \n" % offsets[num]
+    out += b"trailer\n<< /Size %d /Root 1 0 R /Info 5 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_at)
+    return bytes(out)
+
+
+def render_report_pdf(
+    customer_name: str,
+    modules: Sequence[Tuple[str, Sequence[str]]],
+    card_rows: Sequence[str],
+    scope_title: str,
+    scope_items: Sequence[str],
+    total_line: str,
+    disclaimer: str,
+) -> bytes:
+    """
+    Lays out the quote report (same content and arrangement as the HTML print view)
+    directly as PDF drawing operators using the built-in Helvetica fonts.
+    """
+    content_width = PAGE_WIDTH - 2 * MARGIN
+    gap = 13.5
+    left_width = (content_width - gap) * 1.6 / 2.6
+    right_x = MARGIN + left_width + gap
+    right_width = content_width - left_width - gap
+    pad = 9.0
+
+    pages: List[_Canvas] = [_Canvas()]
+    canvas = pages[0]
+
+    # Header
+    y = MARGIN + 14
+    canvas.text(MARGIN, y, "PSC Hours Calculator", 14, "bold")
+    y += 18
+    canvas.text(MARGIN, y, f"Customer: {customer_name}", 11, "bold")
+    y += 9
+    canvas.line(MARGIN, y, PAGE_WIDTH - MARGIN, y, 1.5)
+    body_top = y + 12
+
+    # Result card (right column, first page)
+    inner = right_width - 2 * pad
+    card: List[Tuple[str, str, float, tuple, float]] = []  # (text, font, size, color, advance)
+    for row in card_rows:
+        for line in wrap(row.upper(), 10, inner, "bold"):
+            card.append((line, "bold", 10, INK, 14))
+    if scope_items:
+        card.append(("", "regular", 0, INK, 6))
+        card.append((scope_title, "bold", 10, INK, 14))
+        for item in scope_items:
+            for i, line in enumerate(wrap(item, 10, inner - 10)):
+                card.append((("\u2022 " if i == 0 else "   ") + line, "regular", 10, INK, 13))
+    card.append(("", "regular", 0, INK, 6))
+    card.append((total_line, "bold", 12, INK, 18))
+    disclaimer_lines = wrap(disclaimer, 9.5, inner)
+    card_height = pad + sum(c[4] for c in card) + 14 + len(disclaimer_lines) * 12.8 + pad
+
+    cy = body_top + pad
+    for text, font, size, color, advance in card:
+        cy += advance
+        if text:
+            canvas.text(right_x + pad, cy - 3, text, size, font, color)
+    cy += 8
+    canvas.line(right_x + pad, cy, right_x + right_width - pad, cy, 0.75)
+    cy += 4
+    for line in disclaimer_lines:
+        cy += 12.8
+        canvas.text(right_x + pad, cy - 3, line, 9.5, "regular", MUTED)
+    canvas.rect(right_x, body_top, right_width, card_height, 1.5, INK)
+
+    # Module sections (left column, flowing onto further pages)
+    y = body_top
+    bottom = PAGE_HEIGHT - MARGIN
+    inner = left_width - 2 * pad
+    for module_name, items in modules:
+        if not items:
+            continue
+        lines: List[Tuple[str, bool]] = []
+        for item in items:
+            for i, line in enumerate(wrap(item, 10, inner - 12)):
+                lines.append((line, i == 0))
+        height = pad + 15 + 6 + len(lines) * 13 + pad
+
+        if y + height > bottom and y > body_top:
+            canvas = _Canvas()
+            pages.append(canvas)
+            y = MARGIN
+
+        canvas.rect(MARGIN, y, left_width, height, 0.75)
+        ty = y + pad + 11
+        canvas.text(MARGIN + pad, ty, module_name, 11, "bold")
+        canvas.line(MARGIN + pad, ty + 6, MARGIN + left_width - pad, ty + 6, 0.75, FAINT)
+        ty += 6
+        for line, first in lines:
+            ty += 13
+            if first:
+                canvas.text(MARGIN + pad, ty, "\u2022", 10)
+            canvas.text(MARGIN + pad + 12, ty, line, 10)
+        y += height + 9
+
+    return _build_document([p.content() for p in pages], f"PSC Hours - {customer_name}")
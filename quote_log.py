@@ -0,0 +1,483 @@
+"""
+Append-only log of computed quotes in fixed-width binary records.
+
+Record layout (RECORD, little-endian, 40 bytes):
+
+    offset  size  field
+    0       8     timestamp (float64, Unix seconds)
+    8       8     feature bitmask (uint64, the rules version's CompiledRules mask)
+    16      8     rules version (the 16-hex-digit version as 8 raw bytes)
+    24      12    module totals, 6 x uint16, in RESPONSE_MODULE_ORDER
+    36      2     total hours (uint16, all modules)
+    38      1     source (SOURCES index)
+    39      1     padding
+
+Every field sits at a fixed offset in a 40-byte stride, so the analytics map
+the file and read a column as a strided memoryview, e.g. all masks are the
+uint64 view `[1::5]`. Only the mask column is counted record by record, in C
+via collections.Counter. The module totals are a function of (rules version,
+mask), so they are read once per distinct selection rather than per record.
+
+Which feature each mask bit stands for is recorded once per rules version in
+the `<log>.versions` sidecar (JSON lines); the bits of a count are null there
+and left out of the feature analytics. Only the six RESPONSE_MODULE_ORDER
+modules have a column; hours of later modules (custom, events, pm) are in the
+total but not broken out per module.
+"""
+import bisect
+import itertools
+import json
+import math
+import mmap
+import operator
+import os
+import struct
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from rules_engine import RESPONSE_MODULE_ORDER
+
+
+RECORD = struct.Struct("<dQ8s6HHBx")  # 40 bytes
+
+SOURCES = ("calculate", "pdf", "email")
+_SOURCE_INDEX = {name: i for i, name in enumerate(SOURCES)}
+
+_WORDS = RECORD.size // 8  # uint64 / float64 columns: 0 timestamp, 1 mask, 2 version
+_HALVES = RECORD.size // 2  # uint16 columns: 12..17 module totals, 18 total
+_MODULES_AT = 12
+_TOTAL_AT = 18
+_SOURCE_AT = 38
+_UINT16_MAX = 0xFFFF
+
+# Records scanned per step; the version check and new-selection lookups work per chunk.
+_CHUNK = 1 << 16
+
+# (number of quotes, hours: six module totals in RESPONSE_MODULE_ORDER, then the total)
+Selection = Tuple[int, Tuple[int, ...]]
+
+
+def _u16(value: int) -> int:
+    return max(0, min(_UINT16_MAX, int(value)))
+
+
+class QuoteLog:
+    """
+    Appends one record per computed quote with a single O_APPEND write.
+
+    Writes from several worker processes interleave whole records. A failing
+    write (e.g. a full disk) is counted in `dropped` and never reaches the
+    request that triggered it.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.versions_path = path + ".versions"
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # Rules version -> its packed 8 bytes, for the versions already in the sidecar.
+        self._known_versions = {v: _pack_version(v) for v in read_versions(self.versions_path)}
+        self._versions_lock = threading.Lock()
+        self.appended = 0
+        self.dropped = 0
+
+    def _register_version(self, version: str, features: Sequence[Optional[str]]) -> bytes:
+        with self._versions_lock:
+            packed = self._known_versions.get(version)
+            if packed is not None:
+                return packed
+            packed = _pack_version(version)
+            line = json.dumps({"version": version, "features": list(features)}) + "\n"
+            fd = os.open(self.versions_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode("utf-8"))
+            finally:
+                os.close(fd)
+            self._known_versions[version] = packed
+            return packed
+
+    def append(
+        self,
+        timestamp: float,
+        mask: int,
+        version: str,
+        features: Sequence[Optional[str]],
+        module_totals: Dict[str, int],
+        source: str,
+    ) -> None:
+        try:
+            packed = self._known_versions.get(version)
+            if packed is None:
+                packed = self._register_version(version, features)
+            hours = [module_totals.get(m, 0) for m in RESPONSE_MODULE_ORDER]
+            hours.append(sum(module_totals.values()))
+            try:
+                record = RECORD.pack(timestamp, mask, packed, *hours, _SOURCE_INDEX[source])
+            except struct.error:
+                # Hours outside uint16 (or not ints) are clamped; checking every value up front costs more.
+                record = RECORD.pack(timestamp, mask, packed, *map(_u16, hours), _SOURCE_INDEX[source])
+            os.write(self._fd, record)
+            self.appended += 1
+        except (OSError, ValueError, struct.error):
+            self.dropped += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"appended": self.appended, "dropped": self.dropped}
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def read_versions(path: str) -> Dict[str, List[str]]:
+    """Rules version -> feature names in bit order, from the sidecar."""
+    versions: Dict[str, List[str]] = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line
+                versions.setdefault(entry["version"], entry["features"])
+    except FileNotFoundError:
+        pass
+    return versions
+
+
+def _pack_version(version: str) -> bytes:
+    return bytes.fromhex(version)[:8].ljust(8, b"\0")
+
+
+def _version_of(word: int) -> str:
+    return word.to_bytes(8, "little").hex()
+
+
+def _percentiles(histogram: Counter, points: Iterable[float] = (50, 90, 99)) -> Dict[str, Any]:
+    """Nearest-rank percentiles (plus mean and max) from a value -> count histogram."""
+    n = sum(histogram.values())
+    if not n:
+        return {"count": 0}
+    values = sorted(histogram)
+    cumulative = []
+    running = 0
+    for v in values:
+        running += histogram[v]
+        cumulative.append(running)
+    out: Dict[str, Any] = {"count": n, "mean": round(sum(v * c for v, c in histogram.items()) / n, 2), "max": values[-1]}
+    for p in points:
+        rank = max(1, -(-n * p // 100))  # ceil(n * p / 100)
+        out[f"p{p:g}"] = values[bisect.bisect_left(cumulative, rank)]
+    return out
+
+
+class LogView:
+    """
+    Read-only columns of the log between two timestamps, over a memory map.
+
+    Use as a context manager; the views must be released before the map closes.
+    Appends that land after the map was taken are not included.
+
+    Several workers append to the same log, so records are in time order only up
+    to scheduling jitter (and clock steps). The since/until range is bisected
+    when the timestamp column is sorted. Otherwise it is found by one linear
+    scan. When the matching records are not contiguous, they are listed in
+    `rows` and read one by one.
+    """
+
+    def __init__(self, path: str, since: Optional[float] = None, until: Optional[float] = None) -> None:
+        self.path = path
+        self.since = since
+        self.until = until
+        self.lo = self.hi = self.count = 0
+        # Matching record indices when they do not form the contiguous range lo..hi.
+        self.rows: Optional[List[int]] = None
+        self._ordered = True
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._views: List[memoryview] = []
+
+    def __enter__(self) -> "LogView":
+        try:
+            self._file = open(self.path, "rb")
+        except FileNotFoundError:
+            return self
+        size = os.fstat(self._file.fileno()).st_size
+        records = size // RECORD.size  # a torn trailing record is ignored
+        if not records:
+            return self
+        self._map = mmap.mmap(self._file.fileno(), records * RECORD.size, access=mmap.ACCESS_READ)
+        raw = self._view(memoryview(self._map))
+        self._words = self._view(raw.cast("Q"))
+        self._halves = self._view(raw.cast("H"))
+        self._bytes = raw
+        self._timestamps = self._view(self._view(raw.cast("d"))[0::_WORDS])
+
+        if self.since is None and self.until is None:
+            self.lo, self.hi = 0, records
+            self._ordered = False  # not checked; timestamps() takes the min and max
+        else:
+            self._select(records)
+        self.count = len(self.rows) if self.rows is not None else max(0, self.hi - self.lo)
+        return self
+
+    def _select(self, records: int) -> None:
+        timestamps = self._timestamps.tolist()
+        if all(map(operator.le, timestamps, itertools.islice(timestamps, 1, None))):
+            self.lo = bisect.bisect_left(timestamps, self.since) if self.since is not None else 0
+            self.hi = bisect.bisect_right(timestamps, self.until) if self.until is not None else records
+            return
+        self._ordered = False
+        since = -math.inf if self.since is None else self.since
+        until = math.inf if self.until is None else self.until
+        rows = [i for i, t in enumerate(timestamps) if since <= t <= until]
+        if not rows:
+            return
+        self.lo, self.hi = rows[0], rows[-1] + 1
+        if self.hi - self.lo != len(rows):
+            self.rows = rows
+
+    def _view(self, view: memoryview) -> memoryview:
+        self._views.append(view)
+        return view
+
+    def __exit__(self, *exc) -> None:
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _column(self, view: memoryview, stride: int, offset: int, start: Optional[int] = None, end: Optional[int] = None) -> memoryview:
+        start = self.lo if start is None else start
+        end = self.hi if end is None else end
+        return self._view(view[start * stride + offset:end * stride:stride])
+
+    def timestamps(self) -> Tuple[Optional[float], Optional[float]]:
+        if not self.count:
+            return None, None
+        if self._ordered:
+            return self._timestamps[self.lo], self._timestamps[self.hi - 1]
+        if self.rows is not None:
+            values = [self._timestamps[i] for i in self.rows]
+        else:
+            values = self._column(self._timestamps, 1, 0).tolist()
+        return min(values), max(values)
+
+    def selections(self) -> Dict[Tuple[int, int], Selection]:
+        """
+        (packed rules version, mask) -> (number of quotes, hours of that selection).
+
+        Within a chunk the version is normally the same in every record,
+        which one bytes comparison confirms; the masks are then counted straight
+        from the column. Only selections not seen in an earlier chunk are looked
+        up to find a record to read their hours from. Records listed in `rows`
+        are read one at a time.
+        """
+        if not self.count:
+            return {}
+        counts: Dict[int, Counter] = {}
+        where: Dict[Tuple[int, int], int] = {}
+        if self.rows is not None:
+            words = self._words
+            for i in self.rows:
+                version, mask = words[i * _WORDS + 2], words[i * _WORDS + 1]
+                counts.setdefault(version, Counter())[mask] += 1
+                where.setdefault((version, mask), i)
+        else:
+            for start in range(self.lo, self.hi, _CHUNK):
+                end = min(start + _CHUNK, self.hi)
+                masks = self._column(self._words, _WORDS, 1, start, end)
+                versions = self._column(self._words, _WORDS, 2, start, end)
+                packed = versions.tobytes()
+                if packed != packed[:8] * (end - start):
+                    # Workers pick up a new rules version at slightly different times.
+                    for i, (version, mask) in enumerate(zip(versions, masks), start):
+                        counts.setdefault(version, Counter())[mask] += 1
+                        where.setdefault((version, mask), i)
+                    continue
+                version = versions[0]
+                counter = counts.setdefault(version, Counter())
+                known = len(counter)
+                counter.update(masks)
+                if len(counter) > known:
+                    # Counters keep insertion order: the masks new to this version come last.
+                    new = list(itertools.islice(counter, known, None))
+                    for mask, i in _locate(new, masks, start).items():
+                        where[version, mask] = i
+        return {
+            (version, mask): (count, self._hours(where[version, mask]))
+            for version, counter in counts.items()
+            for mask, count in counter.items()
+        }
+
+    def _hours(self, index: int) -> Tuple[int, ...]:
+        base = index * _HALVES
+        with self._halves[base + _MODULES_AT:base + _TOTAL_AT + 1] as hours:
+            return tuple(hours.tolist())
+
+    def sources(self) -> Counter:
+        if not self.count:
+            return Counter()
+        if self.rows is not None:
+            return Counter(self._bytes[i * RECORD.size + _SOURCE_AT] for i in self.rows)
+        column = self._column(self._bytes, RECORD.size, _SOURCE_AT).tobytes()
+        counts = Counter({i: column.count(i) for i in range(len(SOURCES))})
+        if sum(counts.values()) != len(column):
+            return Counter(column)  # records from a newer release with more sources
+        return +counts
+
+
+def _locate(masks: Sequence[int], column: memoryview, start: int) -> Dict[int, int]:
+    """Record index of one occurrence of each of `masks` in a chunk's mask column starting at `start`."""
+    if len(masks) > 64:
+        # Many new selections (typically the first chunk): one pass over the chunk.
+        index = dict(zip(column, range(start, start + len(column))))
+        return {mask: index[mask] for mask in masks}
+    data = column.tobytes()
+    found = {}
+    for mask in masks:
+        needle = mask.to_bytes(8, "little")
+        pos = data.find(needle)
+        while pos % 8:  # a match straddling two masks
+            pos = data.find(needle, pos + 1)
+        found[mask] = start + pos // 8
+    return found
+
+
+def _set_bits(mask: int) -> List[int]:
+    bits = []
+    while mask:
+        low = mask & -mask
+        bits.append(low.bit_length() - 1)
+        mask ^= low
+    return bits
+
+
+def _by_version(
+    version_masks: Mapping[Tuple[int, int], int], versions: Dict[str, List[str]]
+) -> Tuple[List[Tuple[List[str], List[Tuple[List[int], int]]]], int]:
+    """Selections grouped per known rules version as (feature names, [(set bits, count)]); also quotes with an unknown version."""
+    grouped: Dict[int, List[Tuple[List[int], int]]] = {}
+    for (word, mask), count in version_masks.items():
+        grouped.setdefault(word, []).append((_set_bits(mask), count))
+    known = []
+    unknown = 0
+    for word, selections in grouped.items():
+        names = versions.get(_version_of(word))
+        if names is None:
+            unknown += sum(count for _, count in selections)
+        else:
+            # Bits of a count (named None) are not features of their own.
+            known.append((names, [([b for b in bits if b < len(names) and names[b]], count) for bits, count in selections]))
+    return known, unknown
+
+
+def _feature_counts(groups: Sequence[Tuple[List[str], List[Tuple[List[int], int]]]]) -> Counter:
+    features: Counter = Counter()
+    for names, selections in groups:
+        per_bit = [0] * len(names)
+        for bits, count in selections:
+            for b in bits:
+                per_bit[b] += count
+        for name, count in zip(names, per_bit):
+            if count:
+                features[name] += count
+    return features
+
+
+def _pair_counts(groups: Sequence[Tuple[List[str], List[Tuple[List[int], int]]]]) -> Counter:
+    """(feature a, feature b) with a < b -> quotes selecting both, counted per bit pair of each version."""
+    pairs: Counter = Counter()
+    for names, selections in groups:
+        n = len(names)
+        per_pair = [0] * (n * n)
+        for bits, count in selections:
+            for i, a in enumerate(bits):
+                row = a * n
+                for b in bits[i + 1:]:
+                    per_pair[row + b] += count
+        for a in range(n):
+            for b in range(a + 1, n):
+                count = per_pair[a * n + b]
+                if count:
+                    pairs[(names[a], names[b]) if names[a] < names[b] else (names[b], names[a])] += count
+    return pairs
+
+
+def summarize(path: str, since: Optional[float] = None, until: Optional[float] = None, top: int = 10) -> Dict[str, Any]:
+    """Quote counts, feature popularity, most common selections and per-module hour percentiles."""
+    versions = read_versions(path + ".versions")
+    with LogView(path, since, until) as view:
+        first, last = view.timestamps()
+        selections = view.selections()
+        sources = {SOURCES[k] if k < len(SOURCES) else str(k): v for k, v in view.sources().items()}
+        count = view.count
+
+    version_masks = Counter({key: c for key, (c, _) in selections.items()})
+    histograms = [Counter() for _ in range(len(RESPONSE_MODULE_ORDER) + 1)]
+    for c, hours in selections.values():
+        for histogram, h in zip(histograms, hours):
+            histogram[h] += c
+    modules = {}
+    for m, histogram in zip(RESPONSE_MODULE_ORDER, histograms):
+        modules[m] = _percentiles(histogram)
+        modules[m]["with_hours"] = sum(c for v, c in histogram.items() if v)
+    total = _percentiles(histograms[-1])
+    groups, unknown = _by_version(version_masks, versions)
+    features = _feature_counts(groups)
+    rules_versions: Counter = Counter()
+    for (word, _), c in version_masks.items():
+        rules_versions[_version_of(word)] += c
+
+    top_selections = []
+    for (word, mask), c in version_masks.most_common(max(0, top)):
+        names = versions.get(_version_of(word), [])
+        top_selections.append({
+            "rules_version": _version_of(word),
+            "features": [names[b] for b in range(min(len(names), mask.bit_length())) if mask >> b & 1 and names[b]],
+            "count": c,
+        })
+
+    return {
+        "quotes": count,
+        "first": first,
+        "last": last,
+        "sources": sources,
+        "rules_versions": dict(rules_versions.most_common()),
+        "features": dict(features.most_common()),
+        "unknown_version_quotes": unknown,
+        "top_selections": top_selections,
+        "modules": modules,
+        "total_hours": total,
+    }
+
+
+def cooccurrence(path: str, since: Optional[float] = None, until: Optional[float] = None, top: int = 50) -> Dict[str, Any]:
+    """How often each pair of features is selected together, most frequent first."""
+    versions = read_versions(path + ".versions")
+    with LogView(path, since, until) as view:
+        selections = view.selections()
+        count = view.count
+    groups, _ = _by_version({key: c for key, (c, _) in selections.items()}, versions)
+    features = _feature_counts(groups)
+    pairs = _pair_counts(groups)
+    ranked = sorted(pairs.items(), key=lambda kv: (-kv[1], kv[0]))[: max(0, top)]
+    return {
+        "quotes": count,
+        "pairs": [
+            {
+                "features": [a, b],
+                "count": c,
+                # Share of the quotes with `a` that also have `b`, and vice versa.
+                "b_given_a": round(c / features[a], 4) if features[a] else 0,
+                "a_given_b": round(c / features[b], 4) if features[b] else 0,
+            }
+            for (a, b), c in ranked
+        ],
+    }
@@ -0,0 +1,198 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Mapping, Optional
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    quote_id      TEXT PRIMARY KEY,
+    created_at    REAL NOT NULL,
+    customer_name TEXT NOT NULL,
+    customer_key  TEXT NOT NULL,
+    rules_version TEXT NOT NULL,
+    quote_code    TEXT NOT NULL,
+    features      TEXT NOT NULL,
+    result        TEXT NOT NULL,
+    report        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quotes_by_customer ON quotes (customer_key, created_at DESC);
+CREATE TABLE IF NOT EXISTS quote_artifacts (
+    quote_id   TEXT NOT NULL REFERENCES quotes (quote_id) ON DELETE CASCADE,
+    kind       TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    content    BLOB NOT NULL,
+    PRIMARY KEY (quote_id, kind)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS email_jobs (
+    job_id     TEXT PRIMARY KEY,
+    status     TEXT NOT NULL,
+    attempts   INTEGER NOT NULL,
+    error      TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    revision   INTEGER NOT NULL
+);
+"""
+
+_QUOTE_COLUMNS = "quote_id, created_at, customer_name, rules_version, quote_code, features, result, report"
+
+
+def customer_key(name: str) -> str:
+    """Normalized customer name used for lookups (case and surrounding spaces ignored)."""
+    return " ".join(name.split()).casefold()
+
+
+class QuoteStore:
+    """
+    Saved quotes in an embedded SQLite database (WAL mode).
+
+    A quote keeps its inputs (features and quote code), the /calculate result and
+    the report content exactly as they were under the rules version it was
+    computed with, so it can be re-rendered or emailed later without recomputing.
+    Rendered PDFs are kept alongside as artifacts, and so is the delivery state of
+    queued emails, so any worker (or a restarted one) can answer a status poll.
+
+    Each thread gets its own connection: WAL lets readers run while a write is in
+    progress, and writes are short single-statement transactions.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        if self._closed:
+            raise RuntimeError("Quote store is closed")
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10.0)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only risks the last commits on power loss, never corruption.
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        self._local.conn = conn
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def save(
+        self,
+        customer_name: str,
+        rules_version: str,
+        quote_code: str,
+        features: Dict[str, bool],
+        result: bytes,
+        report: Dict[str, Any],
+    ) -> str:
+        """Stores a quote; `result` is the serialized /calculate body. Returns the new quote_id."""
+        quote_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO quotes (quote_id, created_at, customer_name, customer_key, rules_version,"
+                " quote_code, features, result, report) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    quote_id,
+                    time.time(),
+                    customer_name,
+                    customer_key(customer_name),
+                    rules_version,
+                    quote_code,
+                    json.dumps(features, separators=(",", ":")),
+                    result.decode("utf-8"),
+                    json.dumps(report, ensure_ascii=False, separators=(",", ":")),
+                ),
+            )
+        return quote_id
+
+    @staticmethod
+    def _row_to_quote(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "quote_id": row["quote_id"],
+            "created_at": row["created_at"],
+            "customer_name": row["customer_name"],
+            "rules_version": row["rules_version"],
+            "quote_code": row["quote_code"],
+            "features": json.loads(row["features"]),
+            "result": json.loads(row["result"]),
+            "report": json.loads(row["report"]),
+        }
+
+    def get(self, quote_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(f"SELECT {_QUOTE_COLUMNS} FROM quotes WHERE quote_id = ?", (quote_id,)).fetchone()
+        return self._row_to_quote(row) if row is not None else None
+
+    def find_by_customer(self, customer_name: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Newest first; served from the (customer_key, created_at) index."""
+        rows = self._connect().execute(
+            "SELECT quote_id, created_at, customer_name, rules_version, quote_code FROM quotes"
+            " WHERE customer_key = ? ORDER BY created_at DESC LIMIT ?",
+            (customer_key(customer_name), max(1, int(limit))),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_artifact(self, quote_id: str, kind: str) -> Optional[bytes]:
+        row = self._connect().execute(
+            "SELECT content FROM quote_artifacts WHERE quote_id = ? AND kind = ?", (quote_id, kind)
+        ).fetchone()
+        return bytes(row["content"]) if row is not None else None
+
+    def put_artifact(self, quote_id: str, kind: str, content: bytes) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO quote_artifacts (quote_id, kind, created_at, content) VALUES (?, ?, ?, ?)",
+                (quote_id, kind, time.time(), sqlite3.Binary(content)),
+            )
+
+    def save_email_job(self, job: Mapping[str, Any], keep_for: float = 3600.0) -> None:
+        """
+        Records an outbox job's state (SmtpOutbox `on_change`); a state older than the
+        stored one (lower `revision`) is ignored. Finished jobs are dropped after `keep_for` seconds.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO email_jobs (job_id, status, attempts, error, created_at, updated_at, revision)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (job_id) DO UPDATE SET status = excluded.status, attempts = excluded.attempts,"
+                " error = excluded.error, updated_at = excluded.updated_at, revision = excluded.revision"
+                " WHERE excluded.revision > email_jobs.revision",
+                (
+                    job["job_id"],
+                    job["status"],
+                    job["attempts"],
+                    job["error"],
+                    job["created_at"],
+                    job["updated_at"],
+                    job.get("revision", 0),
+                ),
+            )
+            if job["status"] == "queued":
+                conn.execute(
+                    "DELETE FROM email_jobs WHERE status IN ('sent', 'failed') AND updated_at < ?",
+                    (time.time() - keep_for,),
+                )
+
+    def get_email_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT job_id, status, attempts, error, created_at, updated_at FROM email_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                pass
@@ -0,0 +1,321 @@
+"""
+Standalone HTML -> PDF render service shared by every API worker on the host.
+
+    python render_daemon.py --socket /run/psc/render.sock
+
+One process owns the Chromium pool, so browser memory is bounded by its pool
+size no matter how many uvicorn workers run. The workers point
+RENDER_DAEMON_SOCKET (env.py) at the same path and talk to it through
+`RenderDaemonClient` instead of launching browsers themselves. Unix only.
+
+Wire format, both directions: a 5-byte header (`>BI`: kind, payload length)
+followed by the payload. Requests are OP_RENDER (UTF-8 HTML) or OP_STATS
+(empty). Replies are STATUS_OK (PDF bytes, or JSON for stats) or STATUS_ERROR
+(JSON `{"type": ..., "message": ...}`; `"type": "Busy"` when the queue is
+full, which the client raises as the retryable RenderDaemonBusy). A connection
+carries any number of requests, one at a time.
+"""
+import asyncio
+import json
+import os
+import signal
+import socket
+import struct
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from admission import Overloaded
+from render_pool import BrowserPool
+
+
+OP_RENDER = 1
+OP_STATS = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+_HEADER = struct.Struct(">BI")
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+
+class RenderDaemonError(RuntimeError):
+    """The daemon answered, but the render failed (the daemon's error is in the message)."""
+
+
+class RenderDaemonUnavailable(ConnectionError):
+    """No daemon is listening on the socket, or it went away mid-request."""
+
+
+class RenderDaemonBusy(Overloaded):
+    """The daemon's queue is full; like any Overloaded, a 503 with Retry-After for the caller."""
+
+    def __init__(self, message: str, retry_after: int) -> None:
+        super().__init__("render_daemon", message, retry_after)
+
+
+class Busy(RuntimeError):
+    """Daemon side: the job was refused because `max_queue` jobs are already waiting."""
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    kind, length = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {length} bytes exceeds the {MAX_FRAME_BYTES} byte limit")
+    return kind, await reader.readexactly(length)
+
+
+def _frame(kind: int, payload: bytes) -> bytes:
+    return _HEADER.pack(kind, len(payload)) + payload
+
+
+def _error_payload(e: BaseException) -> bytes:
+    return json.dumps({"type": type(e).__name__, "message": str(e) or repr(e)}).encode("utf-8")
+
+
+class RenderDaemon:
+    """
+    Serves render jobs from a BrowserPool over a Unix socket.
+
+    At most `pool.size` pages render at once; up to `max_queue` further jobs wait
+    in the pool's queue, and anything beyond that is refused right away with a
+    `Busy` error instead of piling up in memory.
+    """
+
+    def __init__(self, path: str, pool: BrowserPool, max_queue: int = 100) -> None:
+        self.path = path
+        self.pool = pool
+        self.max_queue = max(0, int(max_queue))
+        self._pending = 0
+        self._connections = 0
+        self._stats: Dict[str, int] = {"rendered": 0, "failed": 0, "rejected": 0}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: Set["asyncio.Task[None]"] = set()
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self._stats)
+        stats["pending"] = self._pending
+        stats["connections"] = self._connections
+        stats["pool"] = self.pool.stats()
+        return stats
+
+    def _remove_stale_socket(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            os.unlink(self.path)
+        else:
+            raise RuntimeError(f"Another render daemon is already listening on {self.path}")
+        finally:
+            probe.close()
+
+    async def start(self) -> None:
+        self._remove_stale_socket()
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path, limit=MAX_FRAME_BYTES)
+        # Only processes running as the same user (the API workers) may submit jobs.
+        os.chmod(self.path, 0o600)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Connections are long-lived, so end their handlers rather than wait for the clients.
+            for task in list(self._handlers):
+                task.cancel()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    async def _render(self, html: str) -> Tuple[int, bytes]:
+        if self._pending >= self.pool.size + self.max_queue:
+            self._stats["rejected"] += 1
+            return STATUS_ERROR, _error_payload(Busy(f"{self._pending} renders already queued"))
+        self._pending += 1
+        try:
+            pdf = await self.pool.render(html)
+        except Exception as e:
+            self._stats["failed"] += 1
+            return STATUS_ERROR, _error_payload(e)
+        finally:
+            self._pending -= 1
+        self._stats["rendered"] += 1
+        return STATUS_OK, pdf
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        if task is not None:
+            self._handlers.add(task)
+        self._connections += 1
+        try:
+            while True:
+                try:
+                    op, payload = await _read_frame(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except ValueError as e:
+                    writer.write(_frame(STATUS_ERROR, _error_payload(e)))
+                    await writer.drain()
+                    return
+
+                if op == OP_RENDER:
+                    status, body = await self._render(payload.decode("utf-8"))
+                elif op == OP_STATS:
+                    status, body = STATUS_OK, json.dumps(self.stats()).encode("utf-8")
+                else:
+                    status, body = STATUS_ERROR, _error_payload(ValueError(f"Unknown operation {op}"))
+
+                writer.write(_frame(status, body))
+                await writer.drain()
+        except asyncio.CancelledError:
+            # Daemon shutdown; the client sees the connection close.
+            pass
+        finally:
+            self._connections -= 1
+            self._handlers.discard(task)
+            writer.close()
+
+
+class RenderDaemonClient:
+    """
+    API-worker side of the render daemon; a drop-in for BrowserPool in `app.state.pdf_pool`.
+
+    Keeps up to `max_connections` connections open to the daemon and reuses them,
+    so a render costs one request/response on an already-open socket. A reused
+    connection that turns out to be dead (daemon restarted) is replaced once.
+    A full daemon queue raises RenderDaemonBusy, asking the caller to retry
+    after `busy_retry_after` seconds.
+    """
+
+    def __init__(self, path: str, max_connections: int = 4, timeout: float = 120.0, busy_retry_after: int = 5) -> None:
+        self.path = path
+        self.max_connections = max(1, int(max_connections))
+        self.timeout = float(timeout)
+        self.busy_retry_after = max(1, int(busy_retry_after))
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._stats: Dict[str, int] = {"renders": 0, "failures": 0, "busy": 0, "connects": 0, "in_flight": 0}
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        try:
+            conn = await asyncio.open_unix_connection(self.path, limit=MAX_FRAME_BYTES)
+        except OSError as e:
+            raise RenderDaemonUnavailable(f"Render daemon is not reachable at {self.path}: {e}") from e
+        self._stats["connects"] += 1
+        return conn
+
+    async def _request(self, op: int, payload: bytes) -> Tuple[int, bytes]:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_connections)
+        async with self._slots:
+            reused = bool(self._idle)
+            conn = self._idle.pop() if reused else await self._connect()
+            try:
+                try:
+                    result = await asyncio.wait_for(self._roundtrip(conn, op, payload), self.timeout)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    if not reused:
+                        raise
+                    conn[1].close()
+                    conn = await self._connect()
+                    result = await asyncio.wait_for(self._roundtrip(conn, op, payload), self.timeout)
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                conn[1].close()
+                if isinstance(e, RenderDaemonUnavailable):
+                    raise
+                raise RenderDaemonUnavailable(f"Render daemon at {self.path} closed the connection") from e
+            except BaseException:
+                # Timed out or cancelled mid-frame: the connection can't be reused.
+                conn[1].close()
+                raise
+            self._idle.append(conn)
+            return result
+
+    @staticmethod
+    async def _roundtrip(conn: Tuple[asyncio.StreamReader, asyncio.StreamWriter], op: int, payload: bytes) -> Tuple[int, bytes]:
+        reader, writer = conn
+        writer.write(_frame(op, payload))
+        await writer.drain()
+        return await _read_frame(reader)
+
+    async def render(self, html: str) -> bytes:
+        self._stats["in_flight"] += 1
+        try:
+            status, payload = await self._request(OP_RENDER, html.encode("utf-8"))
+        except BaseException:
+            self._stats["failures"] += 1
+            raise
+        finally:
+            self._stats["in_flight"] -= 1
+        if status != STATUS_OK:
+            error = json.loads(payload.decode("utf-8"))
+            if error.get("type") == Busy.__name__:
+                self._stats["busy"] += 1
+                raise RenderDaemonBusy(str(error.get("message")), self.busy_retry_after)
+            self._stats["failures"] += 1
+            raise RenderDaemonError(f"{error.get('type')}: {error.get('message')}")
+        self._stats["renders"] += 1
+        return payload
+
+    async def daemon_stats(self) -> Dict[str, Any]:
+        status, payload = await self._request(OP_STATS, b"")
+        if status != STATUS_OK:
+            raise RenderDaemonError(payload.decode("utf-8", "replace"))
+        return json.loads(payload.decode("utf-8"))
+
+    def stats(self) -> Dict[str, int]:
+        stats = dict(self._stats)
+        stats["idle_connections"] = len(self._idle)
+        return stats
+
+    def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+
+async def _serve(args: Any) -> None:
+    pool = BrowserPool(
+        size=args.size,
+        max_renders=args.max_renders,
+        max_rss_mb=args.max_rss_mb,
+        health_interval=args.health_interval,
+    )
+    pool.start()
+    daemon = RenderDaemon(args.socket, pool, max_queue=args.max_queue)
+    await daemon.start()
+    print(f"Render daemon listening on {args.socket} ({args.size} browsers, queue {args.max_queue})", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    started = time.monotonic()
+    try:
+        await stop.wait()
+    finally:
+        await daemon.close()
+        await asyncio.to_thread(pool.close)
+        print(f"Render daemon stopped after {time.monotonic() - started:.0f}s: {daemon.stats()}", flush=True)
+
+
+def main() -> None:
+    import argparse
+
+    import env
+
+    parser = argparse.ArgumentParser(description="Shared Chromium render service for the API workers.")
+    parser.add_argument("--socket", default=getattr(env, "RENDER_DAEMON_SOCKET", None) or "/tmp/psc-render.sock")
+    parser.add_argument("--size", type=int, default=int(getattr(env, "PDF_POOL_SIZE", 2)), help="browsers (= concurrent renders)")
+    parser.add_argument("--max-queue", type=int, default=int(getattr(env, "RENDER_DAEMON_MAX_QUEUE", 100)))
+    parser.add_argument("--max-renders", type=int, default=int(getattr(env, "PDF_POOL_MAX_RENDERS", 200)))
+    parser.add_argument("--max-rss-mb", type=int, default=int(getattr(env, "PDF_POOL_MAX_RSS_MB", 0)))
+    parser.add_argument("--health-interval", type=float, default=float(getattr(env, "PDF_POOL_HEALTH_INTERVAL", 30)))
+    asyncio.run(_serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import asyncio
+import concurrent.futures
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, ContextManager, Dict, List, Optional
+
+from metrics import StageTimer
+
+
+PDF_OPTIONS: Dict[str, Any] = {"format": "Letter", "print_background": True}
+
+
+def _process_tree_rss_bytes(root_pid: int) -> int:
+    # Linux only: sums the resident memory of every descendant of root_pid
+    # (the Playwright driver and the Chromium processes it spawned).
+    if not sys.platform.startswith("linux"):
+        return 0
+
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name can contain spaces, so parse after the closing paren.
+        fields = stat[stat.rfind(b")") + 2:].split()
+        children.setdefault(int(fields[1]), []).append(int(entry))
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    stack = list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/statm", "rb") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+class _BrowserSlot:
+    """One Chromium browser with a single context and a reusable page, owned by one worker thread."""
+
+    def __init__(self, playwright: Any, stages: Optional[StageTimer] = None) -> None:
+        self._playwright = playwright
+        self._stages = stages
+        self.browser: Any = None
+        self.context: Any = None
+        self.page: Any = None
+        self.renders = 0
+
+    def healthy(self) -> bool:
+        return self.browser is not None and self.browser.is_connected()
+
+    def _time(self, stage: str) -> ContextManager[Any]:
+        return self._stages.time(stage) if self._stages is not None else nullcontext()
+
+    def launch(self) -> None:
+        self.close()
+        with self._time("chromium_launch"):
+            self.browser = self._playwright.chromium.launch()
+            self.context = self.browser.new_context()
+        self.renders = 0
+
+    def render(self, html: str) -> bytes:
+        if not self.healthy():
+            self.launch()
+        if self.page is None or self.page.is_closed():
+            self.page = self.context.new_page()
+        with self._time("set_content"):
+            self.page.set_content(html, wait_until="load")
+        with self._time("page_pdf"):
+            pdf = self.page.pdf(**PDF_OPTIONS)
+        self.renders += 1
+        return pdf
+
+    def close(self) -> None:
+        browser, self.browser, self.context, self.page = self.browser, None, None, None
+        if browser is None:
+            return
+        try:
+            browser.close()
+        except Exception:
+            pass
+
+
+class BrowserPool:
+    """
+    Long-lived pool of warm Chromium browsers for HTML -> PDF rendering.
+
+    Playwright's sync API objects are bound to the thread that created them, so each
+    browser lives on its own worker thread and jobs are handed over through a queue.
+    A browser is relaunched when it disconnects, after a failed render, after
+    `max_renders` renders, or when the Chromium processes of the whole pool exceed
+    `max_rss_mb` (0 disables the memory check).
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_renders: int = 200,
+        max_rss_mb: int = 0,
+        health_interval: float = 30.0,
+        stages: Optional[StageTimer] = None,
+    ) -> None:
+        self.size = max(1, int(size))
+        self.max_renders = max(1, int(max_renders))
+        self.max_rss_bytes = max(0, int(max_rss_mb)) * 1024 * 1024
+        self.health_interval = float(health_interval)
+        self.stages = stages
+
+        self._jobs: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+        self._lock = threading.Lock()
+        self._last_rss_check = 0.0
+        self._stats: Dict[str, int] = {"renders": 0, "failures": 0, "launches": 0, "recycles": 0}
+
+    def start(self) -> None:
+        for i in range(self.size):
+            t = threading.Thread(target=self._worker, name=f"pdf-pool-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    async def render(self, html: str) -> bytes:
+        if self._closed:
+            raise RuntimeError("PDF browser pool is closed")
+        fut: concurrent.futures.Future = concurrent.futures.Future()
+        self._jobs.put((html, fut, time.perf_counter()))
+        if self._closed:
+            # close() may have drained the queue between the check above and the put.
+            self._drain()
+        return await asyncio.wrap_future(fut)
+
+    def close(self, timeout: float = 10.0) -> None:
+        self._closed = True
+        for _ in self._threads:
+            self._jobs.put(None)
+        for t in self._threads:
+            t.join(timeout)
+        self._threads.clear()
+        # Jobs queued behind the stop markers would never be picked up; fail them instead of leaving callers waiting.
+        self._drain()
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                return
+            if job is None:
+                continue
+            fut = job[1]
+            if fut.set_running_or_notify_cancel():
+                fut.set_exception(RuntimeError("PDF browser pool is closed"))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["size"] = self.size
+        stats["queued"] = self._jobs.qsize()
+        return stats
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def _over_memory_budget(self) -> bool:
+        if not self.max_rss_bytes:
+            return False
+        now = time.monotonic()
+        if now - self._last_rss_check < 5.0:
+            return False
+        self._last_rss_check = now
+        return _process_tree_rss_bytes(os.getpid()) > self.max_rss_bytes
+
+    def _fail_pending(self, exc: BaseException) -> None:
+        # Without Playwright no worker can ever serve a job, so fail them instead of hanging.
+        while not self._closed:
+            job = self._jobs.get()
+            if job is None:
+                return
+            fut = job[1]
+            if fut.set_running_or_notify_cancel():
+                fut.set_exception(exc)
+
+    def _worker(self) -> None:
+        try:
+            from playwright.sync_api import sync_playwright
+
+            playwright = sync_playwright().start()
+        except Exception as e:
+            self._fail_pending(e)
+            return
+
+        slot = _BrowserSlot(playwright, self.stages)
+        try:
+            self._serve(slot)
+        finally:
+            slot.close()
+            playwright.stop()
+
+    def _warm(self, slot: _BrowserSlot) -> None:
+        try:
+            slot.launch()
+            self._count("launches")
+        except Exception:
+            # Surfaced on the next job, which retries the launch.
+            slot.close()
+
+    def _serve(self, slot: _BrowserSlot) -> None:
+        self._warm(slot)
+
+        while True:
+            try:
+                job = self._jobs.get(timeout=self.health_interval)
+            except queue.Empty:
+                # Idle health check: replace a crashed or recycled browser while nobody waits on it.
+                if not slot.healthy():
+                    self._warm(slot)
+                continue
+
+            if job is None:
+                return
+
+            html, fut, queued_at = job
+            if not fut.set_running_or_notify_cancel():
+                continue
+            if self.stages is not None:
+                self.stages.observe("pdf_queue_wait", time.perf_counter() - queued_at)
+
+            try:
+                if not slot.healthy():
+                    self._count("launches")
+                pdf = slot.render(html)
+            except Exception as e:
+                self._count("failures")
+                slot.close()
+                fut.set_exception(e)
+                continue
+
+            self._count("renders")
+            fut.set_result(pdf)
+
+            if slot.renders >= self.max_renders or self._over_memory_budget():
+                self._count("recycles")
+                self._warm(slot)
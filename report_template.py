@@ -0,0 +1,307 @@
+import html
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Mapping, Optional, Sequence, Tuple
+
+
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)(\|safe)?\s*\}\}")
+
+
+class Template:
+    """
+    A string with `{{ name }}` placeholders, split into literal chunks once.
+
+    `{{ name }}` is HTML-escaped at render time; `{{ name|safe }}` is inserted as
+    is (for fragments that were escaped when they were built). Values in
+    `constants` are escaped and folded into the literal text at compile time.
+    Rendering is a single join over the precompiled chunks, with no parsing or
+    formatting.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        escape: Callable[[str], str] = html.escape,
+        constants: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        self._escape = escape
+        self._literals: List[str] = []
+        self._slots: List[Tuple[str, bool]] = []
+        constants = constants or {}
+        literal = ""
+        pos = 0
+        for m in _PLACEHOLDER.finditer(source):
+            literal += source[pos:m.start()]
+            pos = m.end()
+            name, escaped = m.group(1), m.group(2) is None
+            if name in constants:
+                literal += escape(constants[name]) if escaped else constants[name]
+                continue
+            self._literals.append(literal)
+            self._slots.append((name, escaped))
+            literal = ""
+        self._literals.append(literal + source[pos:])
+        self.names = frozenset(name for name, _ in self._slots)
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        parts = [self._literals[0]]
+        for (name, escaped), literal in zip(self._slots, self._literals[1:]):
+            value = str(values[name])
+            parts.append(self._escape(value) if escaped else value)
+            parts.append(literal)
+        return "".join(parts)
+
+
+# (module name, labels of the checked features), in display order.
+Modules = Tuple[Tuple[str, Tuple[str, ...]], ...]
+
+
+class ReportContent:
+    """
+    The parts of a quote report that do not depend on the customer.
+
+    `fragments` holds this report's rendered bodies per format, filled on first use.
+    """
+
+    __slots__ = ("modules", "card_rows", "scope_title", "scope_items", "total_line", "fragments")
+
+    def __init__(
+        self,
+        modules: Sequence[Tuple[str, Sequence[str]]],
+        card_rows: Sequence[str],
+        scope_title: str,
+        scope_items: Sequence[str],
+        total_line: str,
+    ) -> None:
+        self.modules: Modules = tuple((name, tuple(items)) for name, items in modules if items)
+        self.card_rows = tuple(card_rows)
+        self.scope_title = scope_title
+        self.scope_items = tuple(scope_items)
+        self.total_line = total_line
+        self.fragments: Dict[str, str] = {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "modules": [[name, list(items)] for name, items in self.modules],
+            "card_rows": list(self.card_rows),
+            "scope_title": self.scope_title,
+            "scope_items": list(self.scope_items),
+            "total_line": self.total_line,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "ReportContent":
+        return cls(data["modules"], data["card_rows"], data["scope_title"], data["scope_items"], data["total_line"])
+
+
+class ReportCache:
+    """Bounded LRU of ReportContent (with its rendered fragments) per quote."""
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[Hashable, ReportContent]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+    def get_or_build(self, key: Hashable, build: Callable[[], ReportContent]) -> ReportContent:
+        with self._lock:
+            content = self._entries.get(key)
+            if content is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return content
+            self._stats["misses"] += 1
+        content = build()
+        with self._lock:
+            self._entries[key] = content
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return content
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        return stats
+
+
+_HTML_SKELETON = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8" />
+<title>PSC Hours - {{ customer }}</title>
+<style>
+    body { font-family: Segoe UI, Arial, sans-serif; color: #111827; }
+    .header { border-bottom: 2px solid #e5e7eb; padding-bottom: 10px; margin-bottom: 16px; }
+    .title { font-size: 14pt; font-weight: 700; }
+    .meta { font-size: 10pt; color: #374151; }
+    .customer { margin-top: 6px; font-size: 11pt; font-weight: 600; }
+    .layout { display: grid; grid-template-columns: 1.6fr 1fr; gap: 18px; align-items: start; }
+    .module { border: 1px solid #e5e7eb; border-radius: 8px; padding: 12px; margin-bottom: 12px; break-inside: avoid; }
+    .module h2 { margin: 0 0 8px 0; font-size: 11pt; border-bottom: 1px solid #f3f4f6; padding-bottom: 6px; }
+    .checked-list { margin: 0; padding-left: 18px; }
+    .result-card { border: 2px solid #111827; border-radius: 8px; padding: 14px; break-inside: avoid; }
+    .row { margin: 6px 0; font-weight: 700; text-transform: uppercase; font-size: 10pt; }
+    .hours { margin-top: 10px; font-size: 12pt; font-weight: 800; }
+    h4 { margin: 14px 0 6px 0; font-size: 10pt; }
+    ul { margin: 0; padding-left: 18px; }
+    .disclaimer { margin-top: 14px; padding-top: 10px; border-top: 1px solid #e5e7eb; font-size: 9.5pt; color: #374151; line-height: 1.35; }
+</style>
+</head>
+<body>
+<div class="header">
+    <div class="title">PSC Hours Calculator</div>
+    <div class="meta"></div>
+    <div class="customer">Customer: {{ customer }}</div>
+</div>
+
+<div class="layout">
+    <div>
+{{ modules|safe }}
+    </div>
+
+    <aside class="result-card">
+{{ result|safe }}
+    <div class="disclaimer">{{ disclaimer }}</div>
+    </aside>
+</div>
+</body>
+</html>
+"""
+
+_TEXT_SKELETON = """PSC Hours Calculator
+Customer: {{ customer }}
+
+{{ body|safe }}
+{{ disclaimer }}
+"""
+
+_MARKDOWN_SKELETON = """# PSC Hours Calculator
+
+**Customer:** {{ customer }}
+
+{{ body|safe }}
+> {{ disclaimer }}
+"""
+
+_MARKDOWN_SPECIAL = re.compile(r"([\\`*_{}\[\]()#+\-.!|<>~])")
+
+
+def markdown_escape(text: str) -> str:
+    return _MARKDOWN_SPECIAL.sub(r"\\\1", text)
+
+
+def _no_escape(text: str) -> str:
+    return text
+
+
+class ReportRenderer:
+    """
+    Renders a quote report as HTML (for the PDF), plain text or Markdown (for email).
+
+    Each skeleton is compiled once, with the disclaimer folded in. The
+    customer-independent body of a report (module checklists and the result card)
+    is built once per ReportContent and format; with `content()` caching the
+    ReportContent per quote, a repeat render only escapes the customer name and
+    joins a handful of strings.
+    """
+
+    def __init__(self, disclaimer: str, max_entries: int = 1024) -> None:
+        self.disclaimer = disclaimer
+        self.cache = ReportCache(max_entries)
+        constants = {"disclaimer": disclaimer}
+        self._html = Template(_HTML_SKELETON, constants=constants)
+        self._text = Template(_TEXT_SKELETON, escape=_no_escape, constants=constants)
+        self._markdown = Template(_MARKDOWN_SKELETON, escape=markdown_escape, constants=constants)
+
+    def content(self, key: Hashable, build: Callable[[], ReportContent]) -> ReportContent:
+        """The cached ReportContent for `key` (which must identify the quote and rules version)."""
+        return self.cache.get_or_build(key, build)
+
+    @staticmethod
+    def _fragment(content: ReportContent, name: str, build: Callable[[ReportContent], str]) -> str:
+        fragment = content.fragments.get(name)
+        if fragment is None:
+            # Concurrent first renders may both build it; the results are identical.
+            fragment = content.fragments[name] = build(content)
+        return fragment
+
+    def html(self, customer: str, content: ReportContent) -> str:
+        modules = self._fragment(content, "html.modules", self._html_modules)
+        result = self._fragment(content, "html.result", self._html_result)
+        return self._html.render({"customer": customer, "modules": modules, "result": result})
+
+    def text(self, customer: str, content: ReportContent) -> str:
+        body = self._fragment(content, "text", self._text_body)
+        return self._text.render({"customer": customer, "body": body})
+
+    def markdown(self, customer: str, content: ReportContent) -> str:
+        body = self._fragment(content, "markdown", self._markdown_body)
+        return self._markdown.render({"customer": customer, "body": body})
+
+    @staticmethod
+    def _html_modules(content: ReportContent) -> str:
+        esc = html.escape
+        sections = []
+        for name, items in content.modules:
+            lis = "".join(f"<li>{esc(i)}</li>" for i in items)
+            sections.append(
+                f'    <section class="module">\n'
+                f"        <h2>{esc(name)}</h2>\n"
+                f'        <ul class="checked-list">{lis}</ul>\n'
+                f"    </section>\n"
+            )
+        return "".join(sections)
+
+    @staticmethod
+    def _html_result(content: ReportContent) -> str:
+        esc = html.escape
+        parts = [f'    <div class="row">{esc(row)}</div>\n' for row in content.card_rows]
+        if content.scope_title:
+            items = "".join(f"<li>{esc(i)}</li>" for i in content.scope_items)
+            parts.append(f"    <h4>{esc(content.scope_title)}</h4><ul>{items}</ul>\n")
+        parts.append(f'    <div class="hours">{esc(content.total_line)}</div>')
+        return "".join(parts)
+
+    @staticmethod
+    def _text_body(content: ReportContent) -> str:
+        lines: List[str] = []
+        for name, items in content.modules:
+            lines.append(name)
+            lines.extend(f"  [x] {i}" for i in items)
+            lines.append("")
+        lines.append("Results")
+        lines.extend(f"  {row}" for row in content.card_rows)
+        lines.append("")
+        if content.scope_title:
+            lines.append(content.scope_title)
+            lines.extend(f"  - {i}" for i in content.scope_items)
+            lines.append("")
+        lines.append(content.total_line)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _markdown_body(content: ReportContent) -> str:
+        esc = markdown_escape
+        lines: List[str] = []
+        for name, items in content.modules:
+            lines.append(f"## {esc(name)}")
+            lines.append("")
+            lines.extend(f"- [x] {esc(i)}" for i in items)
+            lines.append("")
+        lines.append("## Results")
+        lines.append("")
+        lines.extend(f"- {esc(row)}" for row in content.card_rows)
+        lines.append("")
+        if content.scope_title:
+            lines.append(f"### {esc(content.scope_title)}")
+            lines.append("")
+            lines.extend(f"- {esc(i)}" for i in content.scope_items)
+            lines.append("")
+        lines.append(f"**{esc(content.total_line)}**")
+        return "\n".join(lines) + "\n"
+
+    def stats(self) -> Dict[str, int]:
+        return self.cache.stats()
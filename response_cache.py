@@ -0,0 +1,69 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+def render_json(content: Any) -> bytes:
+    # Same bytes FastAPI's JSONResponse would produce for this content.
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """
+    Bounded LRU of serialized response bodies.
+
+    Entries belong to one rules version; the first lookup under a different
+    version drops everything, so edited rules can never be served stale.
+    """
+
+    def __init__(self, max_entries: int = 4096) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._stats: Dict[str, int] = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get_or_build(self, version: str, key: Hashable, build: Callable[[], Any]) -> bytes:
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    self._stats["invalidations"] += 1
+                self._entries.clear()
+                self._version = version
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return body
+            self._stats["misses"] += 1
+
+        body = render_json(build())
+
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = body
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return body
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["version"] = self._version
+        return stats
@@ -0,0 +1,557 @@
+import hashlib
+import json
+from itertools import product
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+
+# Mask bits one module's table may read (flags plus the bits of its counts): 2^16 rows at most.
+MAX_FLAGS_PER_MODULE = 16
+
+# Order of the `<module>_score` fields in the /calculate response (not the MODULE_LABELS order).
+RESPONSE_MODULE_ORDER = ("bre", "app", "abs", "exh", "appointments", "kiosk")
+
+
+def score_order(module_labels: Mapping[str, str]) -> Tuple[str, ...]:
+    known = tuple(m for m in RESPONSE_MODULE_ORDER if m in module_labels)
+    return known + tuple(m for m in module_labels.keys() if m not in known)
+
+
+def _add_hours(target: Dict[str, float], key: str, amount: float) -> None:
+    if not amount:
+        return
+    target[key] = float(target.get(key, 0)) + float(amount)
+
+
+def is_count(rule: Mapping[str, Any]) -> bool:
+    """Rules with `"type": "count"` take a number of units (0..`max`) instead of on/off."""
+    return rule.get("type") == "count"
+
+
+def brackets(rule: Mapping[str, Any]) -> List[Tuple[int, Mapping[str, float]]]:
+    """
+    A count rule's hours per unit as (above, hours) brackets, lowest first.
+
+    `hours` applies from the first unit; each of `tiers` replaces it for the
+    units above its `above`, up to the next tier. With
+    `"hours": {"support": 1}, "tiers": [{"above": 8, "hours": {"support": 3}}]`,
+    10 units give 8 x 1 + 2 x 3 hours.
+    """
+    return [(0, rule.get("hours", {}))] + [(int(t["above"]), t.get("hours", {})) for t in rule.get("tiers", [])]
+
+
+def _add_count_hours(target: Dict[str, float], rule: Mapping[str, Any], units: int) -> None:
+    tiers = brackets(rule)
+    for i, (above, hours_map) in enumerate(tiers):
+        upper = tiers[i + 1][0] if i + 1 < len(tiers) else units
+        n = min(units, upper) - above
+        if n <= 0:
+            break
+        for bucket_key, amount in hours_map.items():
+            _add_hours(target, bucket_key, amount * n)
+
+
+def include_keys(feature_rules: Mapping[str, Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Module key -> the feature that switches the module on: an on/off rule without
+    `requires` that other rules of the module require. A module without one (only
+    standalone rules, such as counts) is never switched off as a whole.
+    """
+    required = {(rule["module"], rule["requires"]) for rule in feature_rules.values() if rule.get("requires")}
+    include_by_module: Dict[str, str] = {}
+    for feature_name, rule in feature_rules.items():
+        if not rule.get("requires") and not is_count(rule) and (rule["module"], feature_name) in required:
+            include_by_module.setdefault(rule["module"], feature_name)
+    return include_by_module
+
+
+def module_buckets(
+    feature_rules: Mapping[str, Dict[str, Any]],
+    justifications: Mapping[str, str],
+    module_labels: Mapping[str, str],
+    value_of: Callable[[str], Any],
+) -> Dict[str, Dict[str, float]]:
+    """`value_of(name)` is a flag's on/off state or a count's number of units."""
+    per_module_buckets: Dict[str, Dict[str, float]] = {
+        module_key: {k: 0.0 for k in justifications.keys()} for module_key in module_labels.keys()
+    }
+
+    # Apply hour rules
+    for feature_name, rule in feature_rules.items():
+        value = value_of(feature_name)
+        if not value:
+            continue
+
+        requires = rule.get("requires")
+        if requires and not value_of(requires):
+            continue
+
+        module_key = rule["module"]
+        if is_count(rule):
+            _add_count_hours(per_module_buckets[module_key], rule, int(value))
+            continue
+        hours_map: Dict[str, float] = rule.get("hours", {})
+        for bucket_key, amount in hours_map.items():
+            _add_hours(per_module_buckets[module_key], bucket_key, amount)
+
+    for module_key, include_key in include_keys(feature_rules).items():
+        if not value_of(include_key):
+            per_module_buckets[module_key] = {k: 0.0 for k in justifications.keys()}
+
+    return per_module_buckets
+
+
+def evaluate_reference(
+    feature_rules: Mapping[str, Dict[str, Any]],
+    justifications: Mapping[str, str],
+    module_labels: Mapping[str, str],
+    value_of: Callable[[str], Any],
+) -> Dict[str, Any]:
+    """Straightforward rule walk; the compiled tables are built from (and checked against) this."""
+    per_module_buckets = module_buckets(feature_rules, justifications, module_labels, value_of)
+
+    # Totals per module
+    module_totals: Dict[str, int] = {
+        module_key: int(sum(per_module_buckets[module_key].values()))
+        for module_key in module_labels.keys()
+    }
+
+    # Overall total
+    total_hours = int(sum(module_totals.values()))
+
+    # Overall scope breakdown (by bucket across all modules)
+    overall_justifications = []
+    for bucket_key in justifications.keys():
+        hours = int(sum(per_module_buckets[m].get(bucket_key, 0) for m in module_labels.keys()))
+        if hours > 0:
+            overall_justifications.append(
+                {"key": bucket_key, "label": justifications[bucket_key], "hours": hours}
+            )
+
+    result: Dict[str, Any] = {}
+    for module_key in score_order(module_labels):
+        result[f"{module_key}_score"] = module_totals[module_key]
+        result[f"{module_key}_classification"] = ""
+    result["total_hours"] = total_hours
+    result["reasons"] = []
+
+    result["module_breakdowns"] = {
+        module_key: {
+            "key": module_key,
+            "label": module_labels[module_key],
+            "total_hours": int(sum(per_module_buckets[module_key].values())),
+            "items": [
+                {
+                    "key": bucket_key,
+                    "label": justifications[bucket_key],
+                    "hours": int(per_module_buckets[module_key].get(bucket_key, 0)),
+                }
+                for bucket_key in justifications.keys()
+                if per_module_buckets[module_key].get(bucket_key, 0) and per_module_buckets[module_key].get(bucket_key, 0) > 0
+            ],
+        }
+        for module_key in module_labels.keys()
+    }
+
+    result["justifications"] = overall_justifications
+    return result
+
+
+def _number(value: float) -> Any:
+    # Bucket hours are floats; whole numbers serialize as ints ("8", not "8.0").
+    return int(value) if float(value).is_integer() else value
+
+
+class InputOutOfRange(ValueError):
+    """A count outside 0..`max` of its rule (the tables have no rows for it)."""
+
+
+class Quantity:
+    """Where a count sits in the mask: `width` bits from `shift`, holding 0..`max` units."""
+
+    __slots__ = ("name", "shift", "width", "max")
+
+    def __init__(self, name: str, shift: int, maximum: int) -> None:
+        self.name = name
+        self.shift = shift
+        self.width = maximum.bit_length()
+        self.max = maximum
+
+    def value(self, mask: int) -> int:
+        return mask >> self.shift & ((1 << self.width) - 1)
+
+    def place(self, mask: int, units: Any) -> int:
+        if units is None:
+            units = 0
+        try:
+            whole = int(units)
+        except (TypeError, ValueError):
+            whole = None
+        if isinstance(units, bool) or whole is None or whole != units:
+            raise InputOutOfRange(f"{self.name} must be a whole number, got {units!r}")
+        units = whole
+        if not 0 <= units <= self.max:
+            raise InputOutOfRange(f"{self.name} must be between 0 and {self.max}, got {units}")
+        field = ((1 << self.width) - 1) << self.shift
+        return mask & ~field | units << self.shift
+
+
+class ModuleRow:
+    """Precomputed outcome of one on/off combination of a module's flags."""
+
+    __slots__ = ("buckets", "total", "items")
+
+    def __init__(self, buckets: Tuple[float, ...], total: int, items: Tuple[Tuple[str, str, int], ...]) -> None:
+        self.buckets = buckets
+        self.total = total
+        self.items = items
+
+
+class ModuleTable:
+    def __init__(self, key: str, label: str, flags: Tuple[str, ...], global_bits: Tuple[int, ...]) -> None:
+        self.key = key
+        self.label = label
+        self.flags = flags
+        self.global_bits = global_bits
+        self.rows: List[ModuleRow] = []
+
+        # Flags that are adjacent in the global bit order turn the row lookup into a shift and a mask.
+        first = global_bits[0] if global_bits else 0
+        self.contiguous = global_bits == tuple(range(first, first + len(global_bits)))
+        self.shift = first
+        self.width = (1 << len(global_bits)) - 1
+
+    def index(self, mask: int) -> int:
+        if self.contiguous:
+            return (mask >> self.shift) & self.width
+        index = 0
+        for local_bit, global_bit in enumerate(self.global_bits):
+            if mask >> global_bit & 1:
+                index |= 1 << local_bit
+        return index
+
+
+class CompiledRules:
+    """
+    FEATURE_RULES compiled into per-module lookup tables.
+
+    Every feature gets a bit in FEATURE_RULES order, and every count (`"type": "count"`)
+    a field just wide enough for its `max` (6 bits for 0..63 events). A module's hours
+    only depend on its own features and counts, their `requires` flags and its include
+    flag, so each module gets a table with one row per combination of those bits (2^9
+    rows for BRE). Per-unit and tiered count formulas are worked out when the table is
+    built, so evaluating a selection is still one table lookup per module plus the
+    final sums, producing exactly what `evaluate_reference` returns.
+    """
+
+    def __init__(
+        self,
+        feature_rules: Mapping[str, Dict[str, Any]],
+        justifications: Mapping[str, str],
+        module_labels: Mapping[str, str],
+        feature_labels: Optional[Mapping[str, str]] = None,
+        module_groups: Optional[Mapping[str, Sequence[str]]] = None,
+    ) -> None:
+        self.feature_rules = feature_rules
+        self.justifications = justifications
+        self.module_labels = module_labels
+
+        # Changes whenever anything that affects a result or a report changes (hours, gating,
+        # labels, order). Feature labels and module groups only show up in reports and PDFs,
+        # but those are cached per version too, so they count.
+        self.version = hashlib.sha256(
+            json.dumps(
+                [feature_rules, justifications, module_labels, feature_labels or {}, module_groups or {}],
+                sort_keys=False,
+            ).encode("utf-8")
+        ).hexdigest()[:16]
+
+        self.feature_order: Tuple[str, ...] = tuple(feature_rules.keys())
+        # On/off features -> their bit; counts -> their field.
+        self.bits: Dict[str, int] = {}
+        self.quantities: Dict[str, Quantity] = {}
+        # Every input -> the mask bits it occupies, and per bit the feature it is (None inside a count).
+        self.input_bits: Dict[str, Tuple[int, ...]] = {}
+        bit_names: List[Optional[str]] = []
+        for name in self.feature_order:
+            rule = feature_rules[name]
+            if is_count(rule):
+                maximum = rule.get("max")
+                if isinstance(maximum, bool) or not isinstance(maximum, int) or maximum < 1:
+                    raise ValueError(f"Count {name!r} needs a whole-number max of at least 1")
+                quantity = Quantity(name, len(bit_names), maximum)
+                self.quantities[name] = quantity
+                self.input_bits[name] = tuple(range(quantity.shift, quantity.shift + quantity.width))
+                bit_names.extend([None] * quantity.width)
+            else:
+                self.bits[name] = len(bit_names)
+                self.input_bits[name] = (len(bit_names),)
+                bit_names.append(name)
+        self.bit_names: Tuple[Optional[str], ...] = tuple(bit_names)
+        self.mask_bits = len(bit_names)
+        # Identifies the bit order, so a quote code from a different feature list is rejected
+        # instead of silently decoding to the wrong features. (Flag-only lists keep their old layout.)
+        layout_lines = [
+            f"{name}:{self.quantities[name].width}" if name in self.quantities else name for name in self.feature_order
+        ]
+        self.layout = hashlib.sha256("\n".join(layout_lines).encode("utf-8")).hexdigest()[:6]
+        # Features are only ever appended, so a code from an earlier, shorter feature list still
+        # decodes: its layout is a prefix of ours and its bits keep their positions.
+        self._prefix_layouts: Dict[str, int] = {}
+        prefix_bits = 0
+        for count, name in enumerate(self.feature_order[:-1], start=1):
+            prefix_bits += len(self.input_bits[name])
+            self._prefix_layouts[hashlib.sha256("\n".join(layout_lines[:count]).encode("utf-8")).hexdigest()[:6]] = prefix_bits
+        self.bucket_keys: Tuple[str, ...] = tuple(justifications.keys())
+        self.include_by_module = include_keys(feature_rules)
+
+        for feature_name, rule in feature_rules.items():
+            if rule.get("module") not in module_labels:
+                raise ValueError(f"Rule {feature_name!r} references unknown module {rule.get('module')!r}")
+            requires = rule.get("requires")
+            if requires and requires not in self.bits:
+                raise ValueError(f"Rule {feature_name!r} requires unknown feature {requires!r}")
+
+        self.modules: Tuple[ModuleTable, ...] = tuple(self._compile_module(m) for m in module_labels.keys())
+        position = {m.key: i for i, m in enumerate(self.modules)}
+        # Per feature bit: the modules whose table reads it, i.e. the only totals a toggle can change.
+        self.dependents: Tuple[Tuple[int, ...], ...] = tuple(
+            tuple(i for i, m in enumerate(self.modules) if bit in m.global_bits) for bit in range(self.mask_bits)
+        )
+        self.score_fields: Tuple[Tuple[int, str, str], ...] = tuple(
+            (position[m], f"{m}_score", f"{m}_classification") for m in score_order(module_labels)
+        )
+        # Top-level keys of evaluate_mask(), in order.
+        self.result_fields: Tuple[str, ...] = tuple(
+            key for _, score_key, classification_key in self.score_fields for key in (score_key, classification_key)
+        ) + ("total_hours", "reasons", "module_breakdowns", "justifications")
+
+    def _module_flags(self, module_key: str) -> Tuple[str, ...]:
+        flags = set()
+        for feature_name, rule in self.feature_rules.items():
+            if rule["module"] != module_key:
+                continue
+            flags.add(feature_name)
+            if rule.get("requires"):
+                flags.add(rule["requires"])
+        include_key = self.include_by_module.get(module_key)
+        if include_key:
+            flags.add(include_key)
+        return tuple(sorted(flags, key=lambda name: self.input_bits[name][0]))
+
+    def _compile_module(self, module_key: str) -> ModuleTable:
+        flags = self._module_flags(module_key)
+        global_bits = tuple(bit for f in flags for bit in self.input_bits[f])
+        if len(global_bits) > MAX_FLAGS_PER_MODULE:
+            raise ValueError(
+                f"Module {module_key!r} depends on {len(global_bits)} bits of flags and counts (max {MAX_FLAGS_PER_MODULE})"
+            )
+
+        table = ModuleTable(module_key, self.module_labels[module_key], flags, global_bits)
+        # Only this module's rules can put hours in its buckets.
+        rules = {name: rule for name, rule in self.feature_rules.items() if rule["module"] == module_key}
+        fields = [(f, len(self.input_bits[f])) for f in flags]
+        # Many combinations come to the same hours (everything with the include off, say); they share one row.
+        shared: Dict[Tuple[float, ...], ModuleRow] = {}
+        for combo in range(1 << len(global_bits)):
+            values: Dict[str, int] = {}
+            offset = 0
+            for f, width in fields:
+                values[f] = combo >> offset & ((1 << width) - 1)
+                offset += width
+            buckets = module_buckets(rules, self.justifications, {module_key: table.label}, values.get)[module_key]
+            key = tuple(buckets.get(k, 0) for k in self.bucket_keys)
+            row = shared.get(key)
+            if row is None:
+                row = shared[key] = ModuleRow(
+                    buckets=key,
+                    total=int(sum(buckets.values())),
+                    items=tuple(
+                        (k, self.justifications[k], int(buckets.get(k, 0)))
+                        for k in self.bucket_keys
+                        if buckets.get(k, 0) and buckets.get(k, 0) > 0
+                    ),
+                )
+            table.rows.append(row)
+        return table
+
+    def mask_of(self, features: Any) -> int:
+        """Raises InputOutOfRange for a count outside 0..max."""
+        mask = 0
+        for name, bit in self.bits.items():
+            if getattr(features, name, False):
+                mask |= 1 << bit
+        for name, quantity in self.quantities.items():
+            mask = quantity.place(mask, getattr(features, name, 0))
+        return mask
+
+    def with_value(self, mask: int, name: str, value: Any) -> int:
+        """`mask` with one input changed: on/off for a feature, units for a count (raises ValueError)."""
+        quantity = self.quantities.get(name)
+        if quantity is not None:
+            return quantity.place(mask, value)
+        bit = self.bits.get(name)
+        if bit is None:
+            raise ValueError(f"Unknown feature {name!r}")
+        return mask | 1 << bit if value else mask & ~(1 << bit)
+
+    def encode_mask(self, mask: int) -> str:
+        """Compact, URL-safe quote code: `<layout>.<mask in hex>`."""
+        return f"{self.layout}.{mask:x}"
+
+    def decode_mask(self, code: str) -> int:
+        layout, sep, digits = (code or "").strip().lower().partition(".")
+        if not sep or not digits:
+            raise ValueError("Quote code must look like '<layout>.<hex mask>'")
+        if layout == self.layout:
+            mask_bits = self.mask_bits
+        elif layout in self._prefix_layouts:
+            mask_bits = self._prefix_layouts[layout]
+        else:
+            raise ValueError("Quote code was created for a different feature list")
+        try:
+            mask = int(digits, 16)
+        except ValueError:
+            raise ValueError("Quote code mask is not hexadecimal") from None
+        if mask < 0 or mask >> mask_bits:
+            raise ValueError("Quote code sets unknown features")
+        for quantity in self.quantities.values():
+            if quantity.value(mask) > quantity.max:
+                raise ValueError(f"Quote code sets {quantity.name} above {quantity.max}")
+        return mask
+
+    def flags_of(self, mask: int) -> Dict[str, Any]:
+        """Every input's value: on/off for features, units for counts."""
+        return {
+            name: self.quantities[name].value(mask) if name in self.quantities else bool(mask >> self.bits[name] & 1)
+            for name in self.feature_order
+        }
+
+    def rows_for(self, mask: int) -> List[ModuleRow]:
+        return [m.rows[m.index(mask)] for m in self.modules]
+
+    def evaluate_mask(self, mask: int) -> Dict[str, Any]:
+        rows = self.rows_for(mask)
+
+        result: Dict[str, Any] = {}
+        for i, score_key, classification_key in self.score_fields:
+            result[score_key] = rows[i].total
+            result[classification_key] = ""
+        result["total_hours"] = int(sum(row.total for row in rows))
+        result["reasons"] = []
+
+        result["module_breakdowns"] = {m.key: self.breakdown(m, row) for m, row in zip(self.modules, rows)}
+        result["justifications"] = self.overall_justifications(rows)
+        return result
+
+    @staticmethod
+    def breakdown(module: ModuleTable, row: ModuleRow) -> Dict[str, Any]:
+        return {
+            "key": module.key,
+            "label": module.label,
+            "total_hours": row.total,
+            "items": [{"key": k, "label": label, "hours": hours} for k, label, hours in row.items],
+        }
+
+    def overall_justifications(self, rows: Sequence[ModuleRow]) -> List[Dict[str, Any]]:
+        overall = []
+        for i, bucket_key in enumerate(self.bucket_keys):
+            hours = int(sum(row.buckets[i] for row in rows))
+            if hours > 0:
+                overall.append({"key": bucket_key, "label": self.justifications[bucket_key], "hours": hours})
+        return overall
+
+    def deltas(self, mask: int) -> Dict[str, Any]:
+        """
+        What toggling each feature would do to the module totals and the overall total.
+        For a count, the change is for one more unit (none at its max), and the entry
+        carries its current `value` and `max`.
+
+        Only the modules that read a feature's bits are looked up again, so this is
+        about one table lookup per feature rather than a full evaluation each.
+        `requires` gating comes from the tables: a sub-feature whose include flag is
+        off has a delta of 0 and names the flag it is waiting on.
+        """
+        totals = [m.rows[m.index(mask)].total for m in self.modules]
+        features: Dict[str, Any] = {}
+        for name in self.feature_order:
+            quantity = self.quantities.get(name)
+            if quantity is None:
+                bit = self.bits[name]
+                toggled = mask ^ (1 << bit)
+                entry: Dict[str, Any] = {"selected": bool(mask >> bit & 1)}
+            else:
+                units = quantity.value(mask)
+                toggled = quantity.place(mask, units + 1) if units < quantity.max else mask
+                entry = {"value": units, "max": quantity.max}
+            modules: Dict[str, int] = {}
+            change = 0
+            for i in sorted({i for bit in self.input_bits[name] for i in self.dependents[bit]}):
+                m = self.modules[i]
+                delta = m.rows[m.index(toggled)].total - totals[i]
+                if delta:
+                    modules[m.key] = delta
+                    change += delta
+            entry.update(delta=change, modules=modules)
+            requires = self.feature_rules[name].get("requires")
+            if requires and not mask >> self.bits[requires] & 1:
+                entry["requires"] = requires
+            features[name] = entry
+        return {"total_hours": int(sum(totals)), "features": features}
+
+    def totals(self, mask: int) -> Dict[str, Any]:
+        """Hours per module and overall: the `totals` view of /calculate."""
+        rows = self.rows_for(mask)
+        return {
+            "total_hours": int(sum(row.total for row in rows)),
+            "modules": {m.key: row.total for m, row in zip(self.modules, rows)},
+        }
+
+    def compact(self, mask: int) -> Dict[str, Any]:
+        """
+        The `compact` view of /calculate: module totals and each module's hours per
+        justification bucket as plain arrays, in the order given by `dictionary()`.
+        Everything in the full result can be rebuilt from these two.
+        """
+        rows = self.rows_for(mask)
+        return {
+            "rules_version": self.version,
+            "total_hours": int(sum(row.total for row in rows)),
+            "modules": [row.total for row in rows],
+            "buckets": [[_number(b) for b in row.buckets] for row in rows],
+        }
+
+    def dictionary(self) -> Dict[str, Any]:
+        """Labels and ordering for the `compact` view; changes only with the rules version."""
+        return {
+            "rules_version": self.version,
+            "modules": [{"key": m.key, "label": m.label} for m in self.modules],
+            "buckets": [{"key": k, "label": self.justifications[k]} for k in self.bucket_keys],
+            "scores": [self.modules[i].key for i, _, _ in self.score_fields],
+            "counts": {name: q.max for name, q in self.quantities.items()},
+        }
+
+    def evaluate(self, features: Any) -> Dict[str, Any]:
+        return self.evaluate_mask(self.mask_of(features))
+
+    def mismatches(self, extra_masks: Optional[List[int]] = None) -> List[int]:
+        """
+        Masks for which the tables disagree with `evaluate_reference`: every combination
+        of every module's flags (others off), plus `extra_masks`. Empty means equivalent.
+        """
+        masks = {0, *(extra_masks or [])}
+        for m in self.modules:
+            for combo in product((0, 1), repeat=len(m.global_bits)):
+                masks.add(sum(1 << bit for on, bit in zip(combo, m.global_bits) if on))
+
+        bad = []
+        for mask in sorted(masks):
+            values = self.flags_of(mask)
+            reference = evaluate_reference(
+                self.feature_rules,
+                self.justifications,
+                self.module_labels,
+                lambda name: values.get(name, False),
+            )
+            if json.dumps(reference) != json.dumps(self.evaluate_mask(mask)):
+                bad.append(mask)
+        return bad
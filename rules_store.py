@@ -0,0 +1,235 @@
+import json
+import math
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pdf_cache import content_key
+from response_cache import render_json
+from rules_engine import CompiledRules, is_count
+
+
+# "flag" (the default) is on/off; "count" takes 0..max units with per-unit or tiered hours.
+RULE_TYPES = ("flag", "count")
+
+
+class RulesError(ValueError):
+    """The rules file is missing, unreadable or fails validation."""
+
+
+class RulesBundle:
+    """Serialized rules for client-side quoting, content-hashed for immutable caching."""
+
+    def __init__(self, engine: CompiledRules, feature_labels: Dict[str, str], module_groups: Dict[str, List[str]]) -> None:
+        self.version = engine.version
+        self.body = render_json({
+            "version": engine.version,
+            "layout": engine.layout,
+            "features": list(engine.feature_order),
+            "rules": engine.feature_rules,
+            "justifications": engine.justifications,
+            "modules": engine.module_labels,
+            "include_by_module": engine.include_by_module,
+            "score_order": [score_key[: -len("_score")] for _, score_key, _ in engine.score_fields],
+            "feature_labels": feature_labels,
+            "module_groups": module_groups,
+        })
+        self.hash = content_key(self.body.decode("utf-8"))[:16]
+        self.etag = f'"{self.hash}"'
+
+
+class RuleSet:
+    """
+    One immutable, fully compiled generation of the rules.
+
+    Request handlers read `RulesStore.current` once and use that object throughout,
+    so a reload in the middle of a request can never mix two versions.
+    """
+
+    def __init__(
+        self,
+        engine: CompiledRules,
+        feature_labels: Dict[str, str],
+        module_groups: Dict[str, List[str]],
+        source: Optional[str] = None,
+    ) -> None:
+        self.engine = engine
+        self.version = engine.version
+        self.feature_labels = feature_labels
+        self.module_groups = module_groups
+        self.bundle = RulesBundle(engine, feature_labels, module_groups)
+        self.source = source
+
+
+def _require_mapping(value: Any, where: str) -> Dict[str, Any]:
+    if not isinstance(value, dict):
+        raise RulesError(f"{where} must be an object")
+    return value
+
+
+def _require_labels(value: Any, where: str) -> Dict[str, str]:
+    labels = _require_mapping(value, where)
+    for key, label in labels.items():
+        if not isinstance(label, str) or not label.strip():
+            raise RulesError(f"{where}.{key} must be a non-empty string")
+    return labels
+
+
+def _check_hours(hours_map: Any, where: str, justifications: Dict[str, str]) -> None:
+    for bucket, hours in _require_mapping(hours_map, where).items():
+        if bucket not in justifications:
+            raise RulesError(f"{where}: unknown justification {bucket!r}")
+        if isinstance(hours, bool) or not isinstance(hours, (int, float)) or not math.isfinite(hours) or hours < 0:
+            raise RulesError(f"{where}.{bucket}: must be a non-negative number")
+
+
+def _check_count(rule: Dict[str, Any], where: str, justifications: Dict[str, str]) -> None:
+    maximum = rule.get("max")
+    if isinstance(maximum, bool) or not isinstance(maximum, int) or maximum < 1:
+        raise RulesError(f"{where}.max: must be a whole number of at least 1")
+    tiers = rule.get("tiers", [])
+    if not isinstance(tiers, list):
+        raise RulesError(f"{where}.tiers must be a list")
+    previous = 0
+    for i, tier in enumerate(tiers):
+        tier = _require_mapping(tier, f"{where}.tiers[{i}]")
+        above = tier.get("above")
+        if isinstance(above, bool) or not isinstance(above, int) or not previous < above < maximum:
+            raise RulesError(f"{where}.tiers[{i}].above: must be a whole number above the previous tier's and below max")
+        _check_hours(tier.get("hours", {}), f"{where}.tiers[{i}].hours", justifications)
+        previous = above
+
+
+def parse_rules(doc: Any, known_features: Iterable[str], source: Optional[str] = None) -> RuleSet:
+    """Validates a rules document and compiles it into a RuleSet (raises RulesError)."""
+    known = set(known_features)
+    doc = _require_mapping(doc, "rules file")
+
+    justifications = _require_labels(doc.get("justifications"), "justifications")
+    module_labels = _require_labels(doc.get("modules"), "modules")
+    feature_rules = _require_mapping(doc.get("rules"), "rules")
+    feature_labels = _require_labels(doc.get("feature_labels", {}), "feature_labels")
+    module_groups = _require_mapping(doc.get("module_groups", {}), "module_groups")
+
+    if not justifications or not module_labels or not feature_rules:
+        raise RulesError("justifications, modules and rules must not be empty")
+
+    for name, rule in feature_rules.items():
+        where = f"rules.{name}"
+        if name not in known:
+            raise RulesError(f"{where}: not a known feature (the request model has no such field)")
+        rule = _require_mapping(rule, where)
+        if rule.get("module") not in module_labels:
+            raise RulesError(f"{where}: unknown module {rule.get('module')!r}")
+        requires = rule.get("requires")
+        if requires is not None and requires not in feature_rules:
+            raise RulesError(f"{where}: requires unknown feature {requires!r}")
+        if requires is not None and is_count(feature_rules[requires]):
+            raise RulesError(f"{where}: requires {requires!r}, which is a count, not an on/off feature")
+        _check_hours(rule.get("hours", {}), f"{where}.hours", justifications)
+        if rule.get("type", "flag") not in RULE_TYPES:
+            raise RulesError(f"{where}.type: must be one of {', '.join(RULE_TYPES)}")
+        if is_count(rule):
+            _check_count(rule, where, justifications)
+        elif "max" in rule or "tiers" in rule:
+            raise RulesError(f"{where}: max and tiers only apply to \"type\": \"count\" rules")
+
+    for group, members in module_groups.items():
+        if not isinstance(members, list) or not all(isinstance(m, str) for m in members):
+            raise RulesError(f"module_groups.{group} must be a list of feature names")
+        unknown = [m for m in members if m not in known]
+        if unknown:
+            raise RulesError(f"module_groups.{group}: unknown features {unknown}")
+
+    try:
+        engine = CompiledRules(feature_rules, justifications, module_labels, feature_labels, module_groups)
+    except ValueError as e:
+        raise RulesError(str(e)) from None
+    return RuleSet(engine, feature_labels, module_groups, source)
+
+
+def load_rules(path: str, known_features: Iterable[str]) -> RuleSet:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+    except OSError as e:
+        raise RulesError(f"Cannot read rules file {path}: {e}") from None
+    except ValueError as e:
+        raise RulesError(f"Rules file {path} is not valid JSON: {e}") from None
+    return parse_rules(doc, known_features, path)
+
+
+class RulesStore:
+    """
+    Holds the live RuleSet and swaps in a new one when the rules file changes.
+
+    A watcher thread polls the file's mtime/size; a change is parsed, validated and
+    compiled on that thread, and only a RuleSet that compiled cleanly replaces
+    `current` (a single reference assignment, so readers never take a lock). A bad
+    edit is reported through `last_error` and the previous rules stay live.
+    """
+
+    def __init__(self, path: str, known_features: Iterable[str], poll_interval: float = 2.0) -> None:
+        self.path = path
+        self.known_features = tuple(known_features)
+        self.poll_interval = float(poll_interval)
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+
+        self._signature = self._stat()
+        self.current: RuleSet = load_rules(path, self.known_features)
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def start(self) -> None:
+        if self._thread is not None or self.poll_interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="rules-watcher", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            signature = self._stat()
+            if signature is None or signature == self._signature:
+                continue
+            self._signature = signature
+            self.reload()
+
+    def reload(self) -> bool:
+        """Loads the file now; returns True if a new version went live."""
+        try:
+            rules = load_rules(self.path, self.known_features)
+        except RulesError as e:
+            self.last_error = str(e)
+            return False
+        self.last_error = None
+        if rules.version == self.current.version and rules.bundle.hash == self.current.bundle.hash:
+            return False
+        self.current = rules
+        self.reloads += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        current = self.current
+        return {
+            "version": current.version,
+            "bundle": current.bundle.hash,
+            "source": current.source,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+        }
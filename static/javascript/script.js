@@ -8,6 +8,15 @@ const getValue = (id) => {
     return el ? el.value : '';
 };
 
+// A count input as a whole number within its min/max (0 when empty or invalid).
+const getCount = (id) => {
+    const el = document.getElementById(id);
+    const n = el ? Math.trunc(Number(el.value)) : 0;
+    if (!Number.isFinite(n) || n < 0) return 0;
+    const max = el.max === '' ? n : Number(el.max);
+    return Math.min(n, max);
+};
+
 function buildProjectData() {
     return {
         bre_include: isChecked('bre_include'),
@@ -31,6 +40,7 @@ function buildProjectData() {
         CEUs: isChecked('CEUs'),
         sponsor_branding: isChecked('sponsor_branding'),
         leads: isChecked('leads'),
+        wayfinding: isChecked('wayfinding'),
 
         complex_workflows: isChecked('complex_workflows'),
         multiple_review_rounds: isChecked('multiple_review_rounds'),
@@ -49,6 +59,13 @@ function buildProjectData() {
         logic_based_badges: isChecked('logic_based_badges'),
         multi_badge_types: isChecked('multi_badge_types'),
         customer_hardware: isChecked('customer_hardware'),
+
+        SSO: isChecked('SSO'),
+        integration_count: getCount('integration_count'),
+
+        event_count: getCount('event_count'),
+        poc_count: getCount('poc_count'),
+        recurring_call_weeks: getCount('recurring_call_weeks'),
     };
 }
 
@@ -106,11 +123,7 @@ async function openServerPdf() {
 
     let objectUrl = '';
     try {
-        const response = await fetch('pdf', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(payload),
-        });
+        const response = await postQuote('pdf', payload);
 
         if (!response.ok) {
             let detail = '';
@@ -156,92 +169,312 @@ async function openServerPdf() {
     }
 }
 
-async function updateClassification() {
-    const projectData = buildProjectData();
+// Rules published by the server (/rules); when loaded, quotes are computed in the browser.
+let rulesBundle = null;
 
+async function loadRules() {
     try {
-        const response = await fetch('calculate', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(projectData),
+        const response = await fetch('rules');
+        if (!response.ok) throw new Error(`Rules unavailable (${response.status})`);
+        rulesBundle = await response.json();
+        syncCountLimits(Object.fromEntries(
+            Object.entries(rulesBundle.rules).filter(([, rule]) => rule.type === 'count').map(([name, rule]) => [name, rule.max])
+        ));
+    } catch (error) {
+        console.error('Error:', error);
+        rulesBundle = null;
+    }
+    return rulesBundle;
+}
+
+// Count inputs take their limits from the rules (each count rule's max), never from the page.
+function syncCountLimits(counts) {
+    Object.entries(counts || {}).forEach(([name, max]) => {
+        const el = document.getElementById(name);
+        if (el) el.max = max;
+    });
+}
+
+// Per-unit hours, replaced by each tier's hours for the units above it (see rules_engine.brackets).
+function addCountHours(target, rule, units) {
+    const tiers = [{ above: 0, hours: rule.hours || {} }, ...(rule.tiers || [])];
+    for (let i = 0; i < tiers.length; i++) {
+        const upper = i + 1 < tiers.length ? tiers[i + 1].above : units;
+        const n = Math.min(units, upper) - tiers[i].above;
+        if (n <= 0) break;
+        Object.entries(tiers[i].hours || {}).forEach(([key, amount]) => {
+            if (!amount) return;
+            target[key] = (target[key] || 0) + amount * n;
         });
+    }
+}
 
-        if (!response.ok) throw new Error('Network response was not ok');
-        const result = await response.json();
-
-        const reasonsContainer = document.getElementById('reasons-container');
-        const reasonsList = document.getElementById('reasons-list');
-        if (reasonsList) reasonsList.innerHTML = '';
-
-        const moduleBreakdowns = result.module_breakdowns || null;
-
-        if (moduleBreakdowns && typeof moduleBreakdowns === 'object') {
-            const entries = Object.values(moduleBreakdowns)
-                .filter(m => m && m.total_hours && m.total_hours > 0);
-
-            if (entries.length > 0) {
-                reasonsContainer.style.display = 'block';
-
-                entries.forEach(m => {
-                    const headerLi = document.createElement('li');
-                    headerLi.innerHTML = `<strong>${m.label}</strong> — ${m.total_hours} hour${m.total_hours === 1 ? '' : 's'}`;
-                    reasonsList.appendChild(headerLi);
-
-                    if (Array.isArray(m.items) && m.items.length > 0) {
-                        m.items.forEach(item => {
-                            if (!item || !item.hours || item.hours <= 0) return;
-                            const li = document.createElement('li');
-                            li.textContent = `${item.label}: ${item.hours} hour${item.hours === 1 ? '' : 's'}`;
-                            li.classList.add('sub-item');
-                            reasonsList.appendChild(li);
-                        });
-                    }
-                });
-            } else {
-                reasonsContainer.style.display = 'none';
-            }
-        } else if (result.justifications && Array.isArray(result.justifications) && result.justifications.length > 0) {
-            reasonsContainer.style.display = 'block';
-            result.justifications.forEach(item => {
-                const li = document.createElement('li');
-                li.textContent = `${item.label}: ${item.hours} hour${item.hours === 1 ? '' : 's'}`;
-                reasonsList.appendChild(li);
+// Mirrors the server's rule evaluation so each checkbox change needs no round trip.
+function computeLocally(bundle, data) {
+    const bucketKeys = Object.keys(bundle.justifications);
+    const moduleKeys = Object.keys(bundle.modules);
+    const zeroBuckets = () => Object.fromEntries(bucketKeys.map(k => [k, 0]));
+
+    const buckets = Object.fromEntries(moduleKeys.map(m => [m, zeroBuckets()]));
+    bundle.features.forEach(name => {
+        const rule = bundle.rules[name];
+        if (!data[name]) return;
+        if (rule.requires && !data[rule.requires]) return;
+        if (rule.type === 'count') {
+            addCountHours(buckets[rule.module], rule, data[name]);
+            return;
+        }
+        Object.entries(rule.hours || {}).forEach(([key, amount]) => {
+            if (!amount) return;
+            buckets[rule.module][key] = (buckets[rule.module][key] || 0) + amount;
+        });
+    });
+    Object.entries(bundle.include_by_module).forEach(([moduleKey, includeKey]) => {
+        if (!data[includeKey]) buckets[moduleKey] = zeroBuckets();
+    });
+
+    const sum = values => values.reduce((a, b) => a + b, 0);
+    const result = {};
+    const moduleTotals = {};
+    moduleKeys.forEach(m => { moduleTotals[m] = Math.trunc(sum(Object.values(buckets[m]))); });
+    bundle.score_order.forEach(m => {
+        result[`${m}_score`] = moduleTotals[m];
+        result[`${m}_classification`] = '';
+    });
+    result.total_hours = sum(Object.values(moduleTotals));
+    result.reasons = [];
+    result.module_breakdowns = Object.fromEntries(moduleKeys.map(m => [m, {
+        key: m,
+        label: bundle.modules[m],
+        total_hours: moduleTotals[m],
+        items: bucketKeys
+            .filter(k => buckets[m][k] > 0)
+            .map(k => ({ key: k, label: bundle.justifications[k], hours: Math.trunc(buckets[m][k]) })),
+    }]));
+    result.justifications = bucketKeys
+        .map(k => ({ key: k, label: bundle.justifications[k], hours: Math.trunc(sum(moduleKeys.map(m => buckets[m][k] || 0))) }))
+        .filter(j => j.hours > 0);
+    return result;
+}
+
+// Labels and array order for compact /calculate results (/calculate/dictionary), one per rules version.
+let calculateDictionary = null;
+
+async function loadDictionary(version) {
+    if (calculateDictionary && calculateDictionary.rules_version === version) return calculateDictionary;
+    const response = await fetch(`calculate/dictionary/${encodeURIComponent(version)}`);
+    if (!response.ok) throw new Error(`Dictionary unavailable (${response.status})`);
+    calculateDictionary = await response.json();
+    syncCountLimits(calculateDictionary.counts);
+    return calculateDictionary;
+}
+
+// Rebuilds the full /calculate result from a view=compact one and its dictionary.
+function expandCompact(dictionary, compact) {
+    const result = {};
+    const totals = Object.fromEntries(dictionary.modules.map((m, i) => [m.key, compact.modules[i]]));
+    dictionary.scores.forEach(m => {
+        result[`${m}_score`] = totals[m];
+        result[`${m}_classification`] = '';
+    });
+    result.total_hours = compact.total_hours;
+    result.reasons = [];
+    result.module_breakdowns = Object.fromEntries(dictionary.modules.map((m, i) => [m.key, {
+        key: m.key,
+        label: m.label,
+        total_hours: compact.modules[i],
+        items: dictionary.buckets
+            .map((b, j) => ({ key: b.key, label: b.label, hours: compact.buckets[i][j] }))
+            .filter(item => item.hours > 0)
+            .map(item => ({ ...item, hours: Math.trunc(item.hours) })),
+    }]));
+    result.justifications = dictionary.buckets
+        .map((b, j) => ({ key: b.key, label: b.label, hours: Math.trunc(compact.buckets.reduce((a, row) => a + row[j], 0)) }))
+        .filter(j => j.hours > 0);
+    return result;
+}
+
+// POSTs a quote request tagged with the rules version used for the on-screen result.
+// If the server's rules have moved on (409), reload them, refresh the result and retry once.
+async function postQuote(url, payload) {
+    const send = () => fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(rulesBundle ? { ...payload, rules_version: rulesBundle.version } : payload),
+    });
+
+    let response = await send();
+    if (response.status === 409 && rulesBundle) {
+        await loadRules();
+        await updateClassification();
+        response = await send();
+    }
+    return response;
+}
+
+// Without the rules bundle, quotes come from the /ws/quote channel: only toggles are sent,
+// and the server answers with sequence-numbered updates holding just what changed.
+// If the channel cannot be opened at all, each change falls back to POST /calculate.
+let quoteSocket = null;
+let quoteSocketReady = false;
+let quoteSocketUnavailable = false;
+let quoteSocketSent = 0;
+let quoteSocketState = {};
+let liveResult = null;
+
+function openQuoteSocket() {
+    if (quoteSocket || quoteSocketUnavailable || !('WebSocket' in window)) return;
+    const url = new URL('ws/quote', window.location.href);
+    url.protocol = url.protocol === 'https:' ? 'wss:' : 'ws:';
+    const socket = new WebSocket(url);
+    quoteSocket = socket;
+
+    socket.addEventListener('open', () => {
+        quoteSocketReady = true;
+        quoteSocketSent = 0;
+        quoteSocketState = {};
+        sendToggles(buildProjectData());
+    });
+    socket.addEventListener('message', event => {
+        const message = JSON.parse(event.data);
+        if (message.error) console.error('Error:', message.error);
+        if (message.full) {
+            liveResult = message.result;
+        } else if (liveResult) {
+            liveResult = {
+                ...liveResult,
+                ...message.result,
+                module_breakdowns: { ...liveResult.module_breakdowns, ...(message.result.module_breakdowns || {}) },
+            };
+        }
+        // An update for fewer messages than were sent is already stale; the next one follows.
+        if (liveResult && message.seq === quoteSocketSent) renderResult(liveResult);
+    });
+    socket.addEventListener('close', () => {
+        if (!quoteSocketReady) quoteSocketUnavailable = true;
+        quoteSocket = null;
+        quoteSocketReady = false;
+        liveResult = null;
+    });
+}
+
+// Sends the inputs that changed since the last message; false if nothing changed.
+function sendToggles(projectData) {
+    const previous = (name, value) => (typeof value === 'number' ? quoteSocketState[name] || 0 : Boolean(quoteSocketState[name]));
+    const toggles = Object.entries(projectData)
+        .filter(([name, value]) => previous(name, value) !== value)
+        .map(([name, value]) => `${name}=${typeof value === 'number' ? value : (value ? 'on' : 'off')}`);
+    if (!toggles.length) return false;
+    quoteSocketState = { ...projectData };
+    quoteSocket.send(toggles.join(','));
+    quoteSocketSent += 1;
+    return true;
+}
+
+async function updateClassification() {
+    const projectData = buildProjectData();
+
+    try {
+        let result;
+        if (rulesBundle) {
+            result = computeLocally(rulesBundle, projectData);
+        } else if (quoteSocketReady) {
+            if (!sendToggles(projectData) && liveResult) renderResult(liveResult);
+            return;
+        } else {
+            // Reconnect for the next change; this one goes over HTTP.
+            openQuoteSocket();
+            const response = await fetch('calculate?view=compact', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(projectData),
             });
-        } else if (result.reasons && result.reasons.length > 0) {
+
+            if (!response.ok) throw new Error('Network response was not ok');
+            const compact = await response.json();
+            result = expandCompact(await loadDictionary(compact.rules_version), compact);
+        }
+
+        renderResult(result);
+    } catch (error) {
+        console.error('Error:', error);
+    }
+}
+
+function renderResult(result) {
+    const reasonsContainer = document.getElementById('reasons-container');
+    const reasonsList = document.getElementById('reasons-list');
+    if (reasonsList) reasonsList.innerHTML = '';
+
+    const moduleBreakdowns = result.module_breakdowns || null;
+
+    if (moduleBreakdowns && typeof moduleBreakdowns === 'object') {
+        const entries = Object.values(moduleBreakdowns)
+            .filter(m => m && m.total_hours && m.total_hours > 0);
+
+        if (entries.length > 0) {
             reasonsContainer.style.display = 'block';
-            result.reasons.forEach(reason => {
-                const li = document.createElement('li');
-                li.textContent = reason;
-                reasonsList.appendChild(li);
+
+            entries.forEach(m => {
+                const headerLi = document.createElement('li');
+                headerLi.innerHTML = `<strong>${m.label}</strong> — ${m.total_hours} hour${m.total_hours === 1 ? '' : 's'}`;
+                reasonsList.appendChild(headerLi);
+
+                if (Array.isArray(m.items) && m.items.length > 0) {
+                    m.items.forEach(item => {
+                        if (!item || !item.hours || item.hours <= 0) return;
+                        const li = document.createElement('li');
+                        li.textContent = `${item.label}: ${item.hours} hour${item.hours === 1 ? '' : 's'}`;
+                        li.classList.add('sub-item');
+                        reasonsList.appendChild(li);
+                    });
+                }
             });
         } else {
             reasonsContainer.style.display = 'none';
         }
+    } else if (result.justifications && Array.isArray(result.justifications) && result.justifications.length > 0) {
+        reasonsContainer.style.display = 'block';
+        result.justifications.forEach(item => {
+            const li = document.createElement('li');
+            li.textContent = `${item.label}: ${item.hours} hour${item.hours === 1 ? '' : 's'}`;
+            reasonsList.appendChild(li);
+        });
+    } else if (result.reasons && result.reasons.length > 0) {
+        reasonsContainer.style.display = 'block';
+        result.reasons.forEach(reason => {
+            const li = document.createElement('li');
+            li.textContent = reason;
+            reasonsList.appendChild(li);
+        });
+    } else {
+        reasonsContainer.style.display = 'none';
+    }
 
-        const updateModuleUI = (prefix, label, hours) => {
-            const classEl = document.getElementById(`${prefix}-classification`);
-            const scoreEl = document.getElementById(`${prefix}-score`);
-
-            if (classEl) classEl.innerText = '';
+    const updateModuleUI = (prefix, label, hours) => {
+        const classEl = document.getElementById(`${prefix}-classification`);
+        const scoreEl = document.getElementById(`${prefix}-score`);
 
-            if (!hours || hours === 0) {
-                scoreEl.innerText = '';
-            } else {
-                scoreEl.innerText = `${label} Hours: ${hours}`;
-            }
-        };
+        if (classEl) classEl.innerText = '';
 
-        updateModuleUI('bre', 'Attendee Registration', result.bre_score);
-        updateModuleUI('app', 'APP and CO', result.app_score);
-        updateModuleUI('abs', 'Abstract', result.abs_score);
-        updateModuleUI('exh', 'Exhibits', result.exh_score);
-        updateModuleUI('appointments', 'Appointments', result.appointments_score);
-        updateModuleUI('kiosk', 'Kiosk / Badges', result.kiosk_score);
+        if (!hours || hours === 0) {
+            scoreEl.innerText = '';
+        } else {
+            scoreEl.innerText = `${label} Hours: ${hours}`;
+        }
+    };
 
-        document.getElementById('total-hours').innerText = `Total PSC Hours: ${result.total_hours}`;
-    } catch (error) {
-        console.error('Error:', error);
-    }
+    updateModuleUI('bre', 'Attendee Registration', result.bre_score);
+    updateModuleUI('app', 'APP and CO', result.app_score);
+    updateModuleUI('abs', 'Abstract', result.abs_score);
+    updateModuleUI('exh', 'Exhibits', result.exh_score);
+    updateModuleUI('appointments', 'Appointments', result.appointments_score);
+    updateModuleUI('kiosk', 'Kiosk / Badges', result.kiosk_score);
+    updateModuleUI('custom', 'Integrations / SSO', result.custom_score);
+    updateModuleUI('events', 'Additional Events', result.events_score);
+    updateModuleUI('pm', 'Project Management', result.pm_score);
+
+    document.getElementById('total-hours').innerText = `Total PSC Hours: ${result.total_hours}`;
 }
 
 function toggleModule(includeCheckboxId, targetContainerId) {
@@ -260,6 +493,24 @@ function toggleModule(includeCheckboxId, targetContainerId) {
     updateClassification();
 }
 
+async function waitForEmailJob(jobId) {
+    // The server delivers in the background; poll until the outbox reports a final state.
+    // Resolves 'sent', or 'unknown' when the server no longer knows the job (it was still accepted).
+    for (let attempt = 0; attempt < 120; attempt++) {
+        await new Promise(resolve => setTimeout(resolve, attempt < 10 ? 500 : 2000));
+
+        const response = await fetch(`email/${encodeURIComponent(jobId)}`);
+        if (response.status === 404) return 'unknown';
+        if (!response.ok) throw new Error(`Email status unavailable (${response.status})`);
+
+        const job = await response.json();
+        if (job.status === 'sent') return 'sent';
+        if (job.status === 'failed') throw new Error(job.error || 'Email failed');
+        if (job.status === 'retrying') setEmailStatus('Mail server busy, retrying…');
+    }
+    throw new Error('Email is still queued; check again later.');
+}
+
 async function emailResults() {
     if (!requireCustomerName()) return;
 
@@ -275,16 +526,14 @@ async function emailResults() {
     };
 
     try {
-        const response = await fetch('email', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(payload),
-        });
+        const response = await postQuote('email', payload);
 
         let detail = '';
+        let jobId = '';
         try {
             const data = await response.json();
             detail = (data && data.detail) ? String(data.detail) : '';
+            jobId = (data && data.job_id) ? String(data.job_id) : '';
         } catch {
             try {
                 detail = await response.text();
@@ -297,6 +546,14 @@ async function emailResults() {
             throw new Error(detail || `Email failed (${response.status})`);
         }
 
+        if (jobId) {
+            setEmailStatus('Email queued…');
+            if (await waitForEmailJob(jobId) === 'unknown') {
+                setEmailStatus('Email queued; delivery status is not available.');
+                return;
+            }
+        }
+
         setEmailStatus('Email sent.');
         setTimeout(() => setEmailStatus(''), 4000);
     } catch (err) {
@@ -311,9 +568,25 @@ async function emailResults() {
 }
 
 document.addEventListener('DOMContentLoaded', () => {
+    loadRules().then(bundle => {
+        if (bundle) {
+            updateClassification();
+            return;
+        }
+        openQuoteSocket();
+        // No bundle: the count limits come from the current dictionary instead.
+        fetch('calculate/dictionary')
+            .then(response => (response.ok ? response.json() : null))
+            .then(dictionary => dictionary && syncCountLimits(dictionary.counts))
+            .catch(error => console.error('Error:', error));
+    });
+
     document.querySelectorAll('input[type="checkbox"]').forEach(checkbox => {
         checkbox.addEventListener('change', updateClassification);
     });
+    document.querySelectorAll('input[type="number"]').forEach(input => {
+        input.addEventListener('input', updateClassification);
+    });
 
     const moduleToggles = [
         { check: 'bre_include', feat: 'bre-features' },
@@ -343,12 +616,13 @@ document.addEventListener('DOMContentLoaded', () => {
 
     document.getElementById('reset-btn').addEventListener('click', () => {
         document.querySelectorAll('input[type="checkbox"]').forEach(box => box.checked = false);
+        document.querySelectorAll('input[type="number"]').forEach(input => input.value = 0);
         document.querySelectorAll('[id$="-features"]').forEach(span => span.style.display = 'none');
 
         document.getElementById('reasons-container').style.display = 'none';
         document.getElementById('reasons-list').innerHTML = '';
 
-        const sections = ['bre', 'app', 'abs', 'exh', 'appointments', 'kiosk'];
+        const sections = ['bre', 'app', 'abs', 'exh', 'appointments', 'kiosk', 'custom', 'events', 'pm'];
         sections.forEach(s => {
             document.getElementById(`${s}-classification`).innerText = s === 'bre' ? "Waiting for selection..." : "";
             document.getElementById(`${s}-score`).innerText = "";
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# The app is a set of flat modules at the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def main_module():
+    """main.py, for endpoint tests; it reads its settings from the deployment's env.py."""
+    pytest.importorskip("env", reason="main.py needs an env.py with the SMTP settings")
+    import main
+
+    return main
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, Overloaded
+
+
+def _controller(capacity: int = 2, **lanes) -> AdmissionController:
+    # lane -> (priority, max_concurrent, max_queue, max_wait)
+    return AdmissionController(capacity, lanes or {"pdf": (0, 2, 4, 5.0), "batch": (2, 1, 4, 5.0)})
+
+
+async def _hold(controller: AdmissionController, lane: str, seconds: float, log: list) -> None:
+    async with controller.slot(lane):
+        log.append(lane)
+        await asyncio.sleep(seconds)
+
+
+def test_lane_cap_leaves_capacity_to_other_lanes():
+    async def scenario():
+        controller = _controller(capacity=3, pdf=(0, 2, 4, 5.0), batch=(2, 1, 4, 5.0))
+        log: list = []
+        tasks = [asyncio.create_task(_hold(controller, "batch", 0.2, log)) for _ in range(2)]
+        tasks.append(asyncio.create_task(_hold(controller, "pdf", 0.2, log)))
+        await asyncio.sleep(0.05)
+        stats = controller.stats()
+        assert stats["batch_active"] == 1 and stats["batch_queued"] == 1  # capped at 1 with a slot free
+        assert stats["pdf_active"] == 1
+        await asyncio.gather(*tasks)
+        assert controller.stats()["active"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_higher_priority_lane_is_served_first():
+    async def scenario():
+        controller = _controller(capacity=1, pdf=(0, 1, 4, 5.0), batch=(2, 1, 4, 5.0))
+        log: list = []
+        holder = asyncio.create_task(_hold(controller, "pdf", 0.1, log))
+        await asyncio.sleep(0.01)
+        batch = asyncio.create_task(_hold(controller, "batch", 0, log))
+        await asyncio.sleep(0.01)
+        pdf = asyncio.create_task(_hold(controller, "pdf", 0, log))
+        await asyncio.gather(holder, batch, pdf)
+        assert log == ["pdf", "pdf", "batch"]
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        controller = _controller(capacity=1, pdf=(0, 1, 1, 5.0))
+        controller.lanes["pdf"].avg_service = 4.0
+        log: list = []
+        holder = asyncio.create_task(_hold(controller, "pdf", 0.1, log))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(_hold(controller, "pdf", 0, log))
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded) as info:
+            await _hold(controller, "pdf", 0, log)
+        await asyncio.gather(holder, queued)
+        return info.value, controller.stats()
+
+    error, stats = asyncio.run(scenario())
+    assert error.lane == "pdf" and error.reason == "queue_full"
+    assert error.retry_after == 8  # 4 s per render x (1 queued + this one) on 1 slot
+    assert stats["pdf_rejected"] == 1 and stats["pdf_admitted"] == 2
+
+
+def test_waiting_too_long_is_rejected_and_leaves_the_queue():
+    async def scenario():
+        controller = _controller(capacity=1, pdf=(0, 1, 4, 0.05))
+        log: list = []
+        holder = asyncio.create_task(_hold(controller, "pdf", 0.3, log))
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded) as info:
+            await _hold(controller, "pdf", 0, log)
+        assert controller.stats()["pdf_queued"] == 0
+        await holder
+        return info.value
+
+    error = asyncio.run(scenario())
+    assert error.reason == "timeout" and 1 <= error.retry_after <= 60
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def scenario():
+        controller = _controller(capacity=1, pdf=(0, 1, 4, 5.0))
+        log: list = []
+        holder = asyncio.create_task(_hold(controller, "pdf", 0.1, log))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(_hold(controller, "pdf", 0, log))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(holder, waiter, return_exceptions=True)
+        stats = controller.stats()
+        assert stats["pdf_queued"] == 0 and stats["active"] == 0
+        await _hold(controller, "pdf", 0, log)  # the slot is still usable
+
+    asyncio.run(scenario())
+
+
+def test_overloaded_is_a_503_with_retry_after(main_module):
+    response = asyncio.run(main_module.overloaded_handler(None, Overloaded("pdf", "queue_full", 9)))
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "9"
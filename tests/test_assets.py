@@ -0,0 +1,57 @@
+"""Content-coding negotiation of `Asset.select`."""
+import gzip
+
+import pytest
+
+from assets import Asset
+
+
+CSS = b"body { margin: 0; padding: 0; }\n" * 200
+
+
+@pytest.fixture
+def asset() -> Asset:
+    asset = Asset("static/style.css", "text/css", CSS)
+    # Built without the optional brotli package here; stand in for its variant.
+    if asset.variants[0][0] != "br":
+        asset.variants.insert(0, ("br", b"br-body", f'"{asset.digest}-br"'))
+    return asset
+
+
+@pytest.mark.parametrize(
+    "header,coding",
+    [
+        (None, "identity"),
+        ("", "identity"),
+        ("gzip, deflate, br", "br"),
+        ("br;q=1.0, gzip;q=0.8", "br"),
+        ("gzip;q=1.0, br;q=0.5", "gzip"),
+        ("br;q=0.2, gzip;q=0.9, identity;q=0.5", "gzip"),
+        ("gzip;q=0.5, br;q=0.5", "br"),
+        ("gzip;q=0.3, identity", "identity"),
+        ("gzip;q=0.001", "gzip"),
+        ("br;q=0, gzip", "gzip"),
+        ("BR;Q=0.4, GZIP;Q=0.6", "gzip"),
+        ("*", "br"),
+        ("*;q=0.5, gzip", "gzip"),
+        ("*;q=0.5, br;q=0.1", "gzip"),
+        ("identity;q=0.9, *;q=0.2", "identity"),
+        ("br;q=0, gzip;q=0, identity;q=0", "identity"),
+        ("gzip;q=oops, deflate", "identity"),
+    ],
+)
+def test_select_picks_the_highest_q(asset, header, coding):
+    assert asset.select(header)[0] == coding
+
+
+def test_variants_decode_to_the_file(asset):
+    coding, body, etag = asset.select("gzip")
+    assert coding == "gzip" and gzip.decompress(body) == CSS
+    assert etag == f'"{asset.digest}-gzip"'
+    assert asset.select("identity") == ("identity", CSS, f'"{asset.digest}"')
+
+
+def test_precompressed_types_are_served_as_is():
+    asset = Asset("static/logo.png", "image/png", b"\x89PNG" + b"\0" * 500)
+    assert [v[0] for v in asset.variants] == ["identity"]
+    assert asset.select("br, gzip")[0] == "identity"
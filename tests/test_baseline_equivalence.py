@@ -0,0 +1,187 @@
+"""
+The compiled rule tables against the original `/calculate` logic.
+
+`baseline_calculate` is the body of `calculate_classification` as it stood before
+the rules were compiled, and tests/data/baseline_rules.json its FEATURE_RULES,
+JUSTIFICATIONS and MODULE_LABELS, so the tables are checked against the code
+they replaced rather than against the engine's own reference walk. The shipped
+rules.json must still give those results for selections of the baseline features
+(new flags off, counts at 0).
+"""
+import json
+import os
+import random
+from itertools import chain, product
+from typing import Any, Callable, Dict
+
+import pytest
+
+from rules_engine import CompiledRules
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules.json")
+
+
+def _add_hours(target: Dict[str, float], key: str, amount: float) -> None:
+    if not amount:
+        return
+    target[key] = float(target.get(key, 0)) + float(amount)
+
+
+def baseline_calculate(rules: Dict[str, Any], value_of: Callable[[str], bool]) -> Dict[str, Any]:
+    JUSTIFICATIONS = rules["justifications"]
+    MODULE_LABELS = rules["modules"]
+    FEATURE_RULES = rules["rules"]
+
+    per_module_buckets: Dict[str, Dict[str, float]] = {
+        module_key: {k: 0.0 for k in JUSTIFICATIONS.keys()} for module_key in MODULE_LABELS.keys()
+    }
+
+    # Apply hour rules
+    for feature_name, rule in FEATURE_RULES.items():
+        if not value_of(feature_name):
+            continue
+
+        requires = rule.get("requires")
+        if requires and not value_of(requires):
+            continue
+
+        module_key = rule["module"]
+        hours_map: Dict[str, float] = rule.get("hours", {})
+        for bucket_key, amount in hours_map.items():
+            _add_hours(per_module_buckets[module_key], bucket_key, amount)
+
+    include_by_module = {
+        "bre": "bre_include",
+        "app": "app_include",
+        "abs": "abs_include",
+        "exh": "exh_include",
+        "appointments": "appointments_include",
+        "kiosk": "kiosk_include",
+    }
+    for module_key, include_key in include_by_module.items():
+        if not value_of(include_key):
+            per_module_buckets[module_key] = {k: 0.0 for k in JUSTIFICATIONS.keys()}
+
+    # Totals per module
+    module_totals: Dict[str, int] = {
+        module_key: int(sum(per_module_buckets[module_key].values()))
+        for module_key in MODULE_LABELS.keys()
+    }
+
+    # Overall total
+    total_hours = int(sum(module_totals.values()))
+
+    # Overall scope breakdown (by bucket across all modules)
+    overall_justifications = []
+    for bucket_key in JUSTIFICATIONS.keys():
+        hours = int(sum(per_module_buckets[m].get(bucket_key, 0) for m in MODULE_LABELS.keys()))
+        if hours > 0:
+            overall_justifications.append(
+                {"key": bucket_key, "label": JUSTIFICATIONS[bucket_key], "hours": hours}
+            )
+
+    return {
+        "bre_score": module_totals["bre"],
+        "bre_classification": "",
+        "app_score": module_totals["app"],
+        "app_classification": "",
+        "abs_score": module_totals["abs"],
+        "abs_classification": "",
+        "exh_score": module_totals["exh"],
+        "exh_classification": "",
+        "appointments_score": module_totals["appointments"],
+        "appointments_classification": "",
+        "kiosk_score": module_totals["kiosk"],
+        "kiosk_classification": "",
+        "total_hours": total_hours,
+        "reasons": [],
+
+        "module_breakdowns": {
+            module_key: {
+                "key": module_key,
+                "label": MODULE_LABELS[module_key],
+                "total_hours": int(sum(per_module_buckets[module_key].values())),
+                "items": [
+                    {
+                        "key": bucket_key,
+                        "label": JUSTIFICATIONS[bucket_key],
+                        "hours": int(per_module_buckets[module_key].get(bucket_key, 0)),
+                    }
+                    for bucket_key in JUSTIFICATIONS.keys()
+                    if per_module_buckets[module_key].get(bucket_key, 0) and per_module_buckets[module_key].get(bucket_key, 0) > 0
+                ],
+            }
+            for module_key in MODULE_LABELS.keys()
+        },
+
+        "justifications": overall_justifications,
+    }
+
+
+@pytest.fixture(scope="module")
+def baseline() -> Dict[str, Any]:
+    with open(os.path.join(DATA_DIR, "baseline_rules.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def engine(baseline) -> CompiledRules:
+    return CompiledRules(baseline["rules"], baseline["justifications"], baseline["modules"])
+
+
+@pytest.fixture(scope="module")
+def current() -> CompiledRules:
+    with open(RULES_PATH, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    return CompiledRules(doc["rules"], doc["justifications"], doc["modules"], doc.get("feature_labels"), doc.get("module_groups"))
+
+
+def _check(engine: CompiledRules, baseline: Dict[str, Any], mask: int) -> None:
+    flags = engine.flags_of(mask)
+    expected = baseline_calculate(baseline, lambda name: flags.get(name, False))
+    # Serialized, so key order (the response body) has to match too.
+    assert json.dumps(engine.evaluate_mask(mask)) == json.dumps(expected), sorted(n for n, on in flags.items() if on)
+
+
+def _module_masks(engine: CompiledRules):
+    # A module's hours depend only on its own flags (its include zeroes only itself), so every
+    # combination of each module's flags, over several settings of the other modules, covers
+    # all 2^n selections.
+    rng = random.Random(4)
+    backgrounds = [0, (1 << engine.mask_bits) - 1] + [rng.getrandbits(engine.mask_bits) for _ in range(3)]
+    for m in engine.modules:
+        module_mask = sum(1 << bit for bit in m.global_bits)
+        for background in backgrounds:
+            for combo in product((0, 1), repeat=len(m.global_bits)):
+                yield background & ~module_mask | sum(1 << bit for on, bit in zip(combo, m.global_bits) if on)
+
+
+def test_every_flag_combination_of_each_module(engine, baseline):
+    for mask in _module_masks(engine):
+        _check(engine, baseline, mask)
+
+
+def test_random_selections(engine, baseline):
+    rng = random.Random(44)
+    for _ in range(2000):
+        _check(engine, baseline, rng.getrandbits(engine.mask_bits))
+
+
+def test_current_rules_keep_the_baseline_hours(engine, baseline, current):
+    added = [m.key for m in current.modules if m.key not in baseline["modules"]]
+    rng = random.Random(25)
+    masks = chain(_module_masks(engine), (rng.getrandbits(engine.mask_bits) for _ in range(2000)))
+    for mask in masks:
+        flags = engine.flags_of(mask)
+        current_mask = 0
+        for name, on in flags.items():
+            current_mask = current.with_value(current_mask, name, on)
+        result = current.evaluate_mask(current_mask)
+        # The modules added since only hold new inputs, so they are empty here.
+        for key in added:
+            assert result.pop(f"{key}_score") == 0 and result.pop(f"{key}_classification") == ""
+            assert result["module_breakdowns"].pop(key)["total_hours"] == 0
+        expected = baseline_calculate(baseline, lambda name: flags.get(name, False))
+        assert json.dumps(result) == json.dumps(expected), sorted(n for n, on in flags.items() if on)
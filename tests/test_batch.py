@@ -0,0 +1,95 @@
+import asyncio
+import csv
+import io
+import json
+import os
+from typing import List
+
+import pytest
+
+from batch import BatchEvaluator
+from rules_engine import CompiledRules
+
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules.json")
+
+
+@pytest.fixture(scope="module")
+def engine() -> CompiledRules:
+    with open(RULES_PATH, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    return CompiledRules(doc["rules"], doc["justifications"], doc["modules"])
+
+
+def _run(engine: CompiledRules, body: str, input_format: str, output_format: str, chunk: int = 7) -> str:
+    async def chunks():
+        data = body.encode("utf-8")
+        for i in range(0, len(data), chunk):  # lines split across chunks
+            yield data[i:i + chunk]
+
+    async def collect() -> bytes:
+        return b"".join([part async for part in BatchEvaluator(engine).stream(chunks(), input_format, output_format)])
+
+    return asyncio.run(collect()).decode("utf-8")
+
+
+def _scores(engine: CompiledRules, features: dict) -> List[str]:
+    mask = 0
+    for name, value in features.items():
+        mask = engine.with_value(mask, name, value)
+    result = engine.evaluate_mask(mask)
+    keys = [key for _, key, _ in engine.score_fields]
+    return [str(result[k]) for k in keys] + [str(result["total_hours"])]
+
+
+def test_csv_rows_match_the_engine(engine):
+    body = "id,bre_include,workflows,field_logic,event_count\nA,1,1,0,9\nB,0,1,1,0\nC,1,0,1,\n"
+    rows = list(csv.reader(io.StringIO(_run(engine, body, "csv", "csv"))))
+    assert rows[0][-1] == "error"
+    assert rows[1] == ["1", "A"] + _scores(engine, {"bre_include": True, "workflows": True, "event_count": 9}) + [""]
+    assert rows[2] == ["2", "B"] + _scores(engine, {"workflows": True, "field_logic": True}) + [""]
+    assert rows[3] == ["3", "C"] + _scores(engine, {"bre_include": True, "field_logic": True}) + [""]
+
+
+@pytest.mark.parametrize(
+    "cells, on",
+    [
+        (("10", ""), ()),  # not two bits of "10"
+        (("11", ""), ()),
+        (("-1", ""), ()),
+        (("yes", "0"), ("bre_include",)),
+        (("1", "x"), ("bre_include", "workflows")),
+        (("0", "1"), ("workflows",)),
+    ],
+)
+def test_csv_cells_other_than_0_and_1_use_the_column_parser(engine, cells, on):
+    # Adjacent bits, so the binary fast path is eligible for these columns.
+    assert engine.bits["workflows"] == engine.bits["bre_include"] + 1
+    body = "bre_include,workflows\n" + ",".join(cells) + "\n"
+    rows = list(csv.reader(io.StringIO(_run(engine, body, "csv", "csv"))))
+    assert rows[1][2:-1] == _scores(engine, {name: True for name in on})
+
+
+def test_csv_error_rows_keep_id_and_message(engine):
+    body = "id,bre_include,event_count\nA,1,2.7\n\"B,x\",1,99\nC,1,3\n"
+    rows = list(csv.reader(io.StringIO(_run(engine, body, "csv", "csv"))))
+    width = len(rows[0])
+    assert all(len(row) == width for row in rows)
+    assert rows[1][:2] == ["1", "A"] and rows[1][2:-1] == [""] * (width - 3) and "whole number" in rows[1][-1]
+    assert rows[2][:2] == ["2", "B,x"] and "between 0 and 63" in rows[2][-1]
+    assert rows[3][-1] == ""
+
+
+def test_ndjson_rows_and_errors(engine):
+    body = "\n".join([
+        json.dumps({"id": 1, "features": {"bre_include": True, "workflows": "yes"}}),
+        json.dumps({"id": "b", "event_count": 99}),
+        "not json",
+        json.dumps({"poc_count": 2}),
+    ]) + "\n"
+    out = [json.loads(line) for line in _run(engine, body, "ndjson", "ndjson").splitlines()]
+    assert out[0]["row"] == 1 and out[0]["id"] == 1
+    assert out[0]["total_hours"] == int(_scores(engine, {"bre_include": True, "workflows": True})[-1])
+    assert out[1]["row"] == 2 and out[1]["id"] == "b" and "between 0 and 63" in out[1]["error"]
+    assert out[2]["row"] == 3 and "id" not in out[2] and out[2]["error"]
+    assert out[3] == {"row": 4, **dict(zip([k for _, k, _ in engine.score_fields] + ["total_hours"], map(int, _scores(engine, {"poc_count": 2}))))}
@@ -0,0 +1,76 @@
+"""`CompiledRules.deltas` against evaluating the toggled selection from scratch."""
+import json
+import os
+import random
+
+import pytest
+
+from rules_engine import CompiledRules
+
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules.json")
+
+
+@pytest.fixture(scope="module")
+def engine() -> CompiledRules:
+    with open(RULES_PATH, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    return CompiledRules(doc["rules"], doc["justifications"], doc["modules"], doc.get("feature_labels"), doc.get("module_groups"))
+
+
+def _masks(engine: CompiledRules, count: int):
+    """Empty, everything at its top, and random selections in between."""
+    top = 0
+    for name in engine.feature_order:
+        top = engine.with_value(top, name, engine.quantities[name].max if name in engine.quantities else True)
+    yield 0
+    yield top
+    rng = random.Random(18)
+    for _ in range(count):
+        mask = 0
+        for name in engine.feature_order:
+            quantity = engine.quantities.get(name)
+            value = rng.randint(0, quantity.max) if quantity else rng.random() < 0.5
+            mask = engine.with_value(mask, name, value)
+        yield mask
+
+
+def _toggled(engine: CompiledRules, mask: int, name: str) -> int:
+    quantity = engine.quantities.get(name)
+    if quantity is None:
+        return mask ^ (1 << engine.bits[name])
+    units = quantity.value(mask)
+    return engine.with_value(mask, name, units + 1) if units < quantity.max else mask
+
+
+def test_deltas_match_full_recomputation(engine):
+    for mask in _masks(engine, 300):
+        before = engine.evaluate_mask(mask)
+        result = engine.deltas(mask)
+        assert result["total_hours"] == before["total_hours"]
+        for name in engine.feature_order:
+            after = engine.evaluate_mask(_toggled(engine, mask, name))
+            modules = {
+                key: after["module_breakdowns"][key]["total_hours"] - row["total_hours"]
+                for key, row in before["module_breakdowns"].items()
+                if after["module_breakdowns"][key]["total_hours"] != row["total_hours"]
+            }
+            entry = result["features"][name]
+            assert entry["delta"] == after["total_hours"] - before["total_hours"], (hex(mask), name)
+            assert entry["modules"] == modules, (hex(mask), name)
+
+
+def test_delta_entries_describe_the_input(engine):
+    for mask in _masks(engine, 50):
+        features = engine.deltas(mask)["features"]
+        flags = engine.flags_of(mask)
+        for name in engine.feature_order:
+            entry = features[name]
+            if name in engine.quantities:
+                assert (entry["value"], entry["max"]) == (flags[name], engine.quantities[name].max)
+                if flags[name] == engine.quantities[name].max:
+                    assert entry["delta"] == 0 and entry["modules"] == {}
+            else:
+                assert entry["selected"] == flags[name]
+            requires = engine.feature_rules[name].get("requires")
+            assert entry.get("requires") == (requires if requires and not flags[requires] else None), name
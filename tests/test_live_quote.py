@@ -0,0 +1,95 @@
+"""QuoteSession updates, merged on the client side, against a full evaluation; and its rebase on a rules reload."""
+import random
+
+from live_quote import QuoteSession
+from rules_engine import CompiledRules
+
+
+JUSTIFICATIONS = {"build": "Build", "support": "Support"}
+
+OLD_RULES = {
+    "a_include": {"module": "a", "hours": {"build": 4}},
+    "a_x": {"module": "a", "requires": "a_include", "hours": {"build": 3, "support": 1}},
+    "b_flag": {"module": "b", "hours": {"support": 2}},
+    "seats": {"module": "b", "type": "count", "max": 10, "hours": {"support": 1}},
+    "c_flag": {"module": "c", "hours": {"build": 5}},
+}
+# The reload drops b_flag, puts a new feature first (every bit moves), lowers the seats max and changes hours.
+NEW_RULES = {
+    "kiosk": {"module": "c", "hours": {"build": 7}},
+    "a_include": {"module": "a", "hours": {"build": 6}},
+    "a_x": {"module": "a", "requires": "a_include", "hours": {"build": 3, "support": 1}},
+    "seats": {"module": "b", "type": "count", "max": 5, "hours": {"support": 2}},
+    "c_flag": {"module": "c", "hours": {"build": 5}},
+}
+MODULES = {"a": "Module A", "b": "Module B", "c": "Module C"}
+
+
+def _engine(rules) -> CompiledRules:
+    return CompiledRules(rules, JUSTIFICATIONS, MODULES)
+
+
+def _merge(state: dict, message: dict) -> dict:
+    """What a client holds after applying `message`."""
+    if message["full"]:
+        return message["result"]
+    patch = dict(message["result"])
+    breakdowns = patch.pop("module_breakdowns", {})
+    return {**state, **patch, "module_breakdowns": {**state["module_breakdowns"], **breakdowns}}
+
+
+def test_partial_updates_add_up_to_the_full_result():
+    engine = _engine(OLD_RULES)
+    session = QuoteSession(engine)
+    state = _merge({}, session.update(engine))
+    rng = random.Random(21)
+    for seq in range(1, 200):
+        name = rng.choice(list(OLD_RULES))
+        value = rng.randint(0, 10) if name == "seats" else rng.choice(("on", "off"))
+        session.receive(f"{name}={value}")
+        message = session.update(engine)
+        assert message["seq"] == seq and not message["full"]
+        state = _merge(state, message)
+        assert engine.decode_mask(message["quote_code"]) == session.mask
+        assert state == engine.evaluate_mask(session.mask)
+
+
+def test_rules_reload_rebases_the_selection():
+    old, new = _engine(OLD_RULES), _engine(NEW_RULES)
+    session = QuoteSession(old)
+    session.update(old)
+    session.receive("a_include=on, a_x=on, b_flag=on, c_flag=on, seats=3")
+    session.update(old)
+
+    message = session.update(new)
+    assert message["full"] and message["rules_version"] == new.version
+    assert new.flags_of(new.decode_mask(message["quote_code"])) == {
+        "kiosk": False, "a_include": True, "a_x": True, "seats": 3, "c_flag": True,
+    }
+    assert message["result"] == new.evaluate_mask(session.mask)
+
+    # Later toggles are applied and diffed against the new rules.
+    session.receive("kiosk=on")
+    state = _merge(message["result"], session.update(new))
+    assert state == new.evaluate_mask(session.mask)
+
+
+def test_rules_reload_drops_counts_over_the_new_max():
+    old, new = _engine(OLD_RULES), _engine(NEW_RULES)
+    session = QuoteSession(old)
+    session.receive("seats=8 c_flag=on")
+    session.update(old)
+    message = session.update(new)
+    assert new.flags_of(session.mask)["seats"] == 0
+    assert new.flags_of(session.mask)["c_flag"]
+    assert message["result"] == new.evaluate_mask(session.mask)
+
+
+def test_invalid_message_changes_nothing():
+    engine = _engine(OLD_RULES)
+    session = QuoteSession(engine)
+    session.receive("c_flag=on")
+    session.receive("c_flag=on seats=11")
+    message = session.update(engine)
+    assert message["error"] == "seats must be between 0 and 10, got 11"
+    assert message["result"] == engine.evaluate_mask(engine.with_value(0, "c_flag", True))
@@ -0,0 +1,92 @@
+"""`optimize` against scoring every valid selection of a small rule set."""
+from itertools import product
+
+import pytest
+
+from optimizer import optimize
+from rules_engine import CompiledRules
+
+
+RULES = {
+    "a_include": {"module": "a", "hours": {"build": 4}},
+    "a_x": {"module": "a", "requires": "a_include", "hours": {"build": 3, "support": 1}},
+    "a_y": {"module": "a", "requires": "a_include", "hours": {"support": 5}},
+    "b_include": {"module": "b", "hours": {"build": 2}},
+    "b_x": {"module": "b", "requires": "b_include", "hours": {"build": 6}},
+    # Gated on another module's include, so modules a and c form one group.
+    "c_linked": {"module": "c", "requires": "a_include", "hours": {"support": 2}},
+    "c_flag": {"module": "c", "hours": {"build": 1}},
+    "c_seats": {"module": "c", "type": "count", "max": 3, "hours": {"support": 1}, "tiers": [{"above": 1, "hours": {"support": 2}}]},
+}
+JUSTIFICATIONS = {"build": "Build", "support": "Support"}
+MODULES = {"a": "Module A", "b": "Module B", "c": "Module C"}
+
+
+@pytest.fixture(scope="module")
+def engine() -> CompiledRules:
+    return CompiledRules(RULES, JUSTIFICATIONS, MODULES)
+
+
+def _ranked(engine, max_hours, required=(), forbidden=(), objective="features", weights=None, quantities=None):
+    """Every valid selection within the cap as (rank key, features), best first."""
+    flags = list(engine.bits)
+    counts = 0
+    for name, units in (quantities or {}).items():
+        counts = engine.with_value(counts, name, units)
+    ranked = []
+    for values in product((False, True), repeat=len(flags)):
+        chosen = {name for name, on in zip(flags, values) if on}
+        if any(RULES[name].get("requires") not in (None, *chosen) for name in chosen):
+            continue
+        if not set(required) <= chosen or chosen & set(forbidden):
+            continue
+        mask = counts
+        for name in chosen:
+            mask = engine.with_value(mask, name, True)
+        hours = engine.evaluate_mask(mask)["total_hours"]
+        if hours <= max_hours:
+            ranked.append((_key(objective, weights, chosen, hours), sorted(chosen)))
+    return sorted(ranked, reverse=True)
+
+
+def _key(objective, weights, features, hours):
+    if objective == "features":
+        return (len(features), -hours)
+    if objective == "hours":
+        return (hours, len(features))
+    return (sum((weights or {}).get(f, 0) for f in features), -hours)
+
+
+CASES = [
+    dict(max_hours=cap, objective=objective)
+    for cap in (0, 5, 9, 14, 20, 100)
+    for objective in ("features", "hours")
+] + [
+    dict(max_hours=12, objective="weighted", weights={"a_y": 3, "b_x": 2, "c_linked": 1}),
+    dict(max_hours=18, required=["c_linked"], forbidden=["b_x"]),
+    dict(max_hours=15, objective="hours", quantities={"c_seats": 3}),
+    dict(max_hours=30, objective="weighted", weights={"c_flag": 1, "a_x": 1}, quantities={"c_seats": 2}),
+]
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_optimize_matches_brute_force(engine, case):
+    limit = 6
+    expected = _ranked(engine, **case)[:limit]
+    results = optimize(engine, limit=limit, **case)
+    assert len(results) == len(expected)
+    for result, (key, _) in zip(results, expected):
+        features = set(result["features"])
+        mask = engine.decode_mask(result["quote_code"])
+        full = engine.evaluate_mask(mask)
+        assert result["total_hours"] == full["total_hours"] <= case["max_hours"]
+        assert result["modules"] == {k: row["total_hours"] for k, row in full["module_breakdowns"].items()}
+        assert result["quantities"] == {"c_seats": (case.get("quantities") or {}).get("c_seats", 0)}
+        assert all(RULES[f].get("requires") in (None, *features) for f in features)
+        assert set(case.get("required", ())) <= features and not features & set(case.get("forbidden", ()))
+        assert _key(case.get("objective", "features"), case.get("weights"), features, result["total_hours"]) == key
+        assert result["score"] == key[0]
+
+
+def test_no_selection_within_the_cap(engine):
+    assert optimize(engine, max_hours=3, required=["a_include"]) == []
@@ -0,0 +1,127 @@
+import threading
+import time
+from email.message import EmailMessage
+
+import pytest
+
+from outbox import SmtpOutbox
+from quote_store import QuoteStore
+
+
+class FakeSmtp:
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.sent = []
+
+    def send_message(self, message: EmailMessage) -> None:
+        time.sleep(self.delay)
+        self.sent.append(message)
+
+    def quit(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def _wait_for(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "quotes.db")
+
+
+def test_status_is_readable_from_another_worker(db_path):
+    store = QuoteStore(db_path)
+    smtp = FakeSmtp()
+    outbox = SmtpOutbox(lambda: smtp, workers=2, on_change=store.save_email_job)
+    outbox.start()
+    try:
+        job_ids = [outbox.submit(EmailMessage()) for _ in range(20)]
+        other_worker = QuoteStore(db_path)  # its own connections, as in another process
+        _wait_for(lambda: all((other_worker.get_email_job(j) or {}).get("status") == "sent" for j in job_ids))
+        assert other_worker.get_email_job(job_ids[0])["attempts"] == 1
+        assert other_worker.get_email_job("missing") is None
+        other_worker.close()
+    finally:
+        outbox.close()
+        store.close()
+    assert len(smtp.sent) == 20
+
+
+def test_store_ignores_older_states(db_path):
+    store = QuoteStore(db_path)
+    now = time.time()
+    base = {"job_id": "j", "attempts": 1, "error": "", "created_at": now, "updated_at": now}
+    store.save_email_job(dict(base, status="sent", revision=2))
+    store.save_email_job(dict(base, status="queued", attempts=0, revision=0))
+    assert store.get_email_job("j")["status"] == "sent"
+    store.close()
+
+
+def test_close_sends_what_is_due(db_path):
+    store = QuoteStore(db_path)
+    smtp = FakeSmtp(delay=0.05)
+    outbox = SmtpOutbox(lambda: smtp, workers=1, on_change=store.save_email_job)
+    outbox.start()
+    job_ids = [outbox.submit(EmailMessage()) for _ in range(3)]
+    outbox.close(timeout=5)
+    assert [store.get_email_job(j)["status"] for j in job_ids] == ["sent"] * 3
+    store.close()
+
+
+def test_close_fails_jobs_it_cannot_send(db_path):
+    store = QuoteStore(db_path)
+    outbox = SmtpOutbox(lambda: FakeSmtp(), workers=1, on_change=store.save_email_job)
+    # Never started: nothing will deliver these.
+    job_ids = [outbox.submit(EmailMessage()) for _ in range(2)]
+    outbox.close(timeout=0.1)
+    for job_id in job_ids:
+        assert outbox.status(job_id)["status"] == "failed"
+        assert store.get_email_job(job_id)["status"] == "failed"
+    with pytest.raises(RuntimeError):
+        outbox.submit(EmailMessage())
+    store.close()
+
+
+def test_retry_due_after_shutdown_fails(db_path):
+    store = QuoteStore(db_path)
+    attempted = threading.Event()
+
+    def connect():
+        attempted.set()
+        raise ConnectionError("relay down")
+
+    outbox = SmtpOutbox(connect, workers=1, backoff_base=100.0, on_change=store.save_email_job)
+    outbox.start()
+    job_id = outbox.submit(EmailMessage())
+    assert attempted.wait(5)
+    outbox.close(timeout=0.5)
+    job = store.get_email_job(job_id)
+    assert job["status"] == "failed"
+    assert "relay down" in job["error"]
+    store.close()
+
+
+def test_status_endpoint_falls_back_to_the_store(main_module, db_path):
+    from fastapi.testclient import TestClient
+
+    store = QuoteStore(db_path)
+    store.save_email_job(
+        {"job_id": "abc", "status": "sent", "attempts": 1, "error": "", "created_at": 1.0, "updated_at": 2.0, "revision": 2}
+    )
+    app = main_module.app
+    app.state.outbox = None
+    app.state.quotes = store
+    try:
+        client = TestClient(app)
+        assert client.get("/email/abc").json()["status"] == "sent"
+        assert client.get("/email/unknown").status_code == 404
+    finally:
+        app.state.quotes = None
+        store.close()
@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+from pdf_cache import PdfCache
+
+
+class SlowPutCache(PdfCache):
+    def put(self, key: str, data: bytes) -> None:
+        time.sleep(0.2)  # a slow disk write
+        super().put(key, data)
+
+
+def _renderer(delay: float = 0.1):
+    calls = []
+
+    async def render() -> bytes:
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return b"%PDF"
+
+    return render, calls
+
+
+def test_concurrent_requests_share_one_render():
+    async def scenario():
+        cache = PdfCache()
+        render, calls = _renderer()
+        results = await asyncio.gather(*(cache.get_or_render("k", render) for _ in range(5)))
+        assert results == [b"%PDF"] * 5
+        assert len(calls) == 1
+        assert await cache.get_or_render("k", render) == b"%PDF"
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    async def scenario():
+        cache = PdfCache()
+        render, calls = _renderer()
+        leader = asyncio.create_task(cache.get_or_render("k", render))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(cache.get_or_render("k", render)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(leader, *waiters, return_exceptions=True)
+        assert isinstance(results[0], asyncio.CancelledError)
+        assert results[1:] == [b"%PDF"] * 3
+        assert len(calls) == 2  # one waiter took over the render
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_leader_alone():
+    async def scenario():
+        cache = PdfCache()
+        render, calls = _renderer()
+        leader = asyncio.create_task(cache.get_or_render("k", render))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_render("k", render))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        results = await asyncio.gather(leader, waiter, return_exceptions=True)
+        assert results[0] == b"%PDF"
+        assert isinstance(results[1], asyncio.CancelledError)
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
+
+
+def test_request_during_store_reuses_the_render():
+    async def scenario():
+        cache = SlowPutCache()
+        render, calls = _renderer(delay=0.01)
+        leader = asyncio.create_task(cache.get_or_render("k", render))
+        await asyncio.sleep(0.1)  # rendered, still being stored
+        assert await cache.get_or_render("k", render) == b"%PDF"
+        assert await leader == b"%PDF"
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_render_reaches_waiters_and_is_not_cached():
+    async def scenario():
+        cache = PdfCache()
+
+        async def broken() -> bytes:
+            await asyncio.sleep(0.05)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*(cache.get_or_render("k", broken) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+        render, calls = _renderer(delay=0)
+        assert await cache.get_or_render("k", render) == b"%PDF"
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,104 @@
+"""LogView and summarize against a plain walk over the records, in and out of time order."""
+import random
+from collections import Counter
+
+import pytest
+
+from quote_log import SOURCES, LogView, QuoteLog, summarize
+from rules_engine import RESPONSE_MODULE_ORDER
+
+
+VERSIONS = {"0123456789abcdef": ["bre_include", "workflows", None, None], "fedcba9876543210": ["bre_include", "kiosk"]}
+BOUNDS = [(None, None), (100.0, None), (None, 140.0), (110.5, 130.5), (175.0, 180.0), (500.0, 600.0)]
+
+
+def _hours(mask: int) -> dict:
+    return {m: (mask * (i + 3)) % 40 for i, m in enumerate(RESPONSE_MODULE_ORDER)}
+
+
+def _write(path: str, timestamps) -> list:
+    rng = random.Random(20)
+    log = QuoteLog(path)
+    records = []
+    for t in timestamps:
+        version = rng.choice(sorted(VERSIONS))
+        mask = rng.randrange(1 << len(VERSIONS[version]))
+        source = rng.choice(SOURCES)
+        log.append(t, mask, version, VERSIONS[version], _hours(mask), source)
+        records.append((t, version, mask, source))
+    log.close()
+    return records
+
+
+def _matching(records, since, until):
+    return [r for r in records if (since is None or r[0] >= since) and (until is None or r[0] <= until)]
+
+
+def _expected_selections(records):
+    counts = Counter((bytes.fromhex(v), m) for _, v, m, _ in records)
+    return {
+        (int.from_bytes(packed, "little"), mask): (c, tuple(_hours(mask).values()) + (sum(_hours(mask).values()),))
+        for (packed, mask), c in counts.items()
+    }
+
+
+@pytest.fixture(params=["sorted", "jittered"])
+def log(request, tmp_path):
+    timestamps = [100.0 + i for i in range(80)]
+    if request.param == "jittered":
+        # Neighbouring writes from different workers land slightly out of order, plus one clock step back.
+        rng = random.Random(7)
+        for i in range(0, len(timestamps) - 1, 3):
+            timestamps[i], timestamps[i + 1] = timestamps[i + 1], timestamps[i]
+        timestamps[40:40] = [rng.uniform(100, 180) for _ in range(5)]
+    path = str(tmp_path / "quotes.bin")
+    return request.param, path, _write(path, timestamps)
+
+
+@pytest.mark.parametrize("since,until", BOUNDS)
+def test_view_matches_brute_force(log, since, until):
+    kind, path, records = log
+    expected = _matching(records, since, until)
+    with LogView(path, since, until) as view:
+        assert view.count == len(expected)
+        if kind == "sorted" and (since, until) != (None, None):
+            assert view._ordered and view.rows is None
+        if view.rows is not None:
+            assert [records[i] for i in view.rows] == expected
+        else:
+            assert records[view.lo:view.hi] == expected
+        first, last = view.timestamps()
+        assert (first, last) == ((min(r[0] for r in expected), max(r[0] for r in expected)) if expected else (None, None))
+        assert view.selections() == _expected_selections(expected)
+        assert view.sources() == Counter(SOURCES.index(r[3]) for r in expected)
+
+
+@pytest.mark.parametrize("since,until", BOUNDS)
+def test_summarize_matches_brute_force(log, since, until):
+    _, path, records = log
+    expected = _matching(records, since, until)
+    summary = summarize(path, since, until)
+    assert summary["quotes"] == len(expected)
+    assert summary["sources"] == dict(Counter(r[3] for r in expected))
+    assert summary["rules_versions"] == dict(Counter(r[1] for r in expected))
+    features = Counter(
+        name for _, v, m, _ in expected for bit, name in enumerate(VERSIONS[v]) if name and m >> bit & 1
+    )
+    assert summary["features"] == dict(features)
+    if expected:
+        assert (summary["first"], summary["last"]) == (min(r[0] for r in expected), max(r[0] for r in expected))
+        assert summary["total_hours"]["count"] == len(expected)
+
+
+def test_jittered_range_is_listed_row_by_row(tmp_path):
+    path = str(tmp_path / "quotes.bin")
+    records = _write(path, [10.0, 30.0, 20.0, 40.0, 15.0])
+    with LogView(path, 12.0, 25.0) as view:
+        assert not view._ordered
+        assert view.rows == [2, 4]
+        assert view.timestamps() == (15.0, 20.0)
+        assert sum(c for c, _ in view.selections().values()) == 2
+    with LogView(path, 18.0, 35.0) as view:
+        # 30.0 and 20.0 are neighbouring records, so the range is enough.
+        assert view.rows is None and (view.lo, view.hi) == (1, 3)
+        assert view.count == 2
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from admission import Overloaded
+from render_daemon import RenderDaemon, RenderDaemonBusy, RenderDaemonClient, RenderDaemonError
+
+
+class FakePool:
+    size = 1
+
+    def __init__(self, delay: float = 0.3) -> None:
+        self.delay = delay
+
+    async def render(self, html: str) -> bytes:
+        await asyncio.sleep(self.delay)
+        if html == "fail":
+            raise ValueError("bad page")
+        return b"%PDF-" + html.encode()
+
+    def stats(self):
+        return {}
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / "render.sock")
+
+
+def test_full_queue_is_a_retryable_overload(socket_path):
+    async def scenario():
+        daemon = RenderDaemon(socket_path, FakePool(), max_queue=0)
+        await daemon.start()
+        client = RenderDaemonClient(socket_path, max_connections=4, busy_retry_after=7)
+        try:
+            first, second = await asyncio.gather(client.render("a"), client.render("b"), return_exceptions=True)
+        finally:
+            client.close()
+            await daemon.close()
+        assert first == b"%PDF-a"
+        assert isinstance(second, RenderDaemonBusy) and isinstance(second, Overloaded)
+        assert second.retry_after == 7
+        assert client.stats()["busy"] == 1 and client.stats()["failures"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_render_failure_stays_an_error(socket_path):
+    async def scenario():
+        daemon = RenderDaemon(socket_path, FakePool(delay=0), max_queue=0)
+        await daemon.start()
+        client = RenderDaemonClient(socket_path)
+        try:
+            with pytest.raises(RenderDaemonError, match="bad page"):
+                await client.render("fail")
+        finally:
+            client.close()
+            await daemon.close()
+
+    asyncio.run(scenario())
+
+
+def test_busy_daemon_gives_503_with_retry_after(main_module, socket_path):
+    import httpx
+
+    async def scenario():
+        daemon = RenderDaemon(socket_path, FakePool(), max_queue=0)
+        await daemon.start()
+        client = RenderDaemonClient(socket_path, max_connections=4, busy_retry_after=7)
+        app = main_module.app
+        app.state.pdf_pool = client
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+                # Different customers, so the two requests don't share one cached render.
+                return await asyncio.gather(*(
+                    http.post("/pdf", json={"customer_name": f"Busy Test {i}", "features": {}, "renderer": "chromium"})
+                    for i in range(2)
+                ))
+        finally:
+            app.state.pdf_pool = None
+            client.close()
+            await daemon.close()
+
+    responses = sorted(asyncio.run(scenario()), key=lambda r: r.status_code)
+    assert [r.status_code for r in responses] == [200, 503]
+    assert responses[1].headers["retry-after"] == "7"
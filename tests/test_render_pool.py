@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+
+from render_pool import BrowserPool
+
+
+def test_close_fails_jobs_still_queued():
+    async def scenario():
+        # Not started: no worker will ever take the job, as for jobs queued behind the stop markers.
+        pool = BrowserPool(size=1)
+        pending = asyncio.create_task(pool.render("<p>hi</p>"))
+        await asyncio.sleep(0)
+        pool.close(timeout=1)
+        with pytest.raises(RuntimeError, match="closed"):
+            await asyncio.wait_for(pending, 5)
+
+    asyncio.run(scenario())
+
+
+def test_render_after_close_is_refused():
+    pool = BrowserPool(size=1)
+    pool.close(timeout=1)
+    with pytest.raises(RuntimeError, match="closed"):
+        asyncio.run(pool.render("<p>hi</p>"))
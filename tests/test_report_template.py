@@ -0,0 +1,55 @@
+from report_template import ReportContent, ReportRenderer, Template
+
+
+HOSTILE = '<script>alert("x")</script> & Sons'
+
+
+def _content() -> ReportContent:
+    return ReportContent(
+        [("Registration <beta>", ["Housing & <i>Travel</i>"]), ("Empty module", [])],
+        ["Registration: 10 hours"],
+        "Scope <breakdown>",
+        ["Support: 4 hours"],
+        "Total: 10 hours",
+    )
+
+
+def test_placeholders_escape_unless_safe():
+    template = Template("<p>{{ name }}</p>{{ body|safe }}<i>{{ note }}</i>", constants={"note": "a < b"})
+    assert template.names == {"name", "body"}
+    assert template.render({"name": "<b>&", "body": "<em>ok</em>"}) == "<p>&lt;b&gt;&amp;</p><em>ok</em><i>a &lt; b</i>"
+
+
+def test_html_report_escapes_the_customer_name():
+    html = ReportRenderer("Hours & rates are estimates").html(HOSTILE, _content())
+    assert "<script>" not in html
+    escaped = "&lt;script&gt;alert(&quot;x&quot;)&lt;/script&gt; &amp; Sons"
+    assert f"<title>PSC Hours - {escaped}</title>" in html
+    assert f"Customer: {escaped}" in html
+    assert "Hours &amp; rates are estimates" in html
+
+
+def test_html_report_escapes_labels():
+    html = ReportRenderer("").html("Acme", _content())
+    assert "<h2>Registration &lt;beta&gt;</h2>" in html
+    assert "<li>Housing &amp; &lt;i&gt;Travel&lt;/i&gt;</li>" in html
+    assert "Scope &lt;breakdown&gt;" in html
+    assert "Empty module" not in html
+
+
+def test_cached_fragments_do_not_carry_the_customer():
+    renderer = ReportRenderer("")
+    content = _content()
+    first = renderer.html("First Customer", content)
+    second = renderer.html(HOSTILE, content)
+    assert "First Customer" in first and "First Customer" not in second
+    assert "<script>" not in second
+    assert renderer.html("First Customer", content) == first
+
+
+def test_markdown_escapes_and_text_stays_plain():
+    renderer = ReportRenderer("")
+    markdown = renderer.markdown("*Acme* [corp]", _content())
+    assert "\\*Acme\\* \\[corp\\]" in markdown
+    text = renderer.text(HOSTILE, _content())
+    assert f"Customer: {HOSTILE}" in text
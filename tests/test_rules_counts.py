@@ -0,0 +1,65 @@
+"""Count inputs (`"type": "count"`): their bounds in the mask and their tiered hours, for the shipped rules.json."""
+import json
+import os
+
+import pytest
+
+from rules_engine import CompiledRules, InputOutOfRange, brackets
+
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules.json")
+
+
+@pytest.fixture(scope="module")
+def engine() -> CompiledRules:
+    with open(RULES_PATH, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    return CompiledRules(doc["rules"], doc["justifications"], doc["modules"], doc.get("feature_labels"), doc.get("module_groups"))
+
+
+def _score(engine: CompiledRules, name: str, units: int) -> int:
+    module_key = engine.feature_rules[name]["module"]
+    return engine.evaluate_mask(engine.with_value(0, name, units))[f"{module_key}_score"]
+
+
+def test_count_bounds(engine):
+    for name, quantity in engine.quantities.items():
+        for units in (0, 1, quantity.max):
+            assert engine.flags_of(engine.with_value(0, name, units))[name] == units
+        for units in (-1, quantity.max + 1, 2.7, True, "3"):
+            with pytest.raises(InputOutOfRange):
+                engine.with_value(0, name, units)
+        # A code can carry any value the field's bits hold; the decoder still enforces max.
+        if quantity.max < (1 << quantity.width) - 1:
+            with pytest.raises(ValueError):
+                engine.decode_mask(f"{engine.layout}.{(quantity.max + 1) << quantity.shift:x}")
+
+
+def test_count_tier_edges(engine):
+    for name, quantity in engine.quantities.items():
+        tiers = brackets(engine.feature_rules[name])
+        for i, (above, hours) in enumerate(tiers):
+            if above + 1 > quantity.max:
+                continue
+            # The first unit above a tier's edge costs that tier's hours; the unit at the edge, the tier below.
+            assert _score(engine, name, above + 1) - _score(engine, name, above) == sum(hours.values()), (name, above)
+            if i:
+                below = tiers[i - 1][1]
+                assert _score(engine, name, above) - _score(engine, name, above - 1) == sum(below.values()), (name, above)
+        edges = [u for above, _ in tiers for u in (above - 1, above, above + 1) if 0 <= u <= quantity.max]
+        assert engine.mismatches([engine.with_value(0, name, u) for u in edges]) == [], name
+
+
+def test_tiers_replace_the_base_rate():
+    rules = {
+        "seats": {
+            "module": "m",
+            "type": "count",
+            "max": 20,
+            "hours": {"support": 1},
+            "tiers": [{"above": 8, "hours": {"support": 3}}],
+        }
+    }
+    engine = CompiledRules(rules, {"support": "Support"}, {"m": "Module"})
+    assert engine.evaluate_mask(engine.with_value(0, "seats", 10))["m_score"] == 8 * 1 + 2 * 3
+    assert engine.mismatches([engine.with_value(0, "seats", u) for u in range(21)]) == []
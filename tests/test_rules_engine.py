@@ -0,0 +1,35 @@
+"""The compiled tables against `evaluate_reference`, for the shipped rules.json."""
+import json
+import os
+from itertools import product
+
+import pytest
+
+from rules_engine import CompiledRules
+
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules.json")
+
+
+@pytest.fixture(scope="module")
+def engine() -> CompiledRules:
+    with open(RULES_PATH, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    return CompiledRules(doc["rules"], doc["justifications"], doc["modules"], doc.get("feature_labels"), doc.get("module_groups"))
+
+
+def _module_masks(engine: CompiledRules, module_key: str):
+    """Every combination of the module's inputs: each feature on/off, each count 0..max."""
+    names = [name for name in engine.feature_order if engine.feature_rules[name]["module"] == module_key]
+    choices = [range(engine.quantities[n].max + 1) if n in engine.quantities else (False, True) for n in names]
+    for values in product(*choices):
+        mask = 0
+        for name, value in zip(names, values):
+            mask = engine.with_value(mask, name, value)
+        yield mask
+
+
+def test_every_module_combination_matches_reference(engine):
+    for m in engine.modules:
+        masks = list(_module_masks(engine, m.key))
+        assert engine.mismatches(masks) == [], m.key
@@ -0,0 +1,40 @@
+import time
+import zipfile
+from typing import AsyncIterator, List, Tuple
+
+
+class _ChunkSink:
+    """Write-only file object that collects what ZipFile writes until it is drained."""
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_zip(entries: AsyncIterator[Tuple[str, bytes]]) -> AsyncIterator[bytes]:
+    """
+    Streams a ZIP archive while its entries are still being produced.
+
+    The sink has no tell()/seek(), so ZipFile writes each member sequentially and
+    only the member currently being added is held in memory. PDFs are already
+    compressed, so members are stored rather than deflated.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        async for name, data in entries:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            archive.writestr(info, data)
+            yield sink.drain()
+    yield sink.drain()